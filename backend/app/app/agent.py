@@ -1,64 +1,158 @@
 # app/agent.py
 import asyncio
-import random
+import inspect
 import logging
-from typing import Dict, List, Any, Callable
-from backend.app.app.recommender import recommend_keywords
+from typing import Dict, List, Any, Callable, Optional
+from backend.app.app.recommender import recommend_for_draft, recommend_for_draft_stream
 from backend.app.app.analysis import analyze_blogs
-from backend.app.app.scoring import blog_score
+from backend.app.app.cpu_executor import blog_score_async
+from backend.app.app.tfidf_model import CorpusTfidf
+from backend.app.app.draft_state import DraftState
+from backend.app.app.pattern_store import UserPatterns, get_pattern_store
+from backend.app.app.prefetch import Prefetcher
+from backend.app.app.resilience import deadline
+from backend.app.app.metrics import span
+from backend.app.app.config import settings
 
 logger = logging.getLogger(__name__)
 
 class BlogAgent:
-    def __init__(self, history_blogs: List[str]):
-        # Learn from past blogs
-        self.patterns = analyze_blogs(history_blogs)
-        self.max_retries = 3
+    def __init__(self, history_blogs: Optional[List[str]] = None, patterns: Optional[UserPatterns] = None):
+        if patterns is not None:
+            # Precomputed (see for_user): nothing to learn here
+            self.patterns = patterns.summary()
+            self.tfidf = patterns.tfidf
+        else:
+            # Learn from past blogs
+            self.patterns = analyze_blogs(history_blogs or [])
+            self.tfidf = CorpusTfidf().partial_fit(history_blogs or [])
+        # Successive drafts differ by small edits; only re-analyse what changed
+        self.draft_state = DraftState()
+        self.user_id: Optional[str] = None  # semantic cache tenant, set by for_user
+        self.prefetch = Prefetcher(self._speculative_recommend, settings.PREFETCH_SESSION_TOKEN_BUDGET)
+
+    @classmethod
+    def for_user(cls, user_id: str, history_blogs: Optional[List[str]] = None) -> "BlogAgent":
+        """
+        Agent backed by the user's stored patterns. `history_blogs`, if
+        given, is reconciled with the store (only new posts are analysed).
+        """
+        agent = cls(patterns=get_pattern_store().get_or_build(user_id, history_blogs))
+        agent.user_id = user_id
+        return agent
+
+    def speculate(self, draft: str, profile: Dict) -> bool:
+        """
+        Called with every draft as it is typed; at a sentence or paragraph
+        end, starts computing suggestions before they are asked for (see
+        prefetch.py). Returns True if it started.
+        """
+        return self.prefetch.observe(draft, profile)
+
+    async def _speculative_recommend(self, prefix: str, profile: Dict) -> Dict[str, Any]:
+        # No draft_state: it tracks the request's draft, which moves on while this runs
+        with deadline(settings.SUGGEST_DEADLINE_S), span("agent.speculate"):
+            return await recommend_for_draft(prefix, prefix, "", profile, self.patterns["keywords"],
+                                             tenant=self.user_id)
+
+    async def _prefetched(self, draft: str, profile: Dict) -> Optional[Dict[str, Any]]:
+        rec = await self.prefetch.take(draft, profile)
+        if rec is None:
+            return None
+        # Suggestions are from the prefix; local analysis is redone for the draft as it is now
+        return {
+            **rec,
+            "readability": self.draft_state.flesch_reading_ease(),
+            "weak_sections": self.draft_state.weak_sections(),
+            "token_usage": {**rec.get("token_usage", {}), "prefetched": True},
+        }
 
     async def suggest_in_real_time(
         self,
         draft: str,
         profile: Dict,
-        callback: Callable[[Dict[str, Any]], None]
+        callback: Callable[[Dict[str, Any]], None],
+        on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
     ):
         """
         Real-time suggestion loop.
-        Calls recommend_keywords periodically as user types.
+        Calls recommend_for_draft (cursor at end of draft) as user types.
+        LLM failures are handled (and fall back to local suggestions) inside
+        recommend_for_draft under SUGGEST_DEADLINE_S; nothing is retried here.
+        With `on_partial`, suggestions are streamed: on_partial gets each one
+        as it arrives and `callback` still gets the full payload (with score)
+        at the end.
+        A speculative result for a prefix of `draft` (see speculate) is used
+        instead of calling the LLM when it still applies.
         """
-        attempt = 0
-        while attempt < self.max_retries:
+        with deadline(settings.SUGGEST_DEADLINE_S), span("agent.iteration"):
             try:
             #    to get recommendations
-                rec = recommend_keywords(draft, profile, self.patterns)
+                self.draft_state.set_text(draft)
+                grade = self.draft_state.flesch_kincaid_grade()
+                rec = await self._prefetched(draft, profile)
+                if rec is not None:
+                    if on_partial is not None:
+                        for suggestion in rec.get("suggestions", []):
+                            await _call(on_partial, _partial(suggestion))
+                elif on_partial is None:
+                    rec = await recommend_for_draft(
+                        draft, draft, "", profile, self.patterns["keywords"], draft_state=self.draft_state,
+                        tenant=self.user_id,
+                    )
+                else:
+                    rec = await self._stream_suggestions(draft, profile, on_partial)
+                keywords = [s["phrase"] for s in rec.get("suggestions", [])]
 
             # to compute blog score
-                score = blog_score(draft, rec.get("keywords", []), profile)
+                score = await blog_score_async(draft, keywords, profile, self.tfidf, grade=grade)
+            except Exception as e:
+                logger.error(f"Agent failed for draft: {e}")
+                return
 
-            # Inline suggestion: append keyword in brackets
-                inline_suggestions = [
-                    f"[{kw}]" for kw in rec.get("keywords", [])
-                ]
+        # Inline suggestion: append keyword in brackets
+        inline_suggestions = [
+            f"[{kw}]" for kw in keywords
+        ]
 
-                response = {
-                    "inline_suggestions": inline_suggestions,
-                    "weak_sections": rec.get("weak_sections", []),
-                    "score": score,
-                }
+        response = {
+            "inline_suggestions": inline_suggestions,
+            "weak_sections": rec.get("weak_sections", []),
+            "score": score,
+            "token_usage": rec.get("token_usage", {}),
+            "fallback": rec.get("fallback", False),
+        }
+        if "timing" in rec:
+            response["suggestion_timing"] = rec["timing"]
 
-               
-                callback(response)
-                break
+        # callback may be sync or async (e.g. a websocket send)
+        await _call(callback, response)
+
+    async def _stream_suggestions(self, draft: str, profile: Dict, on_partial) -> Dict[str, Any]:
+        """Forward streamed suggestions to on_partial; return the final "done" event."""
+        async for event in recommend_for_draft_stream(
+            draft, draft, "", profile, self.patterns["keywords"], draft_state=self.draft_state,
+            tenant=self.user_id,
+        ):
+            if event["type"] == "done":
+                return event
+            await _call(on_partial, _partial(event["suggestion"]))
+        return {}
+
+
+def _partial(suggestion: Dict[str, Any]) -> Dict[str, Any]:
+    return {"inline_suggestion": f"[{suggestion['phrase']}]", "suggestion": suggestion}
 
-            except Exception as e:
-                attempt += 1
-                wait_time = 2 ** attempt + random.uniform(0, 1)
-                logger.error(f"Agent failed attempt {attempt}: {e}, retrying in {wait_time:.2f}s")
-                await asyncio.sleep(wait_time)
 
+async def _call(fn: Callable[[Dict[str, Any]], Any], payload: Dict[str, Any]):
+    result = fn(payload)
+    if inspect.isawaitable(result):
+        await result
 
 
-async def run_agentic_loop(draft_stream: List[str], profile: Dict, history_blogs: List[str]):
-    agent = BlogAgent(history_blogs)
+async def run_agentic_loop(draft_stream: List[str], profile: Dict, history_blogs: List[str],
+                           user_id: Optional[str] = None):
+    agent = BlogAgent.for_user(user_id, history_blogs) if user_id else BlogAgent(history_blogs)
 
     async def send_to_ui(payload):
         #  for pushing results to UI
@@ -1,24 +1,35 @@
-import re
-from collections import Counter
-from nltk.sentiment import SentimentIntensityAnalyzer
+from backend.app.app import sentiment
+from backend.app.app.metrics import timed
+from backend.app.app.text_stats import TextStats, _STOP, _word_re, ngram_counts
 
-sia = SentimentIntensityAnalyzer()
+# VADER is built on first use (or by warmup): importing nltk and loading the
+# lexicon is slow, and a missing lexicon shouldn't break app startup
+sia = None
 
-_STOP = set("""
-a an the and or to for of in on with without as is are was were be been being this that it by from at into if then than so such also we you they our your their not no yes very more most much many few several over under between about across after before during within without through up down out off near far any each other own same can will just don't isn't etc
-""".split())
+def get_sia():
+    global sia
+    if sia is None:
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        sia = SentimentIntensityAnalyzer()
+    return sia
 
-_word_re = re.compile(r"[A-Za-z][A-Za-z\-']+")
-
-def top_ngrams(text: str, k: int = 20):
-    words = [w.lower() for w in _word_re.findall(text)]
-    words = [w for w in words if w not in _STOP and len(w) > 2]
-    if not words:
-        return []
-    bigrams = [f"{words[i]} {words[i+1]}" for i in range(len(words)-1)]
-    counts = Counter(words + bigrams)
+@timed("analysis.top_ngrams")
+def top_ngrams(text, k: int = 20):
+    counts = text.ngram_counts if isinstance(text, TextStats) else ngram_counts(text)
     return [w for w,_ in counts.most_common(k)]
 
+@timed("analysis.sentiment")
 def sentiment_scores(text: str):
-    s = sia.polarity_scores(text)
-    return {"pos": s["pos"], "neu": s["neu"], "neg": s["neg"], "compound": s["compound"]}
+    return sentiment.score(text)
+
+def analyze_blogs(history_blogs):
+    """
+    Writing patterns learned from a user's past posts: recurring n-grams
+    (used as history keywords by the recommender) and a sentiment baseline.
+    """
+    keywords = top_ngrams("\n".join(history_blogs), k=50)
+    if not history_blogs:
+        return {"keywords": keywords, "sentiment": None}
+    per_post = [sentiment_scores(t) for t in history_blogs]
+    baseline = {k: sum(s[k] for s in per_post) / len(per_post) for k in ("pos", "neu", "neg", "compound")}
+    return {"keywords": keywords, "sentiment": baseline}
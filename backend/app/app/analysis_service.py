@@ -1,38 +1,72 @@
 # small service module used by main endpoint for analyze-blogs
+import asyncio
 import json
 from typing import List
-from backend.app.app.analysis import sentiment_scores, top_ngrams
+from backend.app.app.analysis import top_ngrams
 from backend.app.app.llm import llm_analyze_topics
-from backend.app.app.utils import backoff_retry
+from backend.app.app.llm_batch import llm_analyze_topics_packed
+from backend.app.app.utils import gather_bounded
+from backend.app.app.resilience import resilient_call
 from backend.app.app.config import settings
+from backend.app.app.sentiment import score_many_async
 
-async def analyze_posts(posts: List[str]):
-    results = []
-    total_usage = {"prompt_tokens":0, "completion_tokens":0, "total_tokens":0}
+_ZERO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+async def _llm_topics(text: str):
+    async def call_llm():
+        return await llm_analyze_topics(text)
+
+    return await resilient_call(call_llm)
+
+
+def _analyze_one(text: str, sent, llm_resp):
+    if isinstance(llm_resp, Exception):
+        # LLM unavailable for this post: fall back to local n-grams below
+        llm_resp = {"content": None, "usage": dict(_ZERO_USAGE)}
 
-    for text in posts:
-        sent = sentiment_scores(text)
+    try:
+        parsed = json.loads(llm_resp.get("content") or "")
+        topics = parsed.get("topics", [])
+        keywords = list(dict.fromkeys(parsed.get("keywords", []) + top_ngrams(text, 15)))
+    except Exception:
+        topics = top_ngrams(text, 8)
+        keywords = top_ngrams(text, 20)
 
-        async def call_llm():
-            return await llm_analyze_topics(text)
+    return {
+        "sentiment": sent,
+        "topics": topics,
+        "initial_keywords": keywords,
+        "token_usage": llm_resp.get("usage", {}),
+    }
 
-        llm_resp = await backoff_retry(call_llm, retries=3, base_ms=settings.BACKOFF_BASE_MS)
+
+async def analyze_posts(posts: List[str]):
+    total_usage = dict(_ZERO_USAGE)
+
+    if settings.LLM_PACKING_ENABLED:
+        llm_calls = llm_analyze_topics_packed(posts)
+    else:
+        llm_calls = gather_bounded(
+            [lambda text=text: _llm_topics(text) for text in posts],
+            limit=settings.LLM_MAX_CONCURRENCY,
+        )
+    # Sentiment is CPU-bound: score posts on the CPU pool in chunks while the LLM calls run
+    sentiments, llm_resps = await asyncio.gather(score_many_async(posts), llm_calls)
+
+    results = []
+    for text, sent, llm_resp in zip(posts, sentiments, llm_resps):
         try:
-            parsed = json.loads(llm_resp.get("content", "{}"))
-            topics = parsed.get("topics", [])
-            keywords = list(dict.fromkeys(parsed.get("keywords", []) + top_ngrams(text, 15)))
-        except Exception:
-            topics = top_ngrams(text, 8)
-            keywords = top_ngrams(text, 20)
-
-        usage = llm_resp.get("usage", {})
+            outcome = _analyze_one(text, sent, llm_resp)
+        except Exception as e:
+            # Only local post-processing can land here; don't sink the batch
+            results.append({
+                "sentiment": None, "topics": [], "initial_keywords": [],
+                "token_usage": dict(_ZERO_USAGE), "error": str(e),
+            })
+            continue
         for k in total_usage.keys():
-            total_usage[k] = total_usage.get(k, 0) + usage.get(k, 0)
-
-        results.append({
-            "sentiment": sent,
-            "topics": topics,
-            "initial_keywords": keywords
-        })
+            total_usage[k] = total_usage.get(k, 0) + outcome["token_usage"].get(k, 0)
+        results.append(outcome)
 
     return {"results": results, "token_usage": total_usage}
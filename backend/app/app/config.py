@@ -1,10 +1,135 @@
 # app/config.py
+from typing import Any, Dict, List
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     OPENAI_API_KEY: str
     LLM_MODEL: str = "gpt-4o-mini"
 
+    # Client API keys (security.py): API_KEY plus any comma-separated API_KEYS
+    API_KEY: str = ""
+    API_KEYS: str = ""
+
+    # Per-API-key limits (ratelimit.py); 0 disables a limit
+    RATE_LIMIT_RPS: float = 10.0
+    RATE_LIMIT_BURST: int = 20
+    LLM_TOKENS_PER_MIN: int = 200_000  # estimated, settled against actual usage
+    LLM_COMPLETION_TOKENS_ESTIMATE: int = 300  # per LLM call, for the up-front estimate
+    # Load shedding (429 + Retry-After); bulk traffic is shed at lower thresholds
+    SHED_LLM_INFLIGHT_INTERACTIVE: int = 128
+    SHED_LLM_INFLIGHT_BULK: int = 32
+    SHED_CPU_QUEUE_INTERACTIVE: int = 256
+    SHED_CPU_QUEUE_BULK: int = 64
+    SHED_RETRY_AFTER_S: float = 1.0
+
+    # Retry / fan-out
+    BACKOFF_BASE_MS: int = 200
+    BACKOFF_MAX_MS: int = 2000
+    LLM_MAX_CONCURRENCY: int = 8  # max in-flight LLM calls per batch request
+    MAX_SUGGESTIONS: int = 5
+
+    # Deadlines, retry budget, circuit breaker and hedging (resilience.py)
+    REQUEST_DEADLINE_S: float = 60.0
+    SUGGEST_DEADLINE_S: float = 8.0  # one real-time suggestion pass
+    LLM_ATTEMPT_TIMEOUT_S: float = 30.0  # single upstream attempt; 0 = deadline only
+    LLM_HEDGE_AFTER_MS: int = 2000  # interactive suggestions only; 0 disables hedging
+    RETRY_BUDGET_RATIO: float = 0.1  # retries allowed per successful call
+    RETRY_BUDGET_MIN_PER_S: float = 1.0
+    RETRY_BUDGET_CAPACITY: float = 10.0
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_S: float = 10.0
+
+    # Pack several posts into one analysis request (llm_batch)
+    LLM_PACKING_ENABLED: bool = True
+    LLM_PACK_TOKEN_BUDGET: int = 6000  # estimated post tokens per packed request
+    LLM_PACK_MAX_POSTS: int = 20
+    REALTIME_DEBOUNCE_MS: int = 250  # quiet period before a draft is scored over the websocket
+    # Speculative suggestions when a websocket draft ends a sentence (prefetch.py)
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_SESSION_TOKEN_BUDGET: int = 20_000  # speculative LLM tokens per session
+
+    # Recommendation prompts: verbatim text around the cursor, the rest summarized
+    PROMPT_WINDOW_TOKENS: int = 512
+    PROMPT_MAX_TOKENS: int = 2000  # hard cap per request
+    PROMPT_SUMMARY_TERMS: int = 25
+
+    # LLM completion cache (in-memory LRU + shared SQLite file)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = ".cache/llm_cache.sqlite3"
+    LLM_CACHE_TTL_S: int = 7 * 24 * 3600
+    LLM_CACHE_MAX_ENTRIES: int = 50_000
+    LLM_CACHE_MEMORY_ENTRIES: int = 1024
+
+    # LLM backends (llm_backends.py): JSON list of OpenAI-compatible servers, empty = OpenAI with LLM_MODEL
+    LLM_BACKENDS: List[Dict[str, Any]] = []
+    LLM_POOL_MAX_CONNECTIONS: int = 100  # shared by every backend
+    LLM_POOL_MAX_KEEPALIVE: int = 20
+    LLM_POOL_KEEPALIVE_S: float = 30.0
+    LLM_CONNECT_TIMEOUT_S: float = 5.0
+    LLM_TIMEOUTS: Dict[str, float] = {"recommend": 20.0, "stream": 30.0, "analyze": 90.0}  # read, per call kind
+    # Routing: interactive calls to the fastest healthy backend, bulk to the cheapest
+    LLM_ROUTE_WINDOW_S: float = 60.0
+    LLM_ROUTE_MIN_SAMPLES: int = 5  # calls in the window before a backend can be judged unhealthy
+    LLM_ROUTE_MAX_ERROR_RATE: float = 0.2
+
+    # Suggestion ranking (ranking.py): score = weighted sum of features in [0, 1]
+    # (readability in [-1, 1]); RANK_WEIGHTS is JSON in the environment
+    RANK_WEIGHTS: Dict[str, float] = {"frequency": 1.0, "topic": 0.5, "similarity": 1.0, "readability": 0.25,
+                                   "novelty": 1.0}
+    RANK_CONTEXT_TOKENS: int = 64  # text around the cursor that suggestions are compared with
+    RANK_LOCAL_CANDIDATES: int = 100  # local candidates ranked when the LLM is unavailable
+
+    # Reuse suggestions of a near-identical earlier draft (same tenant and profile).
+    # Off by default: it embeds every request, and a hit trades freshness for LLM spend.
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # min cosine similarity, cursor window and draft alike
+    SEMANTIC_CACHE_WINDOW_TOKENS: int = 64
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 256  # per tenant and profile, LRU
+    SEMANTIC_CACHE_MAX_TENANTS: int = 1024  # tenant+profile buckets, LRU
+    SEMANTIC_CACHE_TTL_S: int = 3600
+
+    # Embedding micro-batching
+    EMBED_BATCH_MAX: int = 64
+    EMBED_BATCH_WAIT_MS: float = 5.0
+    EMBED_CACHE_SIZE: int = 10_000
+
+    # CPU-bound scoring/sentiment: "process", "thread" or "inline"
+    CPU_EXECUTOR: str = "process"
+    CPU_WORKERS: int = 0  # 0 = os.cpu_count()
+    CPU_CHUNK_SIZE: int = 16  # posts per task for batch submissions
+
+    # Sentiment (sentiment.py): analysed sentences kept per process; 0 = whole-text VADER
+    SENTIMENT_MEMO_SENTENCES: int = 50_000
+
+    # Stage timing spans and /metrics; SERVER_TIMING adds a Server-Timing response header
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING: bool = False
+
+    # Startup: comma-separated warmup.COMPONENTS to preload, empty = lazy loading only
+    WARMUP_ON_STARTUP: str = ""
+
+    # Corpus-fitted TF-IDF models, one file per tenant
+    TFIDF_MODEL_DIR: str = ".cache/tfidf"
+    TFIDF_N_FEATURES: int = 2 ** 18
+
+    # Bulk analysis jobs (jobs.py): one directory per job, checkpointed per chunk
+    JOB_DIR: str = ".cache/jobs"
+    JOB_WORKERS: int = 2  # jobs processed concurrently
+    JOB_CHUNK_SIZE: int = 50  # posts per analyze_posts call and per checkpoint
+
+    # Per-user writing patterns for BlogAgent, one file per user
+    PATTERN_STORE_DIR: str = ".cache/patterns"
+    # History n-gram index (ngram_index.py), stored with the patterns: suggestions without an LLM call
+    NGRAM_INDEX_CONTEXT_TOKENS: int = 24  # text around the cursor whose n-grams are looked up
+    NGRAM_INDEX_QUERY_POSTS: int = 16  # best-matching posts whose n-grams are counted per query
+    NGRAM_INDEX_PENDING_POSTS: int = 256  # posts added or deleted before queries compact the index
+    # History post embeddings (embedding_index.py), stored with the patterns. Off by default: adding
+    # posts loads the sentence transformer; when on, the local fallback starts from the posts
+    # nearest the cursor context by embedding instead of by shared n-grams
+    HISTORY_EMBEDDINGS_ENABLED: bool = False
+    HISTORY_EMBEDDINGS_DTYPE: str = "float16"  # or "int8"
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,159 @@
+# app/cpu_executor.py
+"""
+Offload CPU-bound scoring and sentiment off the event loop.
+
+CPU_EXECUTOR selects where the work runs:
+  process  ProcessPoolExecutor; each worker preloads sklearn and VADER once
+  thread   ThreadPoolExecutor; frees the loop but still shares the GIL
+  inline   run in the calling coroutine (tests, debugging)
+
+Every task records how long it sat in the queue (submit -> worker start)
+and how long it ran, per function; see stats(). Timing spans recorded
+inside a task are shipped back and recorded in the calling process.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from backend.app.app.analysis import sentiment_scores
+from backend.app.app.config import settings
+from backend.app.app import metrics
+from backend.app.app.metrics import Histogram
+from backend.app.app.scoring import blog_score, flesch_kincaid_grade, keyword_relevance
+
+_MS_BOUNDS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+_executor: Optional[Executor] = None
+_pending = 0  # tasks submitted and not finished, for load shedding
+_timings: Dict[str, Tuple[Histogram, Histogram]] = {}
+
+
+def _init_worker():
+    # Pay import/model-load costs once per worker, not on the first task
+    from backend.app.app.warmup import COMPONENTS
+    for name in ("sklearn", "vader"):
+        try:
+            COMPONENTS[name]()
+        except Exception:
+            pass  # the task itself will surface a missing resource
+
+
+def _run_timed(fn: Callable, args_list: Sequence[tuple]) -> Tuple[List[Any], float, float, List]:
+    """Worker side: apply fn to each args tuple, return results, wall-clock bounds and spans."""
+    start = time.time()
+    with metrics.collect(defer=True) as spans:
+        results = [fn(*args) for args in args_list]
+    return results, start, time.time(), spans
+
+
+def get_executor() -> Optional[Executor]:
+    global _executor
+    if _executor is None and settings.CPU_EXECUTOR != "inline":
+        workers = settings.CPU_WORKERS or os.cpu_count() or 1
+        if settings.CPU_EXECUTOR == "process":
+            # spawn, not fork: the parent has event-loop and pool threads running
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu")
+    return _executor
+
+
+def _record(name: str, queue_ms: float, exec_ms: float):
+    if name not in _timings:
+        _timings[name] = (Histogram(_MS_BOUNDS), Histogram(_MS_BOUNDS))
+    _timings[name][0].observe(queue_ms)
+    _timings[name][1].observe(exec_ms)
+
+
+async def _submit(fn: Callable, args_list: Sequence[tuple]) -> List[Any]:
+    global _pending
+    submitted = time.time()
+    executor = get_executor()
+    if executor is None:
+        results, start, end, spans = _run_timed(fn, args_list)
+    else:
+        loop = asyncio.get_running_loop()
+        _pending += 1
+        try:
+            results, start, end, spans = await loop.run_in_executor(executor, _run_timed, fn, args_list)
+        finally:
+            _pending -= 1
+    _record(fn.__name__, (start - submitted) * 1000, (end - start) * 1000)
+    metrics.replay(spans)
+    return results
+
+
+async def run_cpu(fn: Callable, *args) -> Any:
+    """Run one CPU-bound call on the configured executor."""
+    return (await _submit(fn, [args]))[0]
+
+
+async def map_cpu(fn: Callable, args_list: Sequence[tuple], chunk_size: Optional[int] = None) -> List[Any]:
+    """
+    fn(*args) for every tuple in args_list, in order. Calls are grouped into
+    chunks so a multi-post request costs a few round-trips to the pool
+    instead of one per post.
+    """
+    if not args_list:
+        return []
+    if chunk_size is None:
+        chunk_size = settings.CPU_CHUNK_SIZE
+    chunks = [args_list[i:i + chunk_size] for i in range(0, len(args_list), chunk_size)]
+    parts = await asyncio.gather(*(_submit(fn, chunk) for chunk in chunks))
+    return [r for part in parts for r in part]
+
+
+# Async wrappers for the hot CPU-bound functions
+
+async def blog_score_async(text, keywords, profile, tfidf=None, grade=None) -> Dict:
+    return await run_cpu(blog_score, text, keywords, profile, tfidf, grade)
+
+
+async def keyword_relevance_async(text, suggested_keywords, tfidf=None) -> float:
+    return await run_cpu(keyword_relevance, text, suggested_keywords, tfidf)
+
+
+async def flesch_kincaid_grade_async(text) -> float:
+    return await run_cpu(flesch_kincaid_grade, text)
+
+
+async def sentiment_scores_async(text) -> Dict:
+    return await run_cpu(sentiment_scores, text)
+
+
+def pending() -> int:
+    """Tasks submitted to the pool and not yet finished (queued + running)."""
+    return _pending
+
+
+def stats() -> Dict[str, Dict]:
+    return {
+        name: {"queue_ms": queue.snapshot(), "exec_ms": exec_.snapshot()}
+        for name, (queue, exec_) in _timings.items()
+    }
+
+
+def _prometheus_lines():
+    timings = sorted(_timings.items())
+    return metrics.histogram_lines(
+        "blog_cpu_queue_milliseconds", (({"fn": name}, queue) for name, (queue, _) in timings)
+    ) + metrics.histogram_lines(
+        "blog_cpu_exec_milliseconds", (({"fn": name}, exec_) for name, (_, exec_) in timings)
+    )
+
+
+metrics.register_collector(_prometheus_lines)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,216 @@
+# app/draft_state.py
+"""
+Incrementally maintained analysis of a draft being edited.
+
+The draft is kept as '.'-delimited pieces (exactly `draft.split('.')`, the
+unit the weak-section scan uses). Neither `\\w+` words nor top_ngrams words
+can span a '.', so word/syllable/sentence counts and n-gram counts are sums
+over pieces. An edit only re-analyses the pieces it touches; everything
+else is adjusted by subtracting the old pieces and adding the new ones.
+
+Every result is identical to the full-text functions it replaces:
+flesch_kincaid_grade / flesch_reading_ease (scoring), top_ngrams (analysis)
+and the weak-section scan in recommender.recommend_for_draft.
+"""
+import heapq
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from backend.app.app.analysis import _STOP, _word_re
+from backend.app.app.scoring import count_syllables
+
+WEAK_REASON = "Hard to read (long/complex)"
+
+_sentence_re = re.compile(r'[!?]')  # '.' already separates pieces
+_count_word_re = re.compile(r'\w+')
+
+
+def _fk_grade(num_sentences: int, num_words: int, syllables: int) -> float:
+    num_sentences, num_words = max(num_sentences, 1), max(num_words, 1)
+    return 0.39 * (num_words / num_sentences) + 11.8 * (syllables / num_words) - 15.59
+
+
+def _reading_ease(num_sentences: int, num_words: int, syllables: int) -> float:
+    num_sentences, num_words = max(num_sentences, 1), max(num_words, 1)
+    return 206.835 - 1.015 * (num_words / num_sentences) - 84.6 * (syllables / num_words)
+
+
+class _Piece:
+    """Cached analysis of one '.'-delimited piece of the draft."""
+
+    __slots__ = ("text", "sentences", "words", "syllables", "ngram_words", "ngrams", "first", "weak_span")
+
+    def __init__(self, text: str):
+        self.text = text
+        words = _count_word_re.findall(text)
+        self.words = len(words)
+        self.syllables = sum(count_syllables(w) for w in words)
+        self.sentences = sum(1 for s in _sentence_re.split(text) if s.strip())
+
+        # n-gram words exactly as top_ngrams filters them
+        ng = [w.lower() for w in _word_re.findall(text)]
+        ng = [w for w in ng if w not in _STOP and len(w) > 2]
+        self.ngram_words = ng
+        bigrams = [f"{ng[i]} {ng[i+1]}" for i in range(len(ng) - 1)]
+        self.ngrams = Counter(ng)
+        self.ngrams.update(bigrams)
+        # term -> (is_bigram, first index in piece), for top_ngrams tie order
+        first: Dict[str, Tuple[int, int]] = {}
+        for i, w in enumerate(ng):
+            first.setdefault(w, (0, i))
+        for i, b in enumerate(bigrams):
+            first.setdefault(b, (1, i))
+        self.first = first
+
+        # (offset within piece, length) if this piece is a weak section
+        self.weak_span: Optional[Tuple[int, int]] = None
+        stripped = text.strip()
+        if stripped and len(stripped.split()) > 20 and \
+                _reading_ease(self.sentences, self.words, self.syllables) < 50:
+            self.weak_span = (len(text) - len(text.lstrip()), len(stripped))
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_len(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class DraftState:
+    def __init__(self, text: str = ""):
+        self.text = ""
+        self._pieces: List[_Piece] = [_Piece("")]
+        self._starts: Optional[List[int]] = None
+        self._words = self._syllables = self._sentences = 0
+        self._ngrams: Counter = Counter()
+        if text:
+            self.apply_edit(0, 0, text)
+
+    # -- editing --
+
+    def apply_edit(self, offset: int, deleted: int, inserted: str):
+        """Replace text[offset:offset+deleted] with `inserted`."""
+        if offset < 0 or deleted < 0 or offset + deleted > len(self.text):
+            raise ValueError("edit out of range")
+        starts = self._piece_starts()
+        ends = [s + len(p.text) for s, p in zip(starts, self._pieces)]
+
+        # Touched pieces: from the one containing `offset` to the one
+        # containing offset+deleted (pieces adjacent to the edit included)
+        i = bisect_left(ends, offset)
+        j = bisect_right(starts, offset + deleted) - 1
+        region_start, region_end = starts[i], ends[j] + len(inserted) - deleted
+
+        self.text = self.text[:offset] + inserted + self.text[offset + deleted:]
+        new_pieces = [_Piece(t) for t in self.text[region_start:region_end].split('.')]
+
+        for p in self._pieces[i:j + 1]:
+            self._account(p, -1)
+        for p in new_pieces:
+            self._account(p, 1)
+        self._pieces[i:j + 1] = new_pieces
+        self._starts = None
+
+    def set_text(self, text: str):
+        """Move to `text`, re-analysing only the span that differs."""
+        if text == self.text:
+            return
+        prefix = _common_prefix_len(self.text, text)
+        suffix = _common_suffix_len(self.text, text, min(len(self.text), len(text)) - prefix)
+        self.apply_edit(prefix, len(self.text) - prefix - suffix, text[prefix:len(text) - suffix])
+
+    def _account(self, piece: _Piece, sign: int):
+        self._words += sign * piece.words
+        self._syllables += sign * piece.syllables
+        self._sentences += sign * piece.sentences
+        ngrams = self._ngrams
+        for term, c in piece.ngrams.items():
+            n = ngrams.get(term, 0) + sign * c
+            if n:
+                ngrams[term] = n
+            else:
+                del ngrams[term]
+
+    def _piece_starts(self) -> List[int]:
+        if self._starts is None:
+            # +1 for the '.' that ends every piece but the last
+            self._starts = [0] + list(accumulate(len(p.text) + 1 for p in self._pieces[:-1]))
+        return self._starts
+
+    # -- results --
+
+    def flesch_kincaid_grade(self) -> float:
+        return _fk_grade(self._sentences, self._words, self._syllables)
+
+    def flesch_reading_ease(self) -> float:
+        return _reading_ease(self._sentences, self._words, self._syllables)
+
+    def weak_sections(self) -> List[Dict]:
+        weak = []
+        for start, p in zip(self._piece_starts(), self._pieces):
+            if p.weak_span is not None:
+                s = start + p.weak_span[0]
+                weak.append({"start": s, "end": s + p.weak_span[1], "reason": WEAK_REASON})
+        return weak
+
+    def top_ngrams(self, k: int = 20) -> List[str]:
+        # Bigrams spanning two pieces depend on neighbours; rebuild those (one per piece)
+        boundary: Dict[str, Tuple[int, int]] = {}
+        counts = self._ngrams.copy()
+        prev = None  # (rank, piece) holding the last n-gram word seen
+        for rank, p in enumerate(self._pieces):
+            if not p.ngram_words:
+                continue
+            if prev is not None:
+                b = f"{prev[1].ngram_words[-1]} {p.ngram_words[0]}"
+                counts[b] += 1
+                boundary.setdefault(b, (prev[0], len(prev[1].ngram_words) - 1))
+            prev = (rank, p)
+        if not counts:
+            return []
+
+        if len(counts) > k:
+            cutoff = heapq.nlargest(k, counts.values())[-1]
+            candidates = {w for w, c in counts.items() if c >= cutoff}
+        else:
+            candidates = set(counts)
+
+        # Counter.most_common breaks ties by first occurrence, unigrams before bigrams
+        pos: Dict[str, Tuple[int, int, int]] = {}
+        remaining = set(candidates)
+        for rank, p in enumerate(self._pieces):
+            if not remaining:
+                break
+            if len(remaining) < len(p.first):
+                found = [w for w in remaining if w in p.first]
+            else:
+                found = [w for w in p.first if w in remaining]
+            for w in found:
+                kind, idx = p.first[w]
+                pos[w] = (kind, rank, idx)
+                remaining.discard(w)
+        for w, (rank, idx) in boundary.items():
+            if w in candidates and (w not in pos or (1, rank, idx) < pos[w]):
+                pos[w] = (1, rank, idx)
+
+        ranked = sorted(candidates, key=lambda w: (-counts[w],) + pos[w])
+        return ranked[:k]
@@ -0,0 +1,238 @@
+# app/embedding_index.py
+"""
+On-disk embedding store for history posts and keywords.
+
+Layout of an index directory:
+  meta.json     dim, dtype, row count (+ IVF row count when built)
+  vectors.bin   row-major float16 or int8 matrix, memory-mapped for search
+  scales.bin    float32 per-row scale (int8 only)
+  ids.txt       one id per line, row order
+  ivf_*.npy     optional coarse clustering for approximate search
+
+Only numpy is needed to open and search, so SentenceTransformer is never
+loaded on the search path. Vectors are L2-normalized on append, so scores
+are cosine similarities.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_CHUNK_ROWS = 65536  # rows scored per step; bounds temporary float32 memory
+
+
+class EmbeddingIndex:
+    def __init__(self, path: str, dim: Optional[int] = None, dtype: str = "float16"):
+        if dtype not in ("float16", "int8"):
+            raise ValueError("dtype must be 'float16' or 'int8'")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        else:
+            if dim is None:
+                raise ValueError("dim is required to create a new index")
+            self.meta = {"dim": dim, "dtype": dtype, "count": 0, "ivf_count": 0}
+            self._write_meta()
+
+        ids_path = os.path.join(path, "ids.txt")
+        self.ids: List[str] = []
+        self._ids_on_disk = 0
+        if os.path.exists(ids_path):
+            with open(ids_path, encoding="utf-8") as f:
+                self.ids = f.read().splitlines()
+            self._ids_on_disk = len(self.ids)
+            del self.ids[self.meta["count"]:]
+
+        self._ivf = None
+        self._lock = threading.RLock()  # appends swap the mappings; searches must not see half of it
+        self._map()
+
+    @property
+    def dim(self) -> int:
+        return self.meta["dim"]
+
+    @property
+    def dtype(self) -> str:
+        return self.meta["dtype"]
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _write_meta(self):
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._file("meta.json"))
+
+    def _map(self):
+        n = self.meta["count"]
+        self._vectors = self._scales = None
+        if n:
+            self._vectors = np.memmap(self._file("vectors.bin"), dtype=self.dtype, mode="r", shape=(n, self.dim))
+            if self.dtype == "int8":
+                self._scales = np.memmap(self._file("scales.bin"), dtype=np.float32, mode="r", shape=(n,))
+        if self.meta.get("ivf_count") and os.path.exists(self._file("ivf_centroids.npy")):
+            self._ivf = (
+                np.load(self._file("ivf_centroids.npy")),
+                np.load(self._file("ivf_order.npy"), mmap_mode="r"),
+                np.load(self._file("ivf_offsets.npy")),
+            )
+
+    # -- writing --
+
+    def append(self, ids: Sequence[str], vectors: np.ndarray):
+        """Add rows. Files are append-only; meta.json is updated last."""
+        with self._lock:
+            self._append(ids, vectors)
+
+    def _append(self, ids: Sequence[str], vectors: np.ndarray):
+        self._truncate_to_count()
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+
+        if self.dtype == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            rows = np.round(vectors / scales[:, None]).astype(np.int8)
+            with open(self._file("scales.bin"), "ab") as f:
+                f.write(scales.astype(np.float32).tobytes())
+        else:
+            rows = vectors.astype(np.float16)
+        with open(self._file("vectors.bin"), "ab") as f:
+            f.write(rows.tobytes())
+        with open(self._file("ids.txt"), "a", encoding="utf-8") as f:
+            f.writelines(f"{i}\n" for i in ids)
+
+        self.ids.extend(str(i) for i in ids)
+        self._ids_on_disk = len(self.ids)
+        self.meta["count"] += len(ids)
+        self._write_meta()
+        self._map()
+
+    def _truncate_to_count(self):
+        # Drop bytes left by an append that died before meta.json was written
+        n = self.meta["count"]
+        for name, size in (("vectors.bin", n * self.dim * np.dtype(self.dtype).itemsize), ("scales.bin", n * 4)):
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+        if self._ids_on_disk > n:
+            with open(self._file("ids.txt"), "w", encoding="utf-8") as f:
+                f.writelines(f"{i}\n" for i in self.ids)
+
+    def build_ivf(self, n_lists: int = 256, iters: int = 10, sample: int = 50_000, seed: int = 0):
+        """Cluster current rows (spherical k-means) for approximate search."""
+        with self._lock:
+            self._build_ivf(n_lists, iters, sample, seed)
+
+    def _build_ivf(self, n_lists: int, iters: int, sample: int, seed: int):
+        n = len(self)
+        if n == 0:
+            return
+        rng = np.random.default_rng(seed)
+        n_lists = min(n_lists, n)
+        train = self._rows(np.sort(rng.choice(n, size=min(sample, n), replace=False)))
+        centroids = train[rng.choice(len(train), size=n_lists, replace=False)]
+        for _ in range(iters):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = train[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, _CHUNK_ROWS):
+            block = self._rows(slice(start, min(start + _CHUNK_ROWS, n)))
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+
+        np.save(self._file("ivf_centroids.npy"), centroids.astype(np.float32))
+        np.save(self._file("ivf_order.npy"), order)
+        np.save(self._file("ivf_offsets.npy"), offsets)
+        self.meta["ivf_count"] = n
+        self._write_meta()
+        self._map()
+
+    # -- searching --
+
+    def _rows(self, idx) -> np.ndarray:
+        rows = np.asarray(self._vectors[idx], dtype=np.float32)
+        if self._scales is not None:
+            rows *= np.asarray(self._scales[idx], dtype=np.float32)[..., None]
+        return rows
+
+    def _scan(self, query: np.ndarray, rows: Optional[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (row indices, scores) among `rows` (None = all), via argpartition."""
+        best_idx = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        total = len(self) if rows is None else len(rows)
+        for start in range(0, total, _CHUNK_ROWS):
+            if rows is None:
+                # contiguous slice: reads straight from the mapping, no gather
+                end = min(start + _CHUNK_ROWS, total)
+                chunk = np.arange(start, end)
+                scores = self._rows(slice(start, end)) @ query
+            else:
+                chunk = rows[start:start + _CHUNK_ROWS]
+                scores = self._rows(chunk) @ query
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+                chunk, scores = chunk[top], scores[top]
+            best_idx = np.concatenate([best_idx, chunk])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > k:
+                top = np.argpartition(best_scores, -k)[-k:]
+                best_idx, best_scores = best_idx[top], best_scores[top]
+        order = np.argsort(-best_scores, kind="stable")
+        return best_idx[order], best_scores[order]
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k (id, cosine) for one query vector. With `nprobe` and a built
+        IVF, only the nearest `nprobe` clusters (plus rows appended since the
+        build) are scanned; otherwise the scan is exact.
+        """
+        with self._lock:
+            return self._search(query, k, nprobe)
+
+    def _search(self, query: np.ndarray, k: int, nprobe: Optional[int]) -> List[Tuple[str, float]]:
+        n = len(self)
+        if n == 0 or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if nprobe is not None and self._ivf is not None:
+            centroids, order, offsets = self._ivf
+            probe = np.argpartition(-(centroids @ query), min(nprobe, len(centroids)) - 1)[:nprobe]
+            parts = [np.asarray(order[offsets[c]:offsets[c + 1]]) for c in probe]
+            parts.append(np.arange(self.meta["ivf_count"], n))  # not clustered yet
+            rows = np.sort(np.concatenate(parts))
+        else:
+            rows = None
+
+        idx, scores = self._scan(query, rows, k)
+        return [(self.ids[i], float(s)) for i, s in zip(idx, scores)]
+
+    def memory_footprint(self) -> Dict[str, int]:
+        """Bytes on disk (memory-mapped, paged in on demand) vs held in RAM."""
+        itemsize = np.dtype(self.dtype).itemsize
+        mapped = len(self) * self.dim * itemsize + (len(self) * 4 if self.dtype == "int8" else 0)
+        ivf = 0
+        if self._ivf is not None:
+            centroids, order, offsets = self._ivf
+            mapped += order.nbytes
+            ivf = centroids.nbytes + offsets.nbytes
+        ids = sum(len(i) + 49 for i in self.ids) + 8 * len(self.ids)  # str objects + list slots
+        return {"mapped_bytes": mapped, "resident_bytes": ids + ivf, "rows": len(self), "dim": self.dim}
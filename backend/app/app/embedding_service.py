@@ -0,0 +1,192 @@
+# app/embedding_service.py
+"""
+Micro-batching front end for sentence-transformer encoding.
+
+Concurrent callers' texts are collected for up to `max_wait_ms` or until
+`max_batch` texts are queued, then encoded with a single `model.encode`
+call on a dedicated worker thread. Only one batch runs at a time; whatever
+queues up meanwhile goes out as the next batch as soon as it finishes.
+An LRU of text -> vector means repeated keywords and sentences are never
+re-encoded.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from backend.app.app.config import settings
+from backend.app.app import metrics
+from backend.app.app.metrics import Histogram
+
+_BATCH_BOUNDS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+_WAIT_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 250, 1000]
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        encode_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+        cache_size: int = 10_000,
+    ):
+        if encode_fn is None:
+            from backend.app.app.embeddings import embed_texts
+            encode_fn = embed_texts
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._pending: List[tuple] = []  # (texts, future, enqueued_at)
+        self._pending_texts = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+        self.batch_sizes = Histogram(_BATCH_BOUNDS)
+        self.queue_wait_ms = Histogram(_WAIT_BOUNDS_MS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # -- cache --
+
+    def _cached(self, text: str) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            vec = self._cache.get(text)
+            if vec is not None:
+                self._cache.move_to_end(text)
+            return vec
+
+    def _store(self, text: str, vec: np.ndarray):
+        with self._cache_lock:
+            self._cache[text] = vec
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # -- batching --
+
+    @metrics.timed("embed.request")
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Rows for `texts`, in order, shape (len(texts), dim)."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        rows: List[Optional[np.ndarray]] = [self._cached(t) for t in texts]
+        missing = list(dict.fromkeys(t for t, r in zip(texts, rows) if r is None))
+        self.cache_hits += len(texts) - sum(1 for r in rows if r is None)
+        self.cache_misses += len(missing)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            self._pending.append((missing, fut, time.perf_counter()))
+            self._pending_texts += len(missing)
+            if self._pending_texts >= self.max_batch:
+                self._schedule(loop, 0)
+            elif self._timer is None:
+                self._schedule(loop, self.max_wait_ms / 1000.0)
+            found = dict(zip(missing, await fut))
+            rows = [r if r is not None else found[t] for t, r in zip(texts, rows)]
+        return np.stack(rows)
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(delay, self._start_flush, loop)
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop):
+        # keep a reference: the loop only holds tasks weakly
+        self._flush_task = loop.create_task(self._flush())
+
+    async def _flush(self):
+        self._timer = None
+        if self._running or not self._pending:
+            return  # the running batch re-flushes when it finishes
+        self._running = True
+        # Take whole requests until the batch is full; the rest go next
+        taken, size = 0, 0
+        while taken < len(self._pending) and (size < self.max_batch or taken == 0):
+            size += len(self._pending[taken][0])
+            taken += 1
+        batch, self._pending = self._pending[:taken], self._pending[taken:]
+        self._pending_texts -= size
+        try:
+            now = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.observe((now - enqueued) * 1000)
+            unique = list(dict.fromkeys(t for texts, _, _ in batch for t in texts))
+            self.batch_sizes.observe(len(unique))
+
+            try:
+                loop = asyncio.get_running_loop()
+                with metrics.span("embed.encode"):
+                    vectors = await loop.run_in_executor(self._executor, self.encode_fn, unique)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+
+            by_text = {}
+            for text, vec in zip(unique, vectors):
+                by_text[text] = vec
+                self._store(text, vec)
+            for texts, fut, _ in batch:
+                if not fut.done():  # caller may have been cancelled
+                    fut.set_result([by_text[t] for t in texts])
+        finally:
+            self._running = False
+            if self._pending:
+                self._schedule(asyncio.get_running_loop(), 0)
+
+    def stats(self) -> Dict:
+        return {
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_entries": len(self._cache),
+        }
+
+
+_service: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_service() -> EmbeddingBatcher:
+    global _service
+    if _service is None:
+        _service = EmbeddingBatcher(
+            max_batch=settings.EMBED_BATCH_MAX,
+            max_wait_ms=settings.EMBED_BATCH_WAIT_MS,
+            cache_size=settings.EMBED_CACHE_SIZE,
+        )
+    return _service
+
+
+def _prometheus_lines():
+    if _service is None:
+        return []
+    return (
+        metrics.histogram_lines("blog_embed_batch_size", [({}, _service.batch_sizes)])
+        + metrics.histogram_lines("blog_embed_queue_wait_milliseconds", [({}, _service.queue_wait_ms)])
+        + metrics.sample_lines(
+            "blog_embed_cache_lookups_total", "counter",
+            [({"result": "hit"}, _service.cache_hits), ({"result": "miss"}, _service.cache_misses)],
+        )
+    )
+
+
+metrics.register_collector(_prometheus_lines)
+
+
+async def embed_texts_async(texts: List[str]) -> np.ndarray:
+    """Batched, cached async counterpart of embeddings.embed_texts."""
+    return await get_embedding_service().embed(texts)
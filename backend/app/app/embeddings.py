@@ -1,4 +1,3 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from typing import List
 
@@ -7,6 +6,8 @@ _model = None
 def get_model():
     global _model
     if _model is None:
+        # Imported here so search-only users (embedding_index) never pull in torch
+        from sentence_transformers import SentenceTransformer
         _model = SentenceTransformer("all-MiniLM-L6-v2")
     return _model
 
@@ -19,8 +20,17 @@ def embed_texts(texts: List[str]):
     emb = model.encode(texts, normalize_embeddings=True)
     return np.array(emb)
 
+def embedding_dim() -> int:
+    return get_model().get_sentence_embedding_dimension()
+
 def cosine_sim(a: np.ndarray, b: np.ndarray):
     """
     Compute cosine similarity matrix between a (n,d) and b (m,d) returning (n,m)
     """
     return np.matmul(a, b.T)
+
+def index_texts(index, ids: List[str], texts: List[str]):
+    """
+    Embed texts and append them to an embedding_index.EmbeddingIndex.
+    """
+    index.append(ids, embed_texts(texts))
@@ -0,0 +1,454 @@
+# app/jobs.py
+"""
+Background bulk analysis jobs for large post archives.
+
+A job is a directory under JOB_DIR:
+  input.ndjson    the uploaded posts, one JSON string per line
+  results.ndjson  one analysis per line, {"index": i, "post_id": ..., ...}
+  chunks.idx      results.ndjson offset of each chunk's first line (uint64)
+  state.json      status, progress and the resume checkpoint
+
+Uploads are streamed to disk, workers read JOB_CHUNK_SIZE posts at a time
+and results are streamed back from the file, so memory does not grow with
+the corpus. Chunks are paced by the tenant's LLM token budget and wait
+while interactive load is high (ratelimit.py). After every chunk the results file is fsynced and state.json
+is replaced atomically; on restart, unfinished jobs are truncated back to
+their last checkpoint and continue from there.
+
+Several processes may share JOB_DIR: a job is only run, resumed or removed
+while holding an exclusive flock on <JOB_DIR>/<id>.lock, so each process
+requeues every unfinished job on start and skips those another process
+holds. A delete drops a "deleted" marker in the job directory. The runner
+then stops at its next chunk boundary, in whichever process it is, and
+removes the files.
+
+File I/O (the upload, chunk reads, result writes and fsyncs, checkpoints)
+runs in worker threads so a slow disk never stalls the event loop.
+"""
+import asyncio
+import codecs
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import struct
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+
+from backend.app.app.analysis_service import analyze_posts
+from backend.app.app.config import settings
+from backend.app.app import metrics
+from backend.app.app.pattern_store import post_id
+from backend.app.app.ratelimit import BULK, RateLimited, get_rate_limiter, shed_check
+from backend.app.app.resilience import deadline
+from backend.app.app.security import key_digest
+from backend.app.app.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_ZERO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+_JSON_ARRAY_START = re.compile(r'\s*(?:\[|\{\s*"posts"\s*:\s*\[)')
+_SKIP = re.compile(r"[\s,]*")
+_OFFSET = struct.Struct("<Q")
+_UPLOAD_BUFFER = 1 << 20  # bytes of uploaded posts gathered per write
+_PUBLIC = ("id", "status", "total", "done", "token_usage", "error", "created", "updated")
+
+
+class JobInputError(ValueError):
+    """The uploaded corpus could not be parsed."""
+
+
+def _post_text(item: Any) -> str:
+    if isinstance(item, dict):
+        item = item.get("text")
+    if not isinstance(item, str):
+        raise JobInputError("each post must be a string or an object with a \"text\" string")
+    return item
+
+
+async def iter_ndjson_posts(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Posts from an NDJSON upload: one JSON string or {"text": ...} per line."""
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _post_text(_loads(line))
+    if buf.strip():
+        yield _post_text(_loads(buf))
+
+
+async def iter_json_posts(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Posts from a JSON upload, [...] or {"posts": [...]} ("posts" first),
+    decoded one element at a time so the array never sits in memory whole.
+    """
+    decoder, text = json.JSONDecoder(), codecs.getincrementaldecoder("utf-8")()
+    buf, pos, started, ended = "", 0, False, False
+    async for chunk in chunks:
+        buf = buf[pos:] + text.decode(chunk)
+        pos = 0
+        if not started:
+            match = _JSON_ARRAY_START.match(buf)
+            if match is None:
+                if len(buf) > 64 or buf.strip()[:1] not in ("", "[", "{"):
+                    raise JobInputError('expected a JSON array or {"posts": [...]}')
+                continue
+            started, pos = True, match.end()
+        while not ended:
+            pos = _SKIP.match(buf, pos).end()
+            if pos < len(buf) and buf[pos] == "]":
+                ended = True
+                break
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                break  # element not complete yet
+            if end == len(buf) and not isinstance(item, (str, dict)):
+                break  # a number may continue in the next chunk
+            pos = end
+            yield _post_text(item)
+    if not ended:
+        raise JobInputError("truncated or malformed JSON upload")
+
+
+def _loads(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        raise JobInputError(f"invalid JSON line: {e}") from None
+
+
+class JobManager:
+    def __init__(self, directory: str, workers: int = 2, chunk_size: int = 50):
+        self.directory = directory
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.running: Set[str] = set()
+        self.posts_done = 0
+
+    # -- files --
+
+    def _path(self, job_id: str, name: str = "") -> str:
+        return os.path.join(self.directory, job_id, name)
+
+    def _lock_path(self, job_id: str) -> str:
+        # Beside the job directory, so removing the directory doesn't pull it out from under a holder
+        return os.path.join(self.directory, f"{job_id}.lock")
+
+    def _lock_job(self, job_id: str) -> Optional[int]:
+        """Exclusive lock on the job across processes (a file descriptor to close), or None if held."""
+        path = self._lock_path(job_id)
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:  # not unlinked by a remove meanwhile
+                return fd
+        except OSError:
+            pass
+        os.close(fd)
+        return None
+
+    def _is_deleted(self, job_id: str) -> bool:
+        return os.path.exists(self._path(job_id, "deleted"))
+
+    def _remove(self, job_id: str):
+        """Delete the job's files; the caller holds its lock."""
+        shutil.rmtree(self._path(job_id), ignore_errors=True)
+        try:
+            os.unlink(self._lock_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+            return None
+        try:
+            with open(self._path(job_id, "state.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, state: Dict[str, Any]):
+        state["updated"] = time.time()
+        path = self._path(state["id"], "state.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)  # a crash leaves the old checkpoint or the new one
+
+    async def _asave(self, state: Dict[str, Any]):
+        await asyncio.to_thread(self._save, state)
+
+    # -- lifecycle --
+
+    def start(self):
+        """Start the worker pool (idempotent) and requeue unfinished (or deleted, not yet removed) jobs."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if not os.path.isdir(self.directory):
+            return
+        pending = [s for s in map(self._load, os.listdir(self.directory))
+                   if s is not None and (s["status"] in ("queued", "running") or self._is_deleted(s["id"]))]
+        for state in sorted(pending, key=lambda s: s["created"]):
+            logger.info("resuming job %s at %d/%d posts", state["id"], state["done"], state["total"])
+            self._queue.put_nowait(state["id"])
+
+    async def stop(self):
+        """Stop workers; a job interrupted mid-chunk resumes from its checkpoint on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def create(self, tenant: str, posts: AsyncIterator[str]) -> Dict[str, Any]:
+        """Write the uploaded posts to a new job and queue it. Raises JobInputError."""
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(os.makedirs, self._path(job_id))
+        total = 0
+        try:
+            f = await asyncio.to_thread(open, self._path(job_id, "input.ndjson"), "w", encoding="utf-8")
+            try:
+                buffer, size = [], 0
+                async for text in posts:
+                    line = json.dumps(text) + "\n"
+                    buffer.append(line)
+                    size += len(line)
+                    total += 1
+                    if size >= _UPLOAD_BUFFER:
+                        await asyncio.to_thread(f.writelines, buffer)
+                        buffer, size = [], 0
+                await asyncio.to_thread(f.writelines, buffer)
+            finally:
+                await asyncio.to_thread(f.close)
+            if not total:
+                raise JobInputError("no posts in upload")
+        except BaseException:
+            shutil.rmtree(self._path(job_id), ignore_errors=True)
+            raise
+        await asyncio.to_thread(self._create_outputs, job_id)
+        now = time.time()
+        state = {
+            "id": job_id, "tenant": key_digest(tenant), "status": "queued",
+            "total": total, "done": 0, "chunk_size": self.chunk_size,
+            "input_offset": 0, "results_bytes": 0, "chunks": 0,
+            "token_usage": dict(_ZERO_USAGE), "error": None, "created": now,
+        }
+        await self._asave(state)
+        self.start()
+        self._queue.put_nowait(job_id)
+        return public_state(state)
+
+    def _create_outputs(self, job_id: str):
+        for name in ("results.ndjson", "chunks.idx"):
+            open(self._path(job_id, name), "wb").close()
+
+    def get(self, job_id: str, tenant: str) -> Optional[Dict[str, Any]]:
+        """The job's full state if it exists and belongs to `tenant`."""
+        state = self._load(job_id)
+        if state is None or state["tenant"] != key_digest(tenant) or self._is_deleted(job_id):
+            return None
+        return state
+
+    def delete(self, job_id: str, tenant: str) -> bool:
+        """Cancel the job (at its next chunk boundary if running) and remove its files."""
+        if self.get(job_id, tenant) is None:
+            return False
+        open(self._path(job_id, "deleted"), "w").close()
+        lock = self._lock_job(job_id)
+        if lock is not None:  # else it is running (here or in another process) and removed by its runner
+            try:
+                self._remove(job_id)
+            finally:
+                os.close(lock)
+        return True
+
+    def results(self, state: Dict[str, Any], cursor: int = 0, limit: int = 1000) -> Iterator[bytes]:
+        """
+        Checkpointed result lines with index >= cursor, at most `limit`.
+        Seeks via the per-chunk offsets, so a late cursor costs one chunk of reading.
+        """
+        end = state["results_bytes"]
+        chunk = cursor // state["chunk_size"]
+        if cursor < 0 or chunk >= state["chunks"]:
+            return
+        skip = cursor - chunk * state["chunk_size"]
+        with open(self._path(state["id"], "chunks.idx"), "rb") as idx:
+            idx.seek(chunk * _OFFSET.size)
+            (start,) = _OFFSET.unpack(idx.read(_OFFSET.size))
+        with open(self._path(state["id"], "results.ndjson"), "rb") as f:
+            f.seek(start)
+            while limit > 0 and f.tell() < end:
+                line = f.readline()
+                if skip:
+                    skip -= 1
+                    continue
+                limit -= 1
+                yield line
+
+    # -- workers --
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            lock = None
+            try:
+                lock = self._lock_job(job_id)
+                if lock is None:
+                    logger.info("job %s is held by another process, skipping", job_id)
+                    continue
+                if not self._is_deleted(job_id):
+                    self.running.add(job_id)
+                    await self._run(job_id)
+                if self._is_deleted(job_id) or not os.path.isdir(self._path(job_id)):
+                    self._remove(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("job %s crashed", job_id)
+            finally:
+                self.running.discard(job_id)
+                if lock is not None:
+                    os.close(lock)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        state = self._load(job_id)
+        if state is None or state["status"] not in ("queued", "running"):
+            return
+        state["status"] = "running"
+        await self._asave(state)
+        src, out, idx = await asyncio.to_thread(self._open_run, state)
+        try:
+            while True:
+                if await asyncio.to_thread(self._is_deleted, job_id):
+                    break
+                lines = await asyncio.to_thread(self._read_chunk, src, state["chunk_size"])
+                if not lines:
+                    break
+                posts = [json.loads(line) for line in lines]
+                reserved = await self._throttle(state["tenant"], posts)
+                try:
+                    with deadline(settings.REQUEST_DEADLINE_S), metrics.span("jobs.chunk"):
+                        analysis = await analyze_posts(posts)
+                except Exception as e:
+                    # Progress so far stays checkpointed; a failed job is not retried automatically
+                    logger.warning("job %s failed at post %d: %s", job_id, state["done"], e)
+                    state["status"], state["error"] = "failed", str(e)
+                    await self._asave(state)
+                    return
+
+                records = [{"index": state["done"] + i, "post_id": post_id(text), **result}
+                           for i, (text, result) in enumerate(zip(posts, analysis["results"]))]
+                await asyncio.to_thread(self._write_chunk, out, idx, records)
+                get_rate_limiter().settle_tokens(state["tenant"], reserved, analysis["token_usage"].get("total_tokens", 0))
+                for k, v in analysis["token_usage"].items():
+                    state["token_usage"][k] = state["token_usage"].get(k, 0) + v
+                state["done"] += len(posts)
+                state["chunks"] += 1
+                state["input_offset"], state["results_bytes"] = src.tell(), out.tell()
+                await self._asave(state)
+                self.posts_done += len(posts)
+        finally:
+            for f in (src, out, idx):
+                f.close()
+
+        if await asyncio.to_thread(self._is_deleted, job_id):
+            return  # removed by the worker
+        state["status"] = "done"
+        await self._asave(state)
+
+    def _open_run(self, state: Dict[str, Any]):
+        """(input, results, index) files positioned at the job's last checkpoint."""
+        job_id = state["id"]
+        src = open(self._path(job_id, "input.ndjson"), "rb")
+        out = open(self._path(job_id, "results.ndjson"), "r+b")
+        idx = open(self._path(job_id, "chunks.idx"), "r+b")
+        # Drop anything written after the last checkpoint (a crash mid-chunk)
+        out.truncate(state["results_bytes"])
+        out.seek(state["results_bytes"])
+        idx.truncate(state["chunks"] * _OFFSET.size)
+        idx.seek(state["chunks"] * _OFFSET.size)
+        src.seek(state["input_offset"])
+        return src, out, idx
+
+    @staticmethod
+    def _read_chunk(src, size: int) -> List[bytes]:
+        lines = []
+        while len(lines) < size:
+            line = src.readline()
+            if not line:
+                break
+            lines.append(line)
+        return lines
+
+    @staticmethod
+    def _write_chunk(out, idx, records: List[Dict[str, Any]]):
+        """Append a chunk's results and its offset, durably."""
+        idx.write(_OFFSET.pack(out.tell()))
+        out.writelines(json.dumps(record).encode("utf-8") + b"\n" for record in records)
+        for f in (out, idx):
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _throttle(self, tenant: str, posts: List[str]) -> float:
+        """
+        Wait until bulk work may run (interactive load has headroom) and the
+        tenant's token budget covers the chunk; returns the tokens reserved.
+        """
+        estimate = sum(count_tokens(p) for p in posts) + settings.LLM_COMPLETION_TOKENS_ESTIMATE * len(posts)
+        while True:
+            try:
+                shed_check(BULK)
+                return get_rate_limiter().reserve_tokens(tenant, estimate)
+            except RateLimited as e:
+                await asyncio.sleep(e.retry_after)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self.running),
+            "posts_done": self.posts_done,
+        }
+
+
+def public_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """What clients see of a job (no checkpoint internals or tenant digest)."""
+    return {k: state[k] for k in _PUBLIC}
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        _manager = JobManager(settings.JOB_DIR, settings.JOB_WORKERS, settings.JOB_CHUNK_SIZE)
+    return _manager
+
+
+def _prometheus_lines():
+    if _manager is None:
+        return []
+    stats = _manager.stats()
+    return (
+        metrics.sample_lines("blog_jobs", "gauge", [({"state": "queued"}, stats["queued"]),
+                                                    ({"state": "running"}, stats["running"])])
+        + metrics.sample_lines("blog_job_posts_total", "counter", [({}, stats["posts_done"])])
+    )
+
+
+metrics.register_collector(_prometheus_lines)
@@ -1,41 +1,197 @@
-from openai import OpenAI
-from typing import Dict, Any
+import json
+import time
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
 from backend.app.app.config import settings
+from backend.app.app import llm_backends, metrics
+from backend.app.app.llm_cache import LLMCache, make_key
+from backend.app.app.prompt_builder import build_prompt
+from backend.app.app.ratelimit import load
+from backend.app.app.stream_parser import SuggestionStreamParser
+from backend.app.app.tokens import count_tokens
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+# Set to stand in for every backend (tests, benchmarks.fake_llm); None routes through llm_backends
+client = None
+async_client = None
+llm_cache: Optional[LLMCache] = None
 
 
-def analyze_blog_with_llm(blog_text: str) -> Dict[str, Any]:
-    """
-    Use GPT-4o-mini to analyze a blog post.
-    Returns sentiment, key topics, and token usage.
-    """
-    prompt = f"""
+def _route(kind: str, sync: bool = False) -> Tuple[Any, str, Optional[llm_backends.Backend]]:
+    """(client, model, backend) for one call of `kind`; backend is None for an override client."""
+    override = client if sync else async_client
+    if override is not None:
+        return override, settings.LLM_MODEL, None
+    backend = llm_backends.choose(kind)
+    return (backend.sync_client() if sync else backend.client()), backend.model, backend
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    global llm_cache
+    if llm_cache is None and settings.LLM_CACHE_ENABLED:
+        llm_cache = LLMCache(
+            settings.LLM_CACHE_PATH,
+            ttl_s=settings.LLM_CACHE_TTL_S,
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            memory_entries=settings.LLM_CACHE_MEMORY_ENTRIES,
+        )
+    return llm_cache
+
+
+def _analyze_prompt(blog_text: str) -> str:
+    return f"""
     Analyze the following blog post:
     - Extract 3 key topics
     - Provide sentiment (positive, neutral, negative)
     - Suggest 5 relevant keywords
 
+    Respond with a JSON object with keys "topics", "sentiment" and "keywords".
+
     Blog Post:
     {blog_text}
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.4
+
+_RECOMMEND_INSTRUCTIONS = """
+The user is writing a blog; the cursor is at the end of the text below. Suggest:
+- 5 next keywords or phrases that improve flow
+- Short note on weak areas
+- Readability score (1-10)
+"""
+
+
+def _recommend_prompt(draft_text: str, profile: Dict) -> Tuple[str, Dict[str, Any]]:
+    return build_prompt(_RECOMMEND_INSTRUCTIONS, draft_text, "", profile)
+
+
+def _with_prompt_stats(usage: Dict[str, Any], stats: Dict[str, Any]) -> Dict[str, Any]:
+    _record_usage({"prompt_tokens_saved": stats["prompt_tokens_saved"]})
+    return {**usage, "prompt_tokens_saved": stats["prompt_tokens_saved"]}
+
+
+def _usage_dict(usage) -> Dict[str, int]:
+    if isinstance(usage, dict):
+        # Stream chunks carry usage as an untyped extra field in older openai clients
+        return {k: int(usage.get(k, 0)) for k in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens,
+    }
+
+
+def _parse_analysis(result_text: str) -> Dict[str, Any]:
+    """Decode the JSON analysis; keep the raw text if the model ignored the format."""
+    try:
+        parsed = json.loads(result_text)
+    except (TypeError, ValueError):
+        return {"raw": result_text}
+    return parsed if isinstance(parsed, dict) else {"raw": result_text}
+
+
+def _record_usage(usage: Dict[str, Any]):
+    for kind in ("prompt", "completion"):
+        if usage.get(f"{kind}_tokens"):
+            metrics.inc("blog_llm_tokens_total", usage[f"{kind}_tokens"], kind=kind)
+    if usage.get("saved_tokens"):
+        metrics.inc("blog_llm_tokens_saved_total", usage["saved_tokens"], reason="cache")
+    if usage.get("prompt_tokens_saved"):
+        metrics.inc("blog_llm_tokens_saved_total", usage["prompt_tokens_saved"], reason="prompt_window")
+
+
+def _cached_usage(usage: Dict[str, int]) -> Dict[str, Any]:
+    """Usage reported for a cache hit: nothing spent, the original cost saved."""
+    return {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "cached": True,
+        "saved_tokens": usage.get("total_tokens", 0),
+    }
+
+
+def _complete(prompt: str, temperature: float, profile: Optional[Dict] = None, kind: str = "recommend",
+              **kwargs) -> Tuple[str, Dict[str, Any]]:
+    """Chat completion through the cache, on the backend routed for `kind`. Returns (content, token_usage)."""
+    llm, model, backend = _route(kind, sync=True)
+    key = make_key(model, prompt, temperature, profile)
+    cache = get_llm_cache()
+    if cache is not None:
+        with metrics.span("llm.cache_lookup"):
+            hit = cache.get(key)
+        if hit is not None:
+            usage = _cached_usage(hit["usage"])
+            _record_usage(usage)
+            return hit["content"], usage
+
+    with metrics.span("llm.request"), llm_backends.track(backend):
+        response = llm.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            timeout=llm_backends.timeout(kind),
+            **kwargs,
+        )
+    content = response.choices[0].message.content
+    usage = _usage_dict(response.usage)  # contains prompt_tokens, completion_tokens, total_tokens
+    _record_usage(usage)
+    if cache is not None:
+        cache.set(key, {"content": content, "usage": usage})
+    return content, {**usage, "cached": False}
+
+
+async def _acomplete(prompt: str, temperature: float, profile: Optional[Dict] = None, kind: str = "recommend",
+                     **kwargs) -> Tuple[str, Dict[str, Any]]:
+    """Async counterpart of _complete."""
+    llm, model, backend = _route(kind)
+    key = make_key(model, prompt, temperature, profile)
+    cache = get_llm_cache()
+    if cache is not None:
+        with metrics.span("llm.cache_lookup"):
+            hit = await cache.aget(key)
+        if hit is not None:
+            usage = _cached_usage(hit["usage"])
+            _record_usage(usage)
+            return hit["content"], usage
+
+    with metrics.span("llm.request"), load.llm_call(), llm_backends.track(backend):
+        response = await llm.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            timeout=llm_backends.timeout(kind),
+            **kwargs,
+        )
+    content = response.choices[0].message.content
+    usage = _usage_dict(response.usage)
+    _record_usage(usage)
+    if cache is not None:
+        await cache.aset(key, {"content": content, "usage": usage})
+    return content, {**usage, "cached": False}
+
+
+def analyze_blog_with_llm(blog_text: str) -> Dict[str, Any]:
+    """
+    Use the LLM to analyze a blog post.
+    Returns sentiment, key topics, and token usage.
+    """
+    result_text, usage = _complete(
+        _analyze_prompt(blog_text), 0.4, kind="analyze", response_format={"type": "json_object"}
     )
 
-    result_text = response.choices[0].message.content
-    usage = response.usage  # contains prompt_tokens, completion_tokens, total_tokens
+    return {
+        "analysis": _parse_analysis(result_text),
+        "token_usage": usage,
+    }
+
+
+async def analyze_blog_with_llm_async(blog_text: str) -> Dict[str, Any]:
+    """Non-blocking variant of analyze_blog_with_llm (same return shape)."""
+    result_text, usage = await _acomplete(
+        _analyze_prompt(blog_text), 0.4, kind="analyze", response_format={"type": "json_object"}
+    )
 
     return {
-        "analysis": result_text,
-        "token_usage": {
-            "prompt_tokens": usage.prompt_tokens,
-            "completion_tokens": usage.completion_tokens,
-            "total_tokens": usage.total_tokens,
-        },
+        "analysis": _parse_analysis(result_text),
+        "token_usage": usage,
     }
 
 
@@ -43,32 +199,147 @@ def recommend_keywords_with_llm(draft_text: str, profile: Dict) -> Dict[str, Any
     """
     Suggest next keywords and readability score using GPT.
     """
-    prompt = f"""
-    The user is writing a blog. Given the draft below, suggest:
-    - 5 next keywords or phrases that improve flow
-    - Short note on weak areas
-    - Readability score (1-10)
-
-    Draft:
-    {draft_text}
+    prompt, stats = _recommend_prompt(draft_text, profile)
+    result_text, usage = _complete(prompt, 0.6, profile)
 
-    User Profile: {profile}
-    """
+    return {
+        "recommendations": result_text,
+        "token_usage": _with_prompt_stats(usage, stats),
+    }
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.6
-    )
 
-    result_text = response.choices[0].message.content
-    usage = response.usage
+async def recommend_keywords_with_llm_async(draft_text: str, profile: Dict) -> Dict[str, Any]:
+    """Non-blocking variant of recommend_keywords_with_llm (same return shape)."""
+    prompt, stats = _recommend_prompt(draft_text, profile)
+    result_text, usage = await _acomplete(prompt, 0.6, profile)
 
     return {
         "recommendations": result_text,
-        "token_usage": {
-            "prompt_tokens": usage.prompt_tokens,
-            "completion_tokens": usage.completion_tokens,
-            "total_tokens": usage.total_tokens,
-        },
+        "token_usage": _with_prompt_stats(usage, stats),
     }
+
+
+async def llm_analyze_topics(text: str) -> Dict[str, Any]:
+    """
+    Async topic/keyword extraction used by analysis_service.
+    Returns {"content": <json str with topics + keywords>, "usage": {...}}.
+    """
+    result = await analyze_blog_with_llm_async(text)
+    return {"content": json.dumps(result["analysis"]), "usage": result["token_usage"]}
+
+
+_CURSOR_INSTRUCTIONS = """
+The user is writing a blog. Suggest 5 keywords or short phrases to insert
+at the cursor that improve flow and fit the user's profile.
+
+Respond with a JSON object: {"suggestions": [{"phrase": str, "reason": str}]}
+"""
+
+
+async def llm_recommend(cursor_before: str, cursor_after: str, draft: str, profile: Dict) -> Dict[str, Any]:
+    """
+    Async cursor-aware suggestions used by recommender.
+    Returns {"content": <json str with suggestions>, "usage": {...}}.
+    """
+    # The draft is cursor_before + cursor_after; only a window of it is sent verbatim
+    prompt, stats = build_prompt(_CURSOR_INSTRUCTIONS, cursor_before, cursor_after, profile)
+    content, usage = await _acomplete(prompt, 0.6, profile, response_format={"type": "json_object"})
+    return {"content": content, "usage": _with_prompt_stats(usage, stats)}
+
+
+async def _astream(
+    prompt: str, temperature: float, profile: Optional[Dict] = None, **kwargs
+) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Streamed counterpart of _acomplete: yields (delta, None) per content
+    chunk, then ("", token_usage) once at the end. A cache hit arrives as a
+    single delta. Usage is estimated locally if the server doesn't send it.
+    """
+    llm, model, backend = _route("stream")
+    key = make_key(model, prompt, temperature, profile)
+    cache = get_llm_cache()
+    if cache is not None:
+        with metrics.span("llm.cache_lookup"):
+            hit = await cache.aget(key)
+        if hit is not None:
+            usage = _cached_usage(hit["usage"])
+            _record_usage(usage)
+            yield hit["content"], None
+            yield "", usage
+            return
+
+    # In flight until the stream is drained or closed; latency is to the first chunk
+    with load.llm_call(), llm_backends.track(backend) as timer:
+        started = time.perf_counter()
+        stream = await llm.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            stream=True,
+            timeout=llm_backends.timeout("stream"),
+            extra_body={"stream_options": {"include_usage": True}},
+            **kwargs,
+        )
+        parts, usage = [], None
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = _usage_dict(chunk.usage)
+                for choice in chunk.choices or []:
+                    delta = getattr(choice.delta, "content", None)
+                    if delta:
+                        if not parts:
+                            timer.responded()  # before the yield: the consumer's time is not the backend's
+                            if metrics.enabled:
+                                metrics.observe_span("llm.first_token", time.perf_counter() - started)
+                        parts.append(delta)
+                        yield delta, None
+        finally:
+            # Abandoned or failed mid-stream: release the HTTP response instead of leaving it to GC
+            await stream.close()
+        if metrics.enabled:
+            metrics.observe_span("llm.stream", time.perf_counter() - started)
+
+    content = "".join(parts)
+    estimated = usage is None
+    if estimated:
+        prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(content)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+    _record_usage(usage)
+    if cache is not None:
+        await cache.aset(key, {"content": content, "usage": usage})
+    yield "", {**usage, "cached": False, **({"estimated": True} if estimated else {})}
+
+
+async def llm_recommend_stream(
+    cursor_before: str, cursor_after: str, draft: str, profile: Dict
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming llm_recommend. Yields ("suggestion", {"phrase", "reason"}) as
+    each suggestion completes, then ("usage", token_usage) once.
+    """
+    prompt, stats = build_prompt(_CURSOR_INSTRUCTIONS, cursor_before, cursor_after, profile)
+    parser = SuggestionStreamParser()
+    async for delta, usage in _astream(prompt, 0.6, profile, response_format={"type": "json_object"}):
+        if usage is not None:
+            yield "usage", _with_prompt_stats(usage, stats)
+            return
+        for suggestion in parser.feed(delta):
+            yield "suggestion", suggestion
+
+
+def _cache_metrics():
+    if llm_cache is None:
+        return []
+    stats = llm_cache.stats()
+    return metrics.sample_lines(
+        "blog_llm_cache_lookups_total", "counter",
+        [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])],
+    ) + metrics.sample_lines("blog_llm_cache_memory_entries", "gauge", [({}, stats["memory_entries"])])
+
+
+metrics.register_collector(_cache_metrics)
@@ -0,0 +1,285 @@
+# app/llm_backends.py
+"""
+OpenAI-compatible LLM backends behind one shared connection pool, and
+routing between them by observed latency, error rate and cost.
+
+Backends come from LLM_BACKENDS, a JSON list; empty means the OpenAI API
+with OPENAI_API_KEY and LLM_MODEL (OPENAI_BASE_URL is honoured as usual):
+
+    [{"name": "openai", "model": "gpt-4o-mini", "cost": 0.6},
+     {"name": "local", "base_url": "http://127.0.0.1:8080/v1", "api_key": "none",
+      "model": "llama-3.1-8b-instruct", "cost": 0}]
+
+cost is relative (e.g. $ per million output tokens); model, base_url and
+api_key default to the settings above.
+
+Every backend's client sends through one httpx pool per process (size and
+keep-alive from LLM_POOL_*). Timeouts are per call kind (LLM_TIMEOUTS:
+recommend, stream, analyze; for streams it bounds the gap between chunks).
+The openai clients don't retry: resilience.resilient_call does, and each
+retry is routed afresh.
+
+Each backend keeps the calls of the last LLM_ROUTE_WINDOW_S seconds. It is
+unhealthy when at least LLM_ROUTE_MIN_SAMPLES of them ran and more than
+LLM_ROUTE_MAX_ERROR_RATE failed (timeouts, connection errors, 429, 5xx).
+
+  interactive (recommend, stream)  healthy backend with the lowest median latency
+  bulk (analyze)                   cheapest healthy backend, latency breaking ties
+
+A backend without latency samples in the window is tried first, one call
+at a time, so a new or recovered backend gets measured. With every backend
+unhealthy the least failing one is used. Cancelled calls (lost hedges,
+attempt timeouts) count their elapsed time as latency but not as errors.
+A stream's latency is its time to first chunk: how long the rest takes
+depends on the consumer as much as on the backend.
+"""
+import contextlib
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from backend.app.app import metrics
+from backend.app.app.config import settings
+from backend.app.app.metrics import Histogram
+from backend.app.app.ratelimit import BULK, INTERACTIVE
+
+KINDS = {"recommend": INTERACTIVE, "stream": INTERACTIVE, "analyze": BULK}
+_FIELDS = {"name", "model", "base_url", "api_key", "cost"}
+_MS_BOUNDS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class Backend:
+    def __init__(self, name: str, model: Optional[str] = None, base_url: Optional[str] = None,
+                 api_key: Optional[str] = None, cost: float = 1.0):
+        self.name = name
+        self.model = model or settings.LLM_MODEL
+        self.base_url = base_url
+        self.api_key = api_key or settings.OPENAI_API_KEY
+        self.cost = float(cost)
+        self.latency_ms = Histogram(_MS_BOUNDS)
+        self.counts = {"ok": 0, "error": 0, "cancelled": 0}
+        self.inflight = 0
+        self._window: Deque[Tuple[float, float, str]] = deque()  # (monotonic time, ms, outcome)
+        self._lock = threading.Lock()
+        self._client = None
+        self._sync_client = None
+
+    def client(self):
+        """AsyncOpenAI client on the shared pool."""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                       http_client=_http_client())
+        return self._client
+
+    def sync_client(self):
+        if self._sync_client is None:
+            from openai import OpenAI
+            self._sync_client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                       http_client=_http_client_sync())
+        return self._sync_client
+
+    def record(self, ms: float, outcome: str):
+        now = time.monotonic()
+        with self._lock:
+            self.counts[outcome] += 1
+            self.latency_ms.observe(ms)
+            self._window.append((now, ms, outcome))
+            self._trim(now)
+
+    def _trim(self, now: float):
+        cutoff = now - settings.LLM_ROUTE_WINDOW_S
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+    def window(self) -> Dict[str, Any]:
+        """Calls, error rate and latency percentiles (ms, failed calls excluded) over the window."""
+        with self._lock:
+            self._trim(time.monotonic())
+            samples = list(self._window)
+        errors = sum(1 for _, _, outcome in samples if outcome == "error")
+        latencies = sorted(ms for _, ms, outcome in samples if outcome != "error")
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1) if latencies else None
+
+        return {"calls": len(samples), "error_rate": errors / len(samples) if samples else 0.0,
+                "p50_ms": pct(0.5), "p90_ms": pct(0.9)}
+
+    def healthy(self, window: Dict[str, Any]) -> bool:
+        return window["calls"] < settings.LLM_ROUTE_MIN_SAMPLES or window["error_rate"] <= settings.LLM_ROUTE_MAX_ERROR_RATE
+
+    def stats(self) -> Dict[str, Any]:
+        window = self.window()
+        return {"model": self.model, "base_url": self.base_url, "cost": self.cost, "inflight": self.inflight,
+                "healthy": self.healthy(window), "window": window, **self.counts,
+                "latency_ms": self.latency_ms.snapshot()}
+
+
+def parse_backends(items: List[Dict[str, Any]]) -> List[Backend]:
+    backends, names = [], set()
+    for item in items:
+        unknown = set(item) - _FIELDS
+        if unknown or "name" not in item:
+            raise ValueError(f"bad LLM_BACKENDS entry {item!r}: needs a name, allows {sorted(_FIELDS)}")
+        if item["name"] in names:
+            raise ValueError(f"duplicate LLM backend {item['name']!r}")
+        names.add(item["name"])
+        backends.append(Backend(**item))
+    return backends
+
+
+# -- shared pool --
+
+_http = None
+_http_sync = None
+
+
+def _pool_kwargs() -> Dict[str, Any]:
+    import httpx
+    return {
+        "limits": httpx.Limits(max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+                               max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+                               keepalive_expiry=settings.LLM_POOL_KEEPALIVE_S),
+        "timeout": timeout("analyze"),  # the longest; calls pass their own
+    }
+
+
+def _http_client():
+    global _http
+    if _http is None:
+        import httpx
+        _http = httpx.AsyncClient(**_pool_kwargs())
+    return _http
+
+
+def _http_client_sync():
+    global _http_sync
+    if _http_sync is None:
+        import httpx
+        _http_sync = httpx.Client(**_pool_kwargs())
+    return _http_sync
+
+
+def timeout(kind: str):
+    """httpx timeout for one call of `kind` (see LLM_TIMEOUTS)."""
+    import httpx
+    return httpx.Timeout(settings.LLM_TIMEOUTS.get(kind, max(settings.LLM_TIMEOUTS.values())),
+                         connect=settings.LLM_CONNECT_TIMEOUT_S)
+
+
+# -- registry and routing --
+
+_backends: Optional[List[Backend]] = None
+
+
+def get_backends() -> List[Backend]:
+    global _backends
+    if _backends is None:
+        _backends = parse_backends(settings.LLM_BACKENDS or [{"name": "openai"}])
+    return _backends
+
+
+def _latency_key(backend: Backend, window: Dict[str, Any]) -> float:
+    if window["p50_ms"] is None:
+        return 0.0 if backend.inflight == 0 else float("inf")  # unmeasured: probe it, once at a time
+    return window["p50_ms"]
+
+
+def choose(kind: str) -> Backend:
+    """The backend for a call of `kind` (see module docstring)."""
+    backends = get_backends()
+    if len(backends) == 1:
+        return backends[0]
+    views = [(b, b.window()) for b in backends]
+    healthy = [(b, w) for b, w in views if b.healthy(w)]
+    if not healthy:
+        return min(views, key=lambda v: v[1]["error_rate"])[0]
+    if KINDS.get(kind, INTERACTIVE) == BULK:
+        return min(healthy, key=lambda v: (v[0].cost, _latency_key(*v)))[0]
+    return min(healthy, key=lambda v: _latency_key(*v))[0]
+
+
+class CallTimer:
+    """Yielded by track(). A stream calls responded() at its first chunk, before the consumer sees it."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ms: Optional[float] = None
+
+    def responded(self):
+        if self.ms is None:
+            self.ms = (time.perf_counter() - self.started) * 1000
+
+    def elapsed_ms(self) -> float:
+        return self.ms if self.ms is not None else (time.perf_counter() - self.started) * 1000
+
+
+@contextlib.contextmanager
+def track(backend: Optional[Backend]):
+    """
+    Record the enclosed call's latency and outcome on `backend` (None: not
+    tracked). The latency ends at CallTimer.responded() if it was called,
+    else when the block exits.
+    """
+    timer = CallTimer()
+    if backend is None:
+        yield timer
+        return
+    from backend.app.app.resilience import is_retryable
+
+    backend.inflight += 1
+    outcome = "ok"
+    try:
+        yield timer
+    except Exception as e:
+        outcome = "error" if is_retryable(e) else "ok"  # a 4xx means the backend itself is fine
+        raise
+    except BaseException:
+        outcome = "cancelled"
+        raise
+    finally:
+        backend.inflight -= 1
+        backend.record(timer.elapsed_ms(), outcome)
+
+
+def warm():
+    for backend in get_backends():
+        backend.client()
+        backend.sync_client()
+
+
+def reset():
+    """Forget backends and clients (after changing settings or OPENAI_BASE_URL)."""
+    global _backends, _http, _http_sync
+    _backends = _http = _http_sync = None
+
+
+async def aclose():
+    global _http
+    if _http is not None:
+        await _http.aclose()
+    if _http_sync is not None:
+        _http_sync.close()
+    reset()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {b.name: b.stats() for b in get_backends()}
+
+
+def _prometheus_lines():
+    if _backends is None:
+        return []
+    return (
+        metrics.histogram_lines("blog_llm_backend_latency_milliseconds",
+                                (({"backend": b.name}, b.latency_ms) for b in _backends))
+        + metrics.sample_lines("blog_llm_backend_calls_total", "counter",
+                               [({"backend": b.name, "outcome": k}, v) for b in _backends for k, v in b.counts.items()])
+        + metrics.sample_lines("blog_llm_backend_error_rate", "gauge",
+                               [({"backend": b.name}, round(b.window()["error_rate"], 4)) for b in _backends])
+    )
+
+
+metrics.register_collector(_prometheus_lines)
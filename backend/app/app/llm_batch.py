@@ -0,0 +1,157 @@
+# app/llm_batch.py
+"""
+Packed multi-post analysis: many short posts per chat completion.
+
+Posts are packed greedily into requests that fit a token budget, so the
+instruction preamble and round-trip are paid once per pack instead of once
+per post. The model answers with JSON keyed by the post's index in the
+pack. Any post whose entry is missing or malformed is re-run on its own
+with analyze_blog_with_llm_async. A pack's token usage is split across its
+posts in proportion to their size. Pack requests and fallbacks share one
+LLM_MAX_CONCURRENCY limit on calls in flight.
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+from backend.app.app.config import settings
+from backend.app.app.llm import _acomplete, analyze_blog_with_llm_async
+from backend.app.app.tokens import count_tokens
+from backend.app.app.resilience import resilient_call
+from backend.app.app.utils import gather_bounded
+
+_USAGE_KEYS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, count_tokens(text))
+
+
+def _packed_prompt(posts: List[str]) -> str:
+    body = "\n\n".join(f"### Post {i}\n{post}" for i, post in enumerate(posts))
+    return f"""
+    Analyze each of the following {len(posts)} blog posts independently. For each post:
+    - Extract 3 key topics
+    - Provide sentiment (positive, neutral, negative)
+    - Suggest 5 relevant keywords
+
+    Respond with a JSON object {{"results": {{"<post number>": {{"topics": [...], "sentiment": "...", "keywords": [...]}}}}}}
+    with one entry for every post number from 0 to {len(posts) - 1}.
+
+{body}
+    """
+
+
+def pack_posts(posts: List[str], token_budget: int, max_posts: int) -> List[List[int]]:
+    """Greedy, order-preserving packing of post indices under the budget."""
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for i, post in enumerate(posts):
+        size = estimate_tokens(post)
+        if current and (used + size > token_budget or len(current) >= max_posts):
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += size
+    if current:
+        packs.append(current)
+    return packs
+
+
+def split_usage(usage: Dict[str, Any], sizes: List[int]) -> List[Dict[str, Any]]:
+    """Split integer token counts proportionally to `sizes` (largest remainder, sums preserved)."""
+    total_size = sum(sizes) or 1
+    shares: List[Dict[str, Any]] = [{} for _ in sizes]
+    for key in _USAGE_KEYS + ("saved_tokens",):
+        if key not in usage:
+            continue
+        exact = [usage[key] * s / total_size for s in sizes]
+        parts = [int(x) for x in exact]
+        leftover = usage[key] - sum(parts)
+        for i in sorted(range(len(sizes)), key=lambda i: exact[i] - parts[i], reverse=True)[:leftover]:
+            parts[i] += 1
+        for share, part in zip(shares, parts):
+            share[key] = part
+    return shares
+
+
+def _valid_analysis(item: Any) -> bool:
+    return (
+        isinstance(item, dict)
+        and isinstance(item.get("topics"), list)
+        and isinstance(item.get("keywords"), list)
+    )
+
+
+async def analyze_blogs_packed_async(
+    blogs: List[str],
+    token_budget: Optional[int] = None,
+    max_posts: Optional[int] = None,
+) -> List[Any]:
+    """
+    Analyze many posts with packed requests. Returns, in input order, the
+    analyze_blog_with_llm_async result for each post (token_usage marked
+    "packed"), or the exception if even the single-post fallback failed.
+    """
+    token_budget = token_budget or settings.LLM_PACK_TOKEN_BUDGET
+    max_posts = max_posts or settings.LLM_PACK_MAX_POSTS
+    outcomes: List[Any] = [None] * len(blogs)
+    # Held per upstream call only, never while a pack waits on its fallbacks
+    calls = asyncio.Semaphore(max(1, settings.LLM_MAX_CONCURRENCY))
+
+    async def single(i: int):
+        try:
+            async with calls:
+                outcomes[i] = await resilient_call(lambda: analyze_blog_with_llm_async(blogs[i]))
+        except Exception as e:
+            outcomes[i] = e
+
+    async def run_pack(idxs: List[int]):
+        if len(idxs) == 1:
+            return await single(idxs[0])
+        prompt = _packed_prompt([blogs[i] for i in idxs])
+        usage, parsed = {}, {}
+        try:
+            async with calls:
+                content, usage = await resilient_call(
+                    lambda: _acomplete(prompt, 0.4, kind="analyze", response_format={"type": "json_object"})
+                )
+            parsed = json.loads(content).get("results", {})
+            if not isinstance(parsed, dict):
+                parsed = {}
+        except Exception:
+            pass  # every post in the pack falls back to a single call
+
+        shares = split_usage(usage, [estimate_tokens(blogs[i]) for i in idxs])
+        retry = []
+        for pos, i in enumerate(idxs):
+            item = parsed.get(str(pos))
+            if _valid_analysis(item):
+                outcomes[i] = {
+                    "analysis": item,
+                    "token_usage": {**shares[pos], "cached": usage.get("cached", False), "packed": True},
+                }
+            else:
+                retry.append((i, shares[pos]))
+        await asyncio.gather(*(single(i) for i, _ in retry))
+
+        # Tokens spent on the pack still count against posts that fell back
+        for i, share in retry:
+            if not isinstance(outcomes[i], Exception):
+                usage_i = outcomes[i]["token_usage"]
+                for key, value in share.items():
+                    usage_i[key] = usage_i.get(key, 0) + value
+
+    packs = pack_posts(blogs, token_budget, max_posts)
+    await gather_bounded([lambda idxs=idxs: run_pack(idxs) for idxs in packs], limit=settings.LLM_MAX_CONCURRENCY)
+    return outcomes
+
+
+async def llm_analyze_topics_packed(texts: List[str]) -> List[Any]:
+    """Packed counterpart of llm.llm_analyze_topics: one {"content", "usage"} (or exception) per text."""
+    results = await analyze_blogs_packed_async(texts)
+    return [
+        r if isinstance(r, Exception) else {"content": json.dumps(r["analysis"]), "usage": r["token_usage"]}
+        for r in results
+    ]
@@ -0,0 +1,183 @@
+# app/llm_cache.py
+"""
+Content-addressed cache for LLM completions.
+
+Two tiers: a small in-process LRU in front of a SQLite file. SQLite runs in
+WAL mode with a busy timeout, so several uvicorn workers on one host can
+share the same file safely. aget/aset are for the event loop: memory hits
+are answered inline, SQLite runs in a worker thread.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+_TRIM_EVERY = 64  # eviction scans the table, so only run it every N writes
+
+
+def make_key(model: str, prompt: str, temperature: float, profile: Optional[Dict] = None) -> str:
+    """Stable hash of everything that determines a completion."""
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "temperature": temperature, "profile": profile or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str, ttl_s: int = 7 * 24 * 3600, max_entries: int = 50_000, memory_entries: int = 1024):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self._writes = 0
+        self._touched: Dict[str, float] = {}  # key -> last disk hit, written with the next set()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_access ON completions(last_access)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, created: float, value: Dict[str, Any]):
+        with self._lock:
+            self._mem[key] = (created, value)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.memory_entries:
+                self._mem.popitem(last=False)
+
+    def _memory_entry(self, key: str, now: float) -> Optional[tuple]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_s:
+                    self._mem.move_to_end(key)
+                else:
+                    del self._mem[key]
+                    entry = None
+        return entry
+
+    def _disk_entry(self, key: str, now: float) -> Optional[tuple]:
+        conn = self._conn()
+        row = conn.execute("SELECT value, created FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is not None and now - row[1] <= self.ttl_s:
+            entry = (row[1], json.loads(row[0]))
+            # No write per read: last_access only orders eviction, so it waits for the next set()
+            with self._lock:
+                self._touched[key] = now
+            self._remember(key, entry[0], entry[1])
+            return entry
+        if row is not None:
+            conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            conn.commit()
+        return None
+
+    def _count(self, entry: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_tokens += entry[1].get("usage", {}).get("total_tokens", 0)
+        return entry[1]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self._memory_entry(key, now)
+        if entry is None:
+            entry = self._disk_entry(key, now)
+        return self._count(entry)
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self._memory_entry(key, now)
+        if entry is None:
+            entry = await asyncio.to_thread(self._disk_entry, key, now)
+        return self._count(entry)
+
+    def _write(self, key: str, value: Dict[str, Any], now: float):
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % _TRIM_EVERY == 0
+            touched, self._touched = self._touched, {}
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions (key, value, total_tokens, created, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps(value), value.get("usage", {}).get("total_tokens", 0), now, now),
+        )
+        if touched:
+            conn.executemany("UPDATE completions SET last_access = ? WHERE key = ?",
+                             [(t, k) for k, t in touched.items()])
+        if trim:
+            self._trim(conn, now)
+        conn.commit()
+
+    def set(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        self._remember(key, now, value)
+        self._write(key, value, now)
+
+    async def aset(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        self._remember(key, now, value)
+        await asyncio.to_thread(self._write, key, value, now)
+
+    def _trim(self, conn: sqlite3.Connection, now: float):
+        # Expire by TTL, then drop least-recently-used rows over the size cap
+        conn.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl_s,))
+        conn.execute(
+            """DELETE FROM completions WHERE key IN (
+                SELECT key FROM completions ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._touched.clear()
+        conn = self._conn()
+        conn.execute("DELETE FROM completions")
+        conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "saved_tokens": self.saved_tokens,
+                "memory_entries": len(self._mem),
+            }
@@ -1,11 +1,30 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException, Security
+import asyncio
+import json
+import math
+import time
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Security, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security.api_key import APIKeyHeader
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from backend.app.app.schemas import BlogAnalysisRequest, KeywordRecommendRequest
-from backend.app.app.security import verify_api_key
-from backend.app.app.llm import analyze_blog_with_llm, recommend_keywords_with_llm
-from backend.app.app.scoring import blog_score
+from backend.app.app.security import key_digest, verify_api_key
+from backend.app.app.ratelimit import BULK, INTERACTIVE, RateLimited, admit, get_rate_limiter
+from backend.app.app.tokens import count_tokens
+from backend.app.app.llm import analyze_blog_with_llm_async
+from backend.app.app.llm_batch import analyze_blogs_packed_async
+from backend.app.app.cpu_executor import blog_score_async, stats as cpu_executor_stats
+from backend.app.app.tfidf_model import aget_corpus_tfidf, update_corpus_tfidf
+from backend.app.app.utils import gather_bounded
+from backend.app.app.resilience import deadline, resilient_call
+from backend.app.app.config import settings
+from backend.app.app import llm_backends, metrics
+from backend.app.app.agent import BlogAgent
+from backend.app.app.jobs import JobInputError, get_job_manager, iter_json_posts, iter_ndjson_posts, public_state
+from backend.app.app.pattern_store import get_pattern_store
+from backend.app.app.recommender import recommend_for_draft, recommend_for_draft_stream, recommend_from_history
+from backend.app.app.realtime import SuggestionSession
+from backend.app.app.warmup import warmup as warmup_components
 
 
 # FastAPI initialization
@@ -19,9 +38,59 @@ app = FastAPI(
     version="1.0.0"
 )
 
+
+if settings.SERVER_TIMING:
+    # Only installed when asked for: the middleware itself costs a little per request
+    @app.middleware("http")
+    async def server_timing_header(request: Request, call_next):
+        with metrics.collect() as spans:
+            response = await call_next(request)
+        if spans:
+            response.headers["Server-Timing"] = metrics.server_timing(spans)
+        return response
+
+
+@app.on_event("startup")
+async def preload_dependencies():
+    # Heavy deps load lazily; optionally pay that cost before taking traffic
+    names = [n.strip() for n in settings.WARMUP_ON_STARTUP.split(",") if n.strip()]
+    if names:
+        app.state.warmup = await warmup_components(names)
+    # Bulk analysis workers; picks up jobs a previous process left unfinished
+    get_job_manager().start()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await get_job_manager().stop()
+    await llm_backends.aclose()
+
 # Endpoints
 
 
+def _admit(api_key: str, priority: str, estimated_tokens: float = 0.0) -> float:
+    """Load shedding and per-key limits for one request; 429 + Retry-After when refused."""
+    try:
+        return admit(key_digest(api_key), priority, estimated_tokens)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many requests ({e.reason})",
+            headers={"Retry-After": e.retry_after_header},
+        )
+
+
+def _settle(api_key: str, reserved: float, usage: Dict[str, Any]):
+    get_rate_limiter().settle_tokens(key_digest(api_key), reserved, usage.get("total_tokens", 0))
+
+
+def _llm_estimate(texts: List[str], cap: Optional[int] = None) -> int:
+    """Up-front LLM token estimate: prompt text (capped per call) plus a typical completion."""
+    return sum(
+        min(count_tokens(t), cap or math.inf) + settings.LLM_COMPLETION_TOKENS_ESTIMATE for t in texts
+    )
+
+
 @app.post("/api/analyze-blogs", summary="Analyze past blog posts")
 async def analyze_blogs(
     request: BlogAnalysisRequest,
@@ -35,9 +104,35 @@ async def analyze_blogs(
     - initial keyword suggestions
     - token usage
     """
+    posts = request.posts
+    reserved = _admit(api_key, BULK, _llm_estimate(posts))
+    with deadline(settings.REQUEST_DEADLINE_S):
+        if settings.LLM_PACKING_ENABLED:
+            # Several posts per request; falls back to single calls per post as needed
+            outcomes = await analyze_blogs_packed_async(posts)
+        else:
+            # Fan out with a bounded number of in-flight LLM calls; order is preserved
+            outcomes = await gather_bounded(
+                [
+                    lambda blog=blog: resilient_call(lambda: analyze_blog_with_llm_async(blog))
+                    for blog in posts
+                ],
+                limit=settings.LLM_MAX_CONCURRENCY,
+            )
+
+    # Past posts are this tenant's history corpus for keyword scoring
+    await asyncio.to_thread(update_corpus_tfidf, api_key, posts)
+
     results = []
-    for blog in request.blogs:
-        llm_result = analyze_blog_with_llm(blog)
+    for blog, llm_result in zip(posts, outcomes):
+        if isinstance(llm_result, Exception):
+            # One failed post must not sink the batch
+            results.append({
+                "blog": blog,
+                "error": str(llm_result),
+                "token_usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+            continue
         results.append({
             "blog": blog,
             "sentiment": llm_result["analysis"].get("sentiment"),
@@ -45,9 +140,22 @@ async def analyze_blogs(
             "keywords": llm_result["analysis"].get("keywords"),
             "token_usage": llm_result["token_usage"],
         })
+    _settle(api_key, reserved, {"total_tokens": sum(r["token_usage"].get("total_tokens", 0) for r in results)})
     return results
 
 
+async def _recommend_inputs(request: KeywordRecommendRequest, api_key: str):
+    """(draft, cursor_before, cursor_after, profile, history_keywords) for a recommend request."""
+    draft = request.draft_text
+    cursor = request.cursor
+    before, after = (cursor.before, cursor.after) if cursor is not None else (draft, "")
+    profile = request.user_profile.model_dump() if request.user_profile is not None else {}
+    # Keywords from this key's stored writing patterns, if any were built
+    patterns = await get_pattern_store().aget(api_key)
+    await aget_corpus_tfidf(api_key)  # in memory for ranking, so the instant path never waits on the disk
+    return draft, before, after, profile, patterns.keywords() if patterns is not None else []
+
+
 @app.post("/api/recommend-keywords", summary="Get dynamic keyword suggestions")
 async def recommend_keywords(
     request: KeywordRecommendRequest,
@@ -64,26 +172,231 @@ async def recommend_keywords(
       - readability + relevance score (0-100)
       - token usage
     """
-    
-    llm_result = recommend_keywords_with_llm(
-        draft_text=request.draft,
-        profile=request.profile or {}
-    )
+    # Admitted before anything is loaded: a refused request costs no disk reads
+    reserved = _admit(api_key, INTERACTIVE, _llm_estimate([request.draft_text], settings.PROMPT_MAX_TOKENS))
+    draft, before, after, profile, history_keywords = await _recommend_inputs(request, api_key)
+    with deadline(settings.SUGGEST_DEADLINE_S):
+        rec = await recommend_for_draft(draft, before, after, profile, history_keywords, tenant=api_key)
+    _settle(api_key, reserved, rec["token_usage"])
 
     # Compute scoring 
-    score = blog_score(
-        text=request.draft,
-        keywords=[kw["keyword"] for kw in llm_result["recommendations"]],
-        profile=request.profile or {}
+    score = await blog_score_async(
+        text=draft,
+        keywords=[s["phrase"] for s in rec["suggestions"]],
+        profile=profile,
+        tfidf=await aget_corpus_tfidf(api_key),
     )
 
     # Return response
-    return {
-        "recommendations": llm_result["recommendations"],
-        "score": score,
-        "token_usage": llm_result["token_usage"],
-    }
+    return {**rec, "score": score}
+
+
+@app.post("/api/recommend-keywords/stream", summary="Stream keyword suggestions as they arrive")
+async def recommend_keywords_stream(
+    request: KeywordRecommendRequest,
+    http_request: Request,
+    api_key: str = Depends(verify_api_key)
+) -> StreamingResponse:
+    """
+    Streaming /api/recommend-keywords. One event per line (NDJSON), or
+    Server-Sent Events if the client accepts text/event-stream:
+      - {"type": "suggestion", "suggestion": {...}}  as each suggestion completes
+      - {"type": "score", "score": {...}}  once all suggestions are in
+      - {"type": "done", ...}  readability, weak sections, token usage and
+        timing (first_suggestion_ms, total_ms)
+    """
+    reserved = _admit(api_key, INTERACTIVE, _llm_estimate([request.draft_text], settings.PROMPT_MAX_TOKENS))
+    draft, before, after, profile, history_keywords = await _recommend_inputs(request, api_key)
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    started = time.perf_counter()
+
+    def encode(event: Dict[str, Any]) -> str:
+        data = json.dumps(event)
+        return f"event: {event['type']}\ndata: {data}\n\n" if sse else data + "\n"
+
+    async def events():
+        with deadline(settings.SUGGEST_DEADLINE_S):
+            async for event in recommend_for_draft_stream(
+                draft, before, after, profile, history_keywords, tenant=api_key
+            ):
+                if event["type"] == "done":
+                    _settle(api_key, reserved, event["token_usage"])
+                    score = await blog_score_async(
+                        text=draft,
+                        keywords=[s["phrase"] for s in event["suggestions"]],
+                        profile=profile,
+                        tfidf=await aget_corpus_tfidf(api_key),
+                    )
+                    yield encode({"type": "score", "score": score})
+                    event["timing"]["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                yield encode(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.post("/api/recommend-keywords/instant", summary="Keyword suggestions from past posts, without the LLM")
+async def recommend_keywords_instant(
+    request: KeywordRecommendRequest,
+    api_key: str = Depends(verify_api_key)
+) -> Dict[str, Any]:
+    """
+    Suggestions the writer's own history posts pair with the words around
+    the cursor, from the n-gram index kept with this key's writing
+    patterns. No LLM call, so no token usage; empty until patterns exist
+    (history sent over /ws/suggestions).
+    """
+    _admit(api_key, INTERACTIVE)
+    draft, before, after, profile, history_keywords = await _recommend_inputs(request, api_key)
+    return recommend_from_history(draft, before, after, profile, history_keywords, tenant=api_key)
+
+
+@app.post("/api/jobs/analyze-blogs", summary="Start a bulk blog analysis job", status_code=202)
+async def create_analysis_job(
+    request: Request,
+    api_key: str = Depends(verify_api_key)
+) -> Dict[str, Any]:
+    """
+    Queue analysis of a large corpus. The body is streamed to disk, either
+    NDJSON (Content-Type application/x-ndjson; one JSON string or
+    {"text": ...} per line) or JSON ([...] or {"posts": [...]}).
+    Returns the job (id, status, progress); poll GET /api/jobs/{id}.
+    """
+    _admit(api_key, BULK)  # LLM tokens are reserved per chunk as the job runs
+    content_type = request.headers.get("content-type", "")
+    parse = iter_ndjson_posts if "ndjson" in content_type else iter_json_posts
+    try:
+        return await get_job_manager().create(api_key, parse(request.stream()))
+    except JobInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _job_or_404(job_id: str, api_key: str) -> Dict[str, Any]:
+    state = get_job_manager().get(job_id, api_key)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return state
+
+
+@app.get("/api/jobs/{job_id}", summary="Bulk analysis job status")
+async def get_analysis_job(job_id: str, api_key: str = Depends(verify_api_key)) -> Dict[str, Any]:
+    _admit(api_key, BULK)
+    return public_state(_job_or_404(job_id, api_key))
+
+
+@app.get("/api/jobs/{job_id}/results", summary="Stream bulk analysis results")
+async def get_analysis_job_results(
+    job_id: str,
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=100_000),
+    api_key: str = Depends(verify_api_key)
+) -> StreamingResponse:
+    """
+    Results finished so far as NDJSON, one {"index": i, ...} line per post,
+    starting at index `cursor`. Pass X-Next-Cursor back to continue;
+    X-Job-Status says whether more are still coming.
+    """
+    _admit(api_key, BULK)
+    state = _job_or_404(job_id, api_key)
+    return StreamingResponse(
+        get_job_manager().results(state, cursor, limit),
+        media_type="application/x-ndjson",
+        headers={"X-Job-Status": state["status"], "X-Next-Cursor": str(min(cursor + limit, state["done"]))},
+    )
+
+
+@app.delete("/api/jobs/{job_id}", summary="Cancel and delete a bulk analysis job")
+async def delete_analysis_job(job_id: str, api_key: str = Depends(verify_api_key)) -> Dict[str, Any]:
+    if not get_job_manager().delete(job_id, api_key):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"id": job_id, "deleted": True}
+
+
+@app.websocket("/ws/suggestions")
+async def suggestions_ws(websocket: WebSocket):
+    """
+    Real-time suggestions for a drafting session.
+    Client messages (JSON):
+      - {"history": [...], "profile": {...}, "stream": bool}  optional first message,
+        builds the agent; with "stream" each suggestion is also pushed as it arrives
+      - {"draft": "...", "id": ..., "profile": {...}}  draft update; profile optional
+    Server pushes one suggestion payload per settled draft, echoing "id" and
+    carrying per-message "timing" (debounce / compute / end-to-end ms), or
+    {"id", "error", "retry_after"} if the key's token budget can't cover the draft.
+    """
+    try:
+        api_key = verify_api_key(websocket.headers.get("X-API-Key"))
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    tenant = key_digest(api_key)
+    try:
+        # The request rate applies when the session opens; each debounced draft then
+        # reserves and settles its LLM tokens in SuggestionSession
+        admit(tenant, INTERACTIVE)
+    except RateLimited:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    await websocket.accept()
+    session = None
+    try:
+        while True:
+            msg = await websocket.receive_json()
+            if session is None:
+                # Stored per-key patterns; only history posts not seen before are analysed
+                agent = await asyncio.to_thread(BlogAgent.for_user, api_key, msg.get("history"))
+                session = SuggestionSession(
+                    agent, msg.get("profile") or {}, websocket.send_json, settings.REALTIME_DEBOUNCE_MS,
+                    stream=bool(msg.get("stream")), prefetch=settings.PREFETCH_ENABLED, tenant=tenant,
+                )
+            if "profile" in msg:
+                session.profile = msg["profile"] or {}
+            if "draft" in msg:
+                session.submit(msg["draft"], msg.get("id"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if session is not None:
+            await session.close()
+
+
+@app.post("/warmup", summary="Preload heavy dependencies")
+async def warmup_endpoint(
+    components: Optional[List[str]] = Query(None),
+    api_key: str = Depends(verify_api_key)
+) -> Dict[str, Any]:
+    """
+    Load lazily-imported dependencies now (default: all).
+    Returns per-component load status and time in ms.
+    """
+    try:
+        return await warmup_components(components)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/stats/cpu", summary="CPU executor timings")
+async def cpu_stats(api_key: str = Depends(verify_api_key)) -> Dict[str, Any]:
+    """Per-function queue wait and execution time histograms (ms) for offloaded work."""
+    return cpu_executor_stats()
+
+
+@app.get("/stats/llm", summary="LLM backend latency and health")
+async def llm_stats(api_key: str = Depends(verify_api_key)) -> Dict[str, Any]:
+    """Per-backend call counts, latency histogram (ms) and the rolling window routing decides on."""
+    return llm_backends.stats()
+
 
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Stage latency histograms, token/cache/retry counters and pool stats in Prometheus text format."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 # Root endpoint
@@ -0,0 +1,256 @@
+# app/metrics.py
+"""
+Minimal in-process metric primitives, stage timing spans and Prometheus
+text export.
+
+    with span("llm.request"): ...          # or @timed("analysis.top_ngrams")
+    inc("llm_tokens_total", 120, kind="prompt")
+
+Span durations (seconds) land in one histogram per stage name. When
+METRICS_ENABLED is off, span() hands back a shared no-op and timed()
+calls straight through, so instrumented code pays one flag check.
+
+Spans are also appended to the active collection, if any (see collect()):
+used for the Server-Timing header and to ship spans recorded in CPU
+worker processes back to the parent.
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend.app.app.config import settings
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative on export, like Prometheus)."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            buckets, running = {}, 0
+            for bound, c in zip(self.bounds + [float("inf")], self.counts):
+                running += c
+                buckets["+Inf" if bound == float("inf") else str(bound)] = running
+            return {
+                "count": self.count,
+                "sum": round(self.sum, 4),
+                "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+                "max": round(self.max, 4),
+                "buckets": buckets,
+            }
+
+
+# -- spans --
+
+SPAN_BOUNDS_S = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+enabled: bool = settings.METRICS_ENABLED
+
+_spans: Dict[str, Histogram] = {}
+_spans_lock = threading.Lock()
+# (name, seconds) pairs for the current request / worker task
+_collection: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "span_collection", default=None
+)
+# When set, spans are only collected; whoever collected them replays them
+_deferred: contextvars.ContextVar[bool] = contextvars.ContextVar("spans_deferred", default=False)
+
+
+def set_enabled(flag: bool):
+    global enabled
+    enabled = flag
+
+
+def observe_span(name: str, seconds: float):
+    if not _deferred.get():
+        hist = _spans.get(name)
+        if hist is None:
+            with _spans_lock:
+                hist = _spans.setdefault(name, Histogram(SPAN_BOUNDS_S))
+        hist.observe(seconds)
+    collected = _collection.get()
+    if collected is not None:
+        collected.append((name, seconds))
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_span(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """Context manager timing one stage."""
+    return _Span(name) if enabled else _NOOP
+
+
+def timed(name: str):
+    """Decorator form of span() for sync and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not enabled:
+                    return await fn(*args, **kwargs)
+                with _Span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def collect(defer: bool = False):
+    """
+    Also gather every span finished in this context (and tasks it spawns)
+    into a list. With defer=True spans are not recorded here at all: the
+    caller hands them to replay() elsewhere (e.g. from a worker process).
+    """
+    collected: List[Tuple[str, float]] = []
+    token = _collection.set(collected)
+    defer_token = _deferred.set(defer)
+    try:
+        yield collected
+    finally:
+        _deferred.reset(defer_token)
+        _collection.reset(token)
+
+
+def replay(collected: Iterable[Tuple[str, float]]):
+    for name, seconds in collected:
+        observe_span(name, seconds)
+
+
+def server_timing(collected: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value: total ms per stage, in first-seen order."""
+    totals: Dict[str, float] = {}
+    for name, seconds in collected:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+# -- counters --
+
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_counters_lock = threading.Lock()
+
+
+def inc(name: str, value: float = 1, **labels):
+    if not enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _counters_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+# -- Prometheus text format --
+
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+def register_collector(fn: Callable[[], Iterable[str]]):
+    """fn() yields exposition lines for state owned by another module."""
+    _collectors.append(fn)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + body + "}"
+
+
+def sample_lines(name: str, kind: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """# TYPE line plus one sample per (labels, value)."""
+    lines = [f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+def histogram_lines(name: str, series: Iterable[Tuple[Dict[str, str], Histogram]]) -> List[str]:
+    lines = [f"# TYPE {name} histogram"]
+    for labels, hist in series:
+        snap = hist.snapshot()
+        for le, count in snap["buckets"].items():
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {snap['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {snap['count']}")
+    return lines
+
+
+def render_prometheus() -> str:
+    lines = histogram_lines(
+        "blog_stage_duration_seconds",
+        (({"stage": name}, hist) for name, hist in sorted(_spans.items())),
+    )
+    with _counters_lock:
+        counters = sorted(_counters.items())
+    by_name: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for (name, labels), value in counters:
+        by_name.setdefault(name, []).append((dict(labels), value))
+    for name, samples in by_name.items():
+        lines.extend(sample_lines(name, "counter", samples))
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop recorded spans and counters (tests)."""
+    with _spans_lock:
+        _spans.clear()
+    with _counters_lock:
+        _counters.clear()
@@ -0,0 +1,309 @@
+# app/ngram_index.py
+"""
+Inverted index from n-grams to the history posts that use them, for
+keyword suggestions without an LLM call: "what does this user write next
+to the words around the cursor?"
+
+Terms and posts get integer ids. Postings live in CSR arrays (one int32
+posts array and one int32 counts array, sliced by a pointer per term),
+with the forward lists (each post's terms) alongside, because deleting a
+post and counting co-occurring terms both start from a post.
+
+Adding a post appends to a small pending segment; deleting one marks it
+dead and lowers document frequencies. Queries read the compacted arrays
+plus the pending posts. Compaction rebuilds the arrays from the live
+forward lists (dropping dead posts and unused terms) when the pending
+segment or the dead posts outgrow their share, and before saving, so a
+build of N posts compacts O(log N) times.
+
+A query scores posts by the idf of the context n-grams they contain,
+takes the best NGRAM_INDEX_QUERY_POSTS of them, and ranks their other
+n-grams (those used in at least two posts) by post score x (1 + log
+count) x idf. Both selections are partial (np.partition), never a full
+sort. The caller may instead pass the posts to start from with their
+scores, e.g. the history posts nearest the context by embedding
+(pattern_store's embedding index).
+"""
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from backend.app.app.config import settings
+from backend.app.app.text_stats import ngram_counts
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+_MIN_POSTS = 2  # an n-gram from a single post isn't a habit worth suggesting
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest positive scores, best first; ties go to the lower index."""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        values = scores[candidates]
+        kth = np.partition(values, -k)[-k]
+        above = candidates[values > kth]
+        candidates = np.concatenate([above, candidates[values == kth][:k - len(above)]])
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def _rows(ptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions of CSR rows `rows` (concatenated, in order) and each row's length."""
+    starts = ptr[rows]
+    lengths = ptr[rows + 1] - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum()), lengths
+
+
+class NgramIndex:
+    def __init__(self):
+        self.terms: List[str] = []  # term id -> n-gram
+        self._term_ids: Dict[str, int] = {}
+        self.df = np.zeros(1024, dtype=np.int32)  # live posts per term id (grown by doubling)
+        self.post_ids: List[Optional[str]] = []  # doc id -> post id, None once deleted
+        self._docs: Dict[str, int] = {}  # post id -> doc id
+        # Compacted segment: docs [0, n_base) and term ids [0, n_base_terms)
+        self._fwd_ptr = np.zeros(1, dtype=np.int64)
+        self._fwd_terms = self._fwd_counts = _EMPTY
+        self._inv_ptr = np.zeros(1, dtype=np.int64)
+        self._inv_docs = self._inv_counts = _EMPTY
+        self._dead = np.zeros(0, dtype=bool)  # per compacted doc
+        self._n_dead = 0
+        # Pending segment: doc id -> (term ids, counts), and its postings built on demand
+        self._pending: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending_inv: Optional[Dict[int, List[Tuple[int, int]]]] = None
+        self._lock = threading.RLock()
+
+    @property
+    def n_base(self) -> int:
+        return len(self._fwd_ptr) - 1
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, pid: str) -> bool:
+        return pid in self._docs
+
+    # -- updates --
+
+    def add(self, pid: str, counts: Mapping[str, int]) -> bool:
+        """Index one post's n-gram counts under `pid`; False if it is already indexed."""
+        with self._lock:
+            if pid in self._docs:
+                return False
+            term_ids = self._term_ids
+            new = [t for t in counts if t not in term_ids]
+            if new:
+                term_ids.update(zip(new, range(len(self.terms), len(self.terms) + len(new))))
+                self.terms.extend(new)
+            ids = np.fromiter(map(term_ids.__getitem__, counts), dtype=np.int32, count=len(counts))
+            if len(self.terms) > len(self.df):
+                self.df = np.concatenate([self.df, np.zeros(max(len(self.terms), len(self.df)), dtype=np.int32)])
+            self.df[ids] += 1  # ids are distinct within a post
+            doc = self._docs[pid] = len(self.post_ids)
+            self.post_ids.append(pid)
+            self._pending[doc] = (ids, np.fromiter(counts.values(), dtype=np.int32, count=len(counts)))
+            self._pending_inv = None
+        return True
+
+    def add_text(self, pid: str, text: str) -> bool:
+        return self.add(pid, ngram_counts(text))
+
+    def remove(self, pid: str) -> bool:
+        """Delete a post by id; False if it isn't indexed."""
+        with self._lock:
+            doc = self._docs.pop(pid, None)
+            if doc is None:
+                return False
+            self.post_ids[doc] = None
+            if doc in self._pending:
+                ids, _ = self._pending.pop(doc)
+                self._pending_inv = None
+            else:
+                ids = self._fwd_terms[self._fwd_ptr[doc]:self._fwd_ptr[doc + 1]]
+                self._dead[doc] = True
+                self._n_dead += 1
+            self.df[ids] -= 1
+        return True
+
+    def _needs_compaction(self) -> bool:
+        return (len(self._pending) > max(settings.NGRAM_INDEX_PENDING_POSTS, self.n_base // 4)
+                or self._n_dead > max(settings.NGRAM_INDEX_PENDING_POSTS, self.n_base // 4))
+
+    def compact(self):
+        """Fold pending posts into the CSR arrays and drop dead posts and unused terms."""
+        with self._lock:
+            if not self._pending and not self._n_dead and len(self.terms) == len(self._inv_ptr) - 1:
+                return
+            lengths = np.diff(self._fwd_ptr)
+            keep = ~np.repeat(self._dead, lengths)
+            live_docs = np.flatnonzero(~self._dead)
+            pending = sorted(self._pending)
+            doc_terms = np.concatenate([self._fwd_terms[keep]] + [self._pending[d][0] for d in pending])
+            doc_counts = np.concatenate([self._fwd_counts[keep]] + [self._pending[d][1] for d in pending])
+            lengths = np.concatenate([lengths[live_docs], [len(self._pending[d][0]) for d in pending]]).astype(np.int64)
+
+            # Renumber terms if some fell out of use
+            n_terms = len(self.terms)
+            live_terms = self.df[:n_terms] > 0
+            if not live_terms.all():
+                remap = np.cumsum(live_terms, dtype=np.int32) - 1
+                doc_terms = remap[doc_terms]
+                self.terms = [t for t, live in zip(self.terms, live_terms.tolist()) if live]
+                self._term_ids = dict(zip(self.terms, range(len(self.terms))))
+                df = self.df[:n_terms][live_terms]
+                self.df = np.concatenate([df, np.zeros(max(len(df), 1024), dtype=np.int32)])
+                n_terms = len(self.terms)
+
+            self.post_ids = [self.post_ids[d] for d in live_docs.tolist()] + [self.post_ids[d] for d in pending]
+            self._docs = {pid: i for i, pid in enumerate(self.post_ids)}
+            self._set_arrays(lengths, doc_terms, doc_counts, n_terms)
+
+    def _set_arrays(self, lengths: np.ndarray, doc_terms: np.ndarray, doc_counts: np.ndarray, n_terms: int):
+        n_docs = len(lengths)
+        self._fwd_ptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self._fwd_terms = doc_terms.astype(np.int32, copy=False)
+        self._fwd_counts = doc_counts.astype(np.int32, copy=False)
+        order = np.argsort(self._fwd_terms, kind="stable")  # postings in doc order
+        self._inv_docs = np.repeat(np.arange(n_docs, dtype=np.int32), lengths)[order]
+        self._inv_counts = self._fwd_counts[order]
+        per_term = np.bincount(self._fwd_terms, minlength=n_terms)
+        self._inv_ptr = np.concatenate([[0], np.cumsum(per_term)]).astype(np.int64)
+        self._dead = np.zeros(n_docs, dtype=bool)
+        self._n_dead = 0
+        self._pending = {}
+        self._pending_inv = None
+
+    # -- queries --
+
+    def postings(self, term: str) -> List[Tuple[str, int]]:
+        """(post id, count) for every live post using `term`."""
+        with self._lock:
+            tid = self._term_ids.get(term)
+            if tid is None or self.df[tid] <= 0:
+                return []
+            out = []
+            if tid < len(self._inv_ptr) - 1:
+                lo, hi = self._inv_ptr[tid], self._inv_ptr[tid + 1]
+                out = [(self.post_ids[d], c) for d, c in zip(self._inv_docs[lo:hi].tolist(),
+                                                              self._inv_counts[lo:hi].tolist())
+                       if not self._dead[d]]
+            return out + [(self.post_ids[d], c) for d, c in self._pending_postings().get(tid, [])]
+
+    def _pending_postings(self) -> Dict[int, List[Tuple[int, int]]]:
+        if self._pending_inv is None:
+            inv: Dict[int, List[Tuple[int, int]]] = {}
+            for doc, (ids, counts) in self._pending.items():
+                for tid, c in zip(ids.tolist(), counts.tolist()):
+                    inv.setdefault(tid, []).append((doc, c))
+            self._pending_inv = inv
+        return self._pending_inv
+
+    def _idf(self, tids) -> np.ndarray:
+        # CorpusTfidf's smoothed idf
+        return np.log((1 + len(self._docs)) / (1 + self.df[tids].astype(np.float64))) + 1
+
+    def related(self, context, k: int = 10, exclude: Iterable[str] = (),
+                posts: Optional[Mapping[str, float]] = None) -> List[Tuple[str, float]]:
+        """
+        The k n-grams that co-occur most with `context` (a text or n-gram
+        counts) in the indexed posts, best first, as (n-gram, score).
+        Context n-grams and `exclude` are never returned. With `posts`
+        (post id -> positive score), those posts are used instead of the
+        ones matching the context's n-grams; unknown ids are ignored.
+        """
+        counts = ngram_counts(context) if isinstance(context, str) else context
+        with self._lock:
+            if self._needs_compaction():
+                self.compact()
+            query = [tid for tid in map(self._term_ids.get, counts) if tid is not None and self.df[tid] > 0]
+            if (not query and posts is None) or k <= 0:
+                return []
+            query = np.array(query, dtype=np.int32)
+
+            pending_scores: Dict[int, float] = {}
+            if posts is not None:
+                doc_scores = np.zeros(self.n_base)
+                for doc, score in ((self._docs.get(pid), score) for pid, score in posts.items()):
+                    if doc is None or score <= 0:
+                        continue
+                    if doc in self._pending:
+                        pending_scores[doc] = score
+                    else:
+                        doc_scores[doc] = score
+            else:
+                # Posts scored by the idf of the context n-grams they contain
+                idf = self._idf(query)
+                in_base = query < len(self._inv_ptr) - 1
+                at, lengths = _rows(self._inv_ptr, query[in_base])
+                doc_scores = np.bincount(self._inv_docs[at], np.repeat(idf[in_base], lengths),
+                                         minlength=self.n_base)
+                doc_scores[self._dead] = 0
+                if self._pending:
+                    pending_inv = self._pending_postings()
+                    for t, w in zip(query.tolist(), idf.tolist()):
+                        for doc, _ in pending_inv.get(t, ()):
+                            pending_scores[doc] = pending_scores.get(doc, 0.0) + w
+
+            best = _top(doc_scores, settings.NGRAM_INDEX_QUERY_POSTS)
+            at, lengths = _rows(self._fwd_ptr, best)
+            terms, counts = self._fwd_terms[at], self._fwd_counts[at]
+            post_scores = np.repeat(doc_scores[best], lengths)
+            if pending_scores:
+                terms = np.concatenate([terms] + [self._pending[d][0] for d in pending_scores])
+                counts = np.concatenate([counts] + [self._pending[d][1] for d in pending_scores])
+                post_scores = np.concatenate([post_scores] + [np.full(len(self._pending[d][0]), s)
+                                                              for d, s in pending_scores.items()])
+
+            # Their n-grams used in more than one post, by post score x (1 + log count) x idf
+            shared = self.df[terms] >= _MIN_POSTS
+            if not shared.any():
+                return []
+            uniq, inverse = np.unique(terms[shared], return_inverse=True)
+            scores = np.bincount(inverse, post_scores[shared] * (1 + np.log(counts[shared]))) * self._idf(uniq)
+            banned = np.concatenate([query, np.fromiter((t for t in map(self._term_ids.get, exclude) if t is not None),
+                                                        dtype=np.int32)])
+            at = np.minimum(np.searchsorted(uniq, banned), len(uniq) - 1)  # uniq is sorted
+            scores[at[uniq[at] == banned]] = 0
+            top = _top(scores, k)
+            return [(self.terms[t], float(s)) for t, s in zip(uniq[top].tolist(), scores[top].tolist())]
+
+    # -- serialization (stored inside the owner's .npz) --
+
+    def to_arrays(self, prefix: str = "index_") -> Dict[str, np.ndarray]:
+        with self._lock:
+            self.compact()
+            return {
+                f"{prefix}terms": np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype=np.uint8),
+                f"{prefix}posts": np.array(self.post_ids, dtype="S"),
+                f"{prefix}ptr": self._fwd_ptr,
+                f"{prefix}doc_terms": self._fwd_terms,
+                f"{prefix}doc_counts": self._fwd_counts,
+            }
+
+    @classmethod
+    def from_arrays(cls, data, prefix: str = "index_") -> "NgramIndex":
+        index = cls()
+        raw_terms = data[f"{prefix}terms"].tobytes().decode("utf-8")
+        ptr = data[f"{prefix}ptr"]
+        index.terms = raw_terms.split("\n") if raw_terms else []
+        index._term_ids = dict(zip(index.terms, range(len(index.terms))))
+        index.post_ids = [p.decode("ascii") for p in data[f"{prefix}posts"].tolist()]
+        index._docs = {pid: i for i, pid in enumerate(index.post_ids)}
+        doc_terms = data[f"{prefix}doc_terms"]
+        index.df = np.concatenate([np.bincount(doc_terms, minlength=len(index.terms)).astype(np.int32),
+                                   np.zeros(1024, dtype=np.int32)])
+        index._set_arrays(np.diff(ptr), doc_terms, data[f"{prefix}doc_counts"], len(index.terms))
+        return index
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"posts": len(self._docs), "terms": int(np.count_nonzero(self.df)),
+                    "postings": int(len(self._fwd_terms) - np.diff(self._fwd_ptr)[self._dead].sum()
+                                    + sum(len(ids) for ids, _ in self._pending.values())),
+                    "pending": len(self._pending), "dead": self._n_dead}
+
+    def nbytes(self) -> int:
+        """Bytes held by the id arrays (the term strings and dicts come on top)."""
+        with self._lock:
+            return sum(a.nbytes for a in (self.df, self._fwd_ptr, self._fwd_terms, self._fwd_counts,
+                                          self._inv_ptr, self._inv_docs, self._inv_counts, self._dead))
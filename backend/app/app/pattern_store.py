@@ -0,0 +1,367 @@
+# app/pattern_store.py
+"""
+Per-user writing patterns, built once from history and kept up to date
+incrementally, so constructing a BlogAgent is a lookup instead of
+re-analysing every past post.
+
+A user's patterns are running sums: n-gram counts, sentiment totals,
+readability counts (sentences / words / syllables) and the TF-IDF document
+frequencies. Adding or removing a post analyses only that post and adjusts
+the sums. Posts are tracked by content hash so a client's history can be
+reconciled against what is stored. Each distinct post is also in an
+NgramIndex (ngram_index.py) for suggestions related to the cursor context.
+
+With HISTORY_EMBEDDINGS_ENABLED, each distinct post is also embedded as it
+is added, into an on-disk EmbeddingIndex (embedding_index.py) beside the
+patterns, so the fallback can start from the posts nearest the cursor
+context by meaning. Opening and searching it needs only numpy.
+
+Each user is one compressed .npz file under PATTERN_STORE_DIR (plus a .emb
+directory for the embeddings).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from backend.app.app.analysis import ngram_counts, sentiment_scores
+from backend.app.app.config import settings
+from backend.app.app.embedding_index import EmbeddingIndex
+from backend.app.app.embeddings import embedding_dim, index_texts
+from backend.app.app.ngram_index import NgramIndex
+from backend.app.app.scoring import _readability_counts
+from backend.app.app.tfidf_model import CorpusTfidf
+
+logger = logging.getLogger(__name__)
+
+_SENTIMENT_KEYS = ("pos", "neu", "neg", "compound")
+_KEYWORDS = 50  # as analyze_blogs
+
+
+def post_id(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class UserPatterns:
+    def __init__(self, n_features: int = 2 ** 18):
+        self.ngrams: Counter = Counter()
+        self.posts: Counter = Counter()  # post_id -> copies in the history
+        self.sentiment_sum = dict.fromkeys(_SENTIMENT_KEYS, 0.0)
+        self.sentiment_n = 0  # posts whose sentiment could be scored
+        self.readability = {"sentences": 0, "words": 0, "syllables": 0}
+        self.tfidf = CorpusTfidf(n_features)
+        self.index = NgramIndex()
+        self._keywords: Optional[List[str]] = None
+
+    @classmethod
+    def build(cls, posts: Iterable[str], n_features: Optional[int] = None) -> "UserPatterns":
+        patterns = cls(n_features or settings.TFIDF_N_FEATURES)
+        patterns.add_posts(posts)
+        return patterns
+
+    @property
+    def n_posts(self) -> int:
+        return sum(self.posts.values())
+
+    def __contains__(self, text: str) -> bool:
+        return self.posts.get(post_id(text), 0) > 0
+
+    def _apply(self, posts: List[str], sign: int):
+        for text in posts:
+            counts = ngram_counts(text)
+            pid = post_id(text)
+            if sign > 0:
+                self.ngrams.update(counts)
+                self.index.add(pid, counts)  # no-op for a further copy
+            else:
+                self.ngrams.subtract(counts)
+                for term in counts:
+                    if self.ngrams[term] <= 0:
+                        del self.ngrams[term]
+                if not self.posts.get(pid):
+                    self.index.remove(pid)  # last copy gone
+            try:
+                scores = sentiment_scores(text)
+            except Exception:
+                scores = None  # lexicon unavailable; baseline covers the other posts
+            if scores is not None:
+                for k in _SENTIMENT_KEYS:
+                    self.sentiment_sum[k] += sign * scores[k]
+                self.sentiment_n += sign
+            sentences, words, syllables = _readability_counts(text)
+            self.readability["sentences"] += sign * sentences
+            self.readability["words"] += sign * words
+            self.readability["syllables"] += sign * syllables
+        if sign < 0:
+            self.tfidf.remove(posts)
+        else:
+            self.tfidf.partial_fit(posts)
+        self._keywords = None
+
+    def add_posts(self, posts: Iterable[str]):
+        posts = list(posts)
+        self.posts.update(post_id(t) for t in posts)
+        self._apply(posts, 1)
+
+    def remove_posts(self, posts: Iterable[str]):
+        """Remove posts that are in the history; unknown posts are ignored."""
+        present = []
+        for text in posts:
+            pid = post_id(text)
+            if self.posts[pid] > 0:
+                self.posts[pid] -= 1
+                if not self.posts[pid]:
+                    del self.posts[pid]
+                present.append(text)
+        self._apply(present, -1)
+
+    def sync(self, history: List[str]) -> bool:
+        """
+        Make the stored history equal `history`. New posts are added
+        incrementally; if a stored post is missing, the patterns are rebuilt
+        (removing a post needs its text). Returns whether anything changed.
+        """
+        wanted = Counter(post_id(t) for t in history)
+        by_id = {post_id(t): t for t in history}
+        added = [by_id[pid] for pid, n in (wanted - self.posts).items() for _ in range(n)]
+        gone = self.posts - wanted
+        if gone or len(self.index) != len(self.posts):
+            # Removal needs the text; without it the only exact option is a rebuild.
+            # (So does a file saved before its posts were in the n-gram index.)
+            rebuilt = UserPatterns.build(history, self.tfidf.n_features)
+            self.__dict__.update(rebuilt.__dict__)
+            return True
+        if added:
+            self.add_posts(added)
+        return bool(added)
+
+    # -- what BlogAgent / recommend_for_draft consume --
+
+    def keywords(self, k: int = _KEYWORDS) -> List[str]:
+        if self._keywords is None or len(self._keywords) < k:
+            self._keywords = [w for w, _ in self.ngrams.most_common(max(k, _KEYWORDS))]
+        return self._keywords[:k]
+
+    def sentiment_baseline(self) -> Optional[Dict[str, float]]:
+        if self.sentiment_n <= 0:
+            return None
+        return {k: self.sentiment_sum[k] / self.sentiment_n for k in _SENTIMENT_KEYS}
+
+    def readability_stats(self) -> Dict[str, float]:
+        sentences = max(self.readability["sentences"], 1)
+        words = max(self.readability["words"], 1)
+        syllables = self.readability["syllables"]
+        return {
+            "grade": 0.39 * (words / sentences) + 11.8 * (syllables / words) - 15.59,
+            "reading_ease": 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words),
+            "words_per_sentence": words / sentences,
+        }
+
+    def summary(self) -> Dict:
+        """Same shape as analysis.analyze_blogs, plus readability."""
+        return {
+            "keywords": self.keywords(),
+            "sentiment": self.sentiment_baseline(),
+            "readability": self.readability_stats(),
+        }
+
+    # -- serialization --
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        terms = list(self.ngrams)
+        meta = {
+            "posts": dict(self.posts),
+            "sentiment_sum": self.sentiment_sum,
+            "sentiment_n": self.sentiment_n,
+            "readability": self.readability,
+            "n_features": self.tfidf.n_features,
+            "n_docs": self.tfidf.n_docs,
+        }
+        nz = np.flatnonzero(self.tfidf.df)
+        tmp = f"{path}.tmp.{os.getpid()}"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f,
+                meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+                terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+                counts=np.fromiter((self.ngrams[t] for t in terms), dtype=np.int32, count=len(terms)),
+                df_idx=nz.astype(np.int32),
+                df=self.tfidf.df[nz],
+                **self.index.to_arrays(),
+            )
+        os.replace(tmp, path)  # atomic, like the TF-IDF model files
+
+    @classmethod
+    def load(cls, path: str) -> "UserPatterns":
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            raw_terms = data["terms"].tobytes().decode("utf-8")
+            counts = data["counts"].tolist()
+            df_idx, df = data["df_idx"], data["df"]
+            index = NgramIndex.from_arrays(data) if "index_terms" in data else NgramIndex()
+        patterns = cls(meta["n_features"])
+        terms = raw_terms.split("\n") if counts else []
+        patterns.ngrams = Counter(dict(zip(terms, counts)))
+        patterns.posts = Counter(meta["posts"])
+        patterns.sentiment_sum = meta["sentiment_sum"]
+        patterns.sentiment_n = meta["sentiment_n"]
+        patterns.readability = meta["readability"]
+        patterns.tfidf.df[df_idx] = df
+        patterns.tfidf.n_docs = meta["n_docs"]
+        patterns.index = index
+        return patterns
+
+
+class PatternStore:
+    """
+    UserPatterns per user: in memory once loaded, persisted on every change.
+    Loads, builds and saves hold only that user's lock; the event loop uses
+    aget(), which never waits on one.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._users: Dict[str, UserPatterns] = {}
+        self._embeddings: Dict[str, EmbeddingIndex] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()  # guards _locks only
+
+    def _path(self, user: str) -> str:
+        # user ids may be API keys; never put them in a filename as-is
+        digest = hashlib.sha256(user.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}.npz")
+
+    def _embeddings_path(self, user: str) -> str:
+        return self._path(user)[:-len(".npz")] + ".emb"
+
+    def _user_lock(self, user: str) -> threading.Lock:
+        with self._lock:
+            lock = self._locks.get(user)
+            if lock is None:
+                lock = self._locks[user] = threading.Lock()
+        return lock
+
+    def cached(self, user: str) -> Optional[UserPatterns]:
+        """The user's patterns if already in memory; never reads the disk or waits on a lock."""
+        return self._users.get(user)
+
+    def get(self, user: str) -> Optional[UserPatterns]:
+        patterns = self._users.get(user)
+        if patterns is None:
+            path = self._path(user)
+            if not os.path.exists(path):
+                return None
+            with self._user_lock(user):
+                patterns = self._users.get(user)
+                if patterns is None:
+                    patterns = self._users[user] = UserPatterns.load(path)
+        return patterns
+
+    async def aget(self, user: str) -> Optional[UserPatterns]:
+        """get() for the event loop: a loaded user is returned inline, a load runs in a worker thread."""
+        patterns = self._users.get(user)
+        if patterns is None:
+            patterns = await asyncio.to_thread(self.get, user)
+        return patterns
+
+    def get_or_build(self, user: str, history: Optional[List[str]] = None) -> UserPatterns:
+        """
+        Stored patterns for `user`. A non-empty `history` is treated as the
+        user's full history: new posts are added, missing ones removed.
+        """
+        with self._user_lock(user):
+            patterns = self._users.get(user)
+            path = self._path(user)
+            if patterns is None and os.path.exists(path):
+                patterns = UserPatterns.load(path)
+            if patterns is None:
+                patterns = UserPatterns.build(history or [])
+                changed = True
+            else:
+                changed = bool(history) and patterns.sync(history)
+            if changed:
+                patterns.save(path)
+            self._users[user] = patterns
+            self._embed_posts(user, history or [])
+        return patterns
+
+    def add_post(self, user: str, text: str) -> UserPatterns:
+        return self._update(user, lambda p: p.add_posts([text]), embed=[text])
+
+    def remove_post(self, user: str, text: str) -> UserPatterns:
+        return self._update(user, lambda p: p.remove_posts([text]))
+
+    def _update(self, user: str, change, embed: Iterable[str] = ()) -> UserPatterns:
+        with self._user_lock(user):
+            patterns = self._users.get(user)
+            path = self._path(user)
+            if patterns is None:
+                patterns = UserPatterns.load(path) if os.path.exists(path) else UserPatterns.build([])
+            change(patterns)
+            patterns.save(path)
+            self._users[user] = patterns
+            self._embed_posts(user, embed)
+        return patterns
+
+    def embeddings(self, user: str) -> Optional[EmbeddingIndex]:
+        """
+        The user's post embeddings (ids are post_id()s), or None if none were
+        stored. Opening needs only numpy, never the sentence transformer.
+        The index is append-only: rows of removed posts stay, so callers
+        keep only ids still in the patterns.
+        """
+        index = self._embeddings.get(user)
+        if index is None:
+            path = self._embeddings_path(user)
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                return None
+            index = self._embeddings.setdefault(user, EmbeddingIndex(path))
+        return index
+
+    def _embed_posts(self, user: str, posts: Iterable[str]):
+        # Caller holds the user's lock. Embedding is best effort: the patterns are already saved
+        posts = list(posts)
+        if not settings.HISTORY_EMBEDDINGS_ENABLED or not posts:
+            return
+        try:
+            index = self.embeddings(user)
+            known = set(index.ids) if index is not None else set()
+            new = {}
+            for text in posts:
+                pid = post_id(text)
+                if pid not in known:
+                    new.setdefault(pid, text)
+            if not new:
+                return
+            if index is None:
+                index = self._embeddings[user] = EmbeddingIndex(
+                    self._embeddings_path(user), dim=embedding_dim(), dtype=settings.HISTORY_EMBEDDINGS_DTYPE)
+            index_texts(index, list(new), list(new.values()))
+        except Exception as e:
+            logger.warning("could not embed %d posts: %s", len(posts), e)
+
+    def evict(self, user: Optional[str] = None):
+        """Forget in-memory copies (files stay); all users if `user` is None."""
+        if user is None:
+            self._users.clear()
+            self._embeddings.clear()
+        else:
+            self._users.pop(user, None)
+            self._embeddings.pop(user, None)
+
+
+_store: Optional[PatternStore] = None
+
+
+def get_pattern_store() -> PatternStore:
+    global _store
+    if _store is None:
+        _store = PatternStore(settings.PATTERN_STORE_DIR)
+    return _store
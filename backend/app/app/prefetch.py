@@ -0,0 +1,194 @@
+# app/prefetch.py
+"""
+Speculative suggestion prefetch for one drafting session.
+
+Writers pause at the end of sentences and paragraphs, so when an observed
+draft ends at such a boundary the recommend pipeline is started right away
+for that draft, before the user pauses long enough to send a request. The
+result is kept under that draft prefix. The next request is served from it
+if its draft is the prefix plus at most the start of one new sentence, with
+the same profile. A draft that edits the prefix, or crosses into a second
+new sentence, discards the speculation (cancelling it if it is still
+running), and so does a newer boundary.
+
+Speculative LLM spend per session is capped: each speculation reserves an
+estimate of its tokens up front, settled against real usage when it
+finishes (cancelled ones keep the estimate; the prompt was likely billed).
+Tokens of speculations that were never served count as wasted. With a
+tenant set, the same reservation is taken from the tenant's LLM token
+bucket (ratelimit.py) and settled with it; a speculation the bucket can't
+cover is skipped.
+"""
+import asyncio
+import contextvars
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from backend.app.app import metrics
+from backend.app.app.config import settings
+from backend.app.app.ratelimit import BULK, RateLimited, get_rate_limiter, shed_check
+from backend.app.app.semantic_cache import profile_key
+from backend.app.app.tokens import count_tokens
+
+# A sentence end (optionally closed by quotes/brackets) or a blank line, then only whitespace
+_boundary_re = re.compile(r"(?:[.!?][\"')\]]*|\n\s*\n)\s*$")
+_sentence_end_re = re.compile(r"[.!?]")
+_MIN_WORDS = 5  # don't speculate on a one-line stub
+
+
+def at_boundary(draft: str) -> bool:
+    return bool(_boundary_re.search(draft)) and len(draft.split()) >= _MIN_WORDS
+
+
+class _Speculation:
+    __slots__ = ("prefix", "profile", "task", "estimate", "reserved")
+
+    def __init__(self, prefix: str, profile: str, estimate: int, reserved: float = 0.0):
+        self.prefix = prefix
+        self.profile = profile
+        self.estimate = estimate
+        self.reserved = reserved  # from the tenant's token bucket
+        self.task: Optional[asyncio.Task] = None
+
+
+class Prefetcher:
+    """
+    `compute(prefix, profile)` runs the recommend pipeline for a draft
+    prefix and returns recommend_for_draft's result. Call observe() with
+    every draft the user produces and take() when a suggestion request
+    arrives. Runs on the event loop thread only. `tenant`, if set, is
+    charged for speculative tokens like a request.
+    """
+
+    def __init__(self, compute: Callable[[str, Dict], Awaitable[Dict[str, Any]]], token_budget: int,
+                 tenant: Optional[str] = None):
+        self.compute = compute
+        self.token_budget = token_budget
+        self.tenant = tenant
+        self.spent = 0  # reserved + settled tokens of every speculation started
+        self._current: Optional[_Speculation] = None
+        self.counts = {"started": 0, "hits": 0, "discarded": 0, "skipped": 0,
+                       "tokens_served": 0, "tokens_wasted": 0}
+
+    def _extends(self, spec: _Speculation, draft: str, profile: str) -> bool:
+        # The prefix unchanged plus, at most, the beginning of one new sentence
+        return (profile == spec.profile and draft.startswith(spec.prefix)
+                and not _sentence_end_re.search(draft, len(spec.prefix)))
+
+    def _tokens(self, spec: _Speculation) -> int:
+        task = spec.task
+        if task.done() and not task.cancelled() and task.exception() is None:
+            return task.result().get("token_usage", {}).get("total_tokens", 0)
+        return spec.estimate
+
+    def _resolve(self, spec: _Speculation, hit: bool, reason: str = ""):
+        tokens = self._tokens(spec)
+        if hit:
+            self.counts["hits"] += 1
+            self.counts["tokens_served"] += tokens
+            metrics.inc("blog_prefetch_total", outcome="hit")
+            metrics.inc("blog_prefetch_tokens_total", tokens, kind="served")
+        else:
+            self.counts["discarded"] += 1
+            self.counts["tokens_wasted"] += tokens
+            metrics.inc("blog_prefetch_total", outcome="discarded", reason=reason)
+            metrics.inc("blog_prefetch_tokens_total", tokens, kind="wasted")
+
+    def _discard(self, reason: str):
+        spec, self._current = self._current, None
+        if not spec.task.done():
+            spec.task.cancel()
+        self._resolve(spec, False, reason)
+
+    def _skip(self, reason: str) -> bool:
+        self.counts["skipped"] += 1
+        metrics.inc("blog_prefetch_total", outcome="skipped", reason=reason)
+        return False
+
+    def observe(self, draft: str, profile: Optional[Dict]) -> bool:
+        """Note the latest draft; returns True if a speculation was started for it."""
+        key = profile_key(profile)
+        current = self._current
+        if current is not None:
+            if current.prefix == draft and current.profile == key:
+                return False
+            if not self._extends(current, draft, key):
+                self._discard("diverged")
+        if not at_boundary(draft):
+            return False
+        if self._current is not None:
+            self._discard("superseded")
+
+        estimate = min(count_tokens(draft), settings.PROMPT_MAX_TOKENS) + settings.LLM_COMPLETION_TOKENS_ESTIMATE
+        if self.spent + estimate > self.token_budget:
+            return self._skip("budget")
+        try:
+            shed_check(BULK)  # speculation is the first thing to go under load
+        except RateLimited:
+            return self._skip("overload")
+        reserved = 0.0
+        if self.tenant is not None:
+            try:
+                reserved = get_rate_limiter().reserve_tokens(self.tenant, estimate)
+            except RateLimited:
+                return self._skip("rate_limited")
+
+        spec = self._current = _Speculation(draft, key, estimate, reserved)
+        self.spent += estimate
+        self.counts["started"] += 1
+        metrics.inc("blog_prefetch_total", outcome="started")
+        # A fresh context: no request deadline or span collector leaks into the background task
+        spec.task = asyncio.create_task(self.compute(draft, profile or {}), context=contextvars.Context())
+        spec.task.add_done_callback(lambda task, spec=spec: self._settle(spec, task))
+        return True
+
+    def _settle(self, spec: _Speculation, task: asyncio.Task):
+        # Replace the reservation with what the speculation really used
+        tokens = self._tokens(spec)
+        self.spent += tokens - spec.estimate
+        if self.tenant is not None:
+            get_rate_limiter().settle_tokens(self.tenant, spec.reserved, tokens)
+
+    async def take(self, draft: str, profile: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        """The speculative result for `draft`, waiting for it if still running; None on a miss."""
+        spec = self._current
+        if spec is None:
+            return None
+        if not self._extends(spec, draft, profile_key(profile)):
+            self._discard("diverged")
+            return None
+        self._current = None
+        try:
+            # Shielded: a superseded request must not cancel work the next one may use
+            result = await asyncio.shield(spec.task)
+        except asyncio.CancelledError:
+            if self._current is None:
+                self._current = spec  # still good for the request that superseded this one
+            else:
+                # A newer speculation started meanwhile; nothing will take this one
+                if not spec.task.done():
+                    spec.task.cancel()
+                self._resolve(spec, False, "superseded")
+            raise
+        except Exception:
+            result = None
+        if result is None or result.get("fallback"):
+            # The LLM failed for the speculation; let the request try it itself
+            self._resolve(spec, False, "failed")
+            return None
+        self._resolve(spec, True)
+        return result
+
+    def cancel(self):
+        """End of session: drop any pending speculation."""
+        if self._current is not None:
+            self._discard("closed")
+
+    def stats(self) -> Dict[str, Any]:
+        resolved = self.counts["hits"] + self.counts["discarded"]
+        return {
+            **self.counts,
+            "hit_rate": self.counts["hits"] / resolved if resolved else 0.0,
+            "tokens_spent": self.spent,
+            "token_budget": self.token_budget,
+        }
@@ -0,0 +1,110 @@
+# app/prompt_builder.py
+"""
+Token-budgeted prompts for draft recommendations.
+
+Only a window of text around the cursor is sent verbatim (by default 3/4 of
+it before the cursor, 1/4 after). The rest of the draft is replaced by its
+top n-gram terms. Those are summed over '.'-delimited pieces (the unit
+draft_state uses) whose counts are memoized by text, so only the pieces a
+keystroke or a smaller window changes are counted again. The profile is serialized as compact JSON with
+empty fields dropped. If the prompt still exceeds the hard cap, the window
+and term list are shrunk until it fits.
+"""
+import json
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.app.app import metrics
+from backend.app.app.text_stats import ngram_counts
+from backend.app.app.config import settings
+from backend.app.app.tokens import count_tokens, head_tokens, tail_tokens, tokenizer_name
+
+_PIECE_CACHE_SIZE = 4096
+_piece_counts: "OrderedDict[str, Counter]" = OrderedDict()
+_MIN_WINDOW = 32
+
+
+def _piece_ngrams(piece: str) -> Counter:
+    counts = _piece_counts.get(piece)
+    if counts is None:
+        counts = _piece_counts[piece] = ngram_counts(piece)
+        while len(_piece_counts) > _PIECE_CACHE_SIZE:
+            _piece_counts.popitem(last=False)
+    else:
+        _piece_counts.move_to_end(piece)
+    return counts
+
+
+def summary_terms(text: str, k: int) -> List[str]:
+    """Top `k` n-gram terms of `text`, from memoized per-piece counts (no bigrams across a '.')."""
+    if not text.strip() or k <= 0:
+        return []
+    counts: Counter = Counter()
+    for piece in text.split("."):
+        if piece.strip():
+            counts.update(_piece_ngrams(piece))
+    return [w for w, _ in counts.most_common(k)]
+
+
+def compact_profile(profile: Optional[Dict]) -> str:
+    """Minimal JSON for the profile: sorted keys, no whitespace, no empty values."""
+    kept = {k: v for k, v in (profile or {}).items() if v not in (None, "", [], {})}
+    return json.dumps(kept, separators=(",", ":"), sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _render(instructions: str, before: str, after: str, terms: List[str], profile_json: str) -> str:
+    parts = [instructions.strip()]
+    if terms:
+        parts.append("Key terms from the rest of the draft: " + ", ".join(terms))
+    parts.append(f"Text before cursor:\n{before}")
+    if after:
+        parts.append(f"Text after cursor:\n{after}")
+    parts.append(f"User profile: {profile_json}")
+    return "\n\n".join(parts)
+
+
+@metrics.timed("prompt.build")
+def build_prompt(
+    instructions: str,
+    cursor_before: str,
+    cursor_after: str,
+    profile: Optional[Dict],
+    window_tokens: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    summary_k: Optional[int] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Prompt for the draft `cursor_before + cursor_after`, plus stats:
+    {"prompt_tokens_local", "prompt_tokens_full", "prompt_tokens_saved", "tokenizer"}.
+    "full" is what sending the whole draft and raw profile would have cost.
+    """
+    window = window_tokens or settings.PROMPT_WINDOW_TOKENS
+    max_tokens = max_tokens or settings.PROMPT_MAX_TOKENS
+    k = settings.PROMPT_SUMMARY_TERMS if summary_k is None else summary_k
+    profile_json = compact_profile(profile)
+
+    while True:
+        before = tail_tokens(cursor_before, window - window // 4)
+        after = head_tokens(cursor_after, window - count_tokens(before))
+        # Whatever fell outside the window is represented by its key terms
+        outside = cursor_before[: len(cursor_before) - len(before)] + " " + cursor_after[len(after):]
+        terms = summary_terms(outside, k)
+        prompt = _render(instructions, before, after, terms, profile_json)
+        n = count_tokens(prompt)
+        if n <= max_tokens or (window <= _MIN_WINDOW and not terms):
+            break
+        window = max(_MIN_WINDOW, window // 2)
+        k //= 2
+
+    if n > max_tokens:
+        # Oversized instructions or profile: hard truncate, keeping the cursor end
+        prompt = tail_tokens(prompt, max_tokens)
+        n = count_tokens(prompt)
+
+    full = count_tokens(f"{instructions}\n{cursor_before}{cursor_after}\nUser Profile: {profile}")
+    return prompt, {
+        "prompt_tokens_local": n,
+        "prompt_tokens_full": full,
+        "prompt_tokens_saved": max(0, full - n),
+        "tokenizer": tokenizer_name(),
+    }
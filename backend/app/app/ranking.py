@@ -0,0 +1,209 @@
+# app/ranking.py
+"""
+Vectorized ranking of keyword suggestions.
+
+Each candidate phrase becomes one row of a feature matrix:
+
+    frequency    history/draft frequency of the phrase and its words, saturating to [0, 1)
+    topic        1 if the phrase mentions a preferred topic
+    similarity   TF-IDF cosine between the phrase and the text around the cursor
+    readability  change in the cursor sentence's reading ease if the phrase were
+                 inserted, scaled to [-1, 1] (positive = easier to read)
+    novelty      1 if the draft doesn't contain the phrase yet
+
+Candidates containing a banned word are masked out. All candidates are
+scored in one matrix-vector product with the configured weights, and the
+top k are picked with a partial sort. The same ranker orders LLM
+suggestions and, when the LLM is unavailable, locally generated ones.
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.app.app.config import settings
+from backend.app.app.semantic_cache import cursor_window
+from backend.app.app.text_stats import TextStats, count_syllables
+from backend.app.app.tfidf_model import CorpusTfidf
+
+FEATURES = ("frequency", "topic", "similarity", "readability", "novelty")
+FREQUENCY_HALF = 4.0  # raw frequency that scores 0.5
+READABILITY_SCALE = 50.0  # reading-ease change that scores ±1
+
+_word_re = re.compile(r"\w+")  # readability words, as in text_stats
+_token_re = re.compile(r"(?u)\b\w\w+\b")  # HashingVectorizer's default token pattern
+_split_re = re.compile(r"\S+")  # str.split() words, as in the frequency map
+_sentence_end_re = re.compile(r"[.!?]")
+
+_plain_tfidf: Optional[CorpusTfidf] = None
+
+
+def _default_tfidf() -> CorpusTfidf:
+    # No corpus statistics: every idf is 1, so similarity is plain term overlap
+    global _plain_tfidf
+    if _plain_tfidf is None:
+        _plain_tfidf = CorpusTfidf(settings.TFIDF_N_FEATURES)
+    return _plain_tfidf
+
+
+def weight_vector(weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Weights in FEATURES order; missing features weigh 0."""
+    weights = settings.RANK_WEIGHTS if weights is None else weights
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"unknown ranking features: {sorted(unknown)}")
+    return np.array([float(weights.get(f, 0.0)) for f in FEATURES])
+
+
+def _cursor_sentence(cursor_before: str, cursor_after: str) -> str:
+    start = max((m.end() for m in _sentence_end_re.finditer(cursor_before)), default=0)
+    end = _sentence_end_re.search(cursor_after)
+    return cursor_before[start:] + " " + cursor_after[:end.start() if end else len(cursor_after)]
+
+
+def _word_matrix(lowered: List[str], pattern: "re.Pattern") -> Tuple["sparse.csr_matrix", List[str]]:
+    """(phrase x distinct word) count matrix over the words `pattern` finds, and those words."""
+    from scipy import sparse  # comes with sklearn; imported on first use like it
+    vocab: Dict[str, int] = {}
+    ids: List[int] = []
+    indptr = [0]
+    for phrase in lowered:
+        ids.extend(vocab.setdefault(w, len(vocab)) for w in pattern.findall(phrase))
+        indptr.append(len(ids))
+    counts = sparse.csr_matrix((np.ones(len(ids)), ids, indptr), shape=(len(lowered), len(vocab)))
+    counts.sum_duplicates()
+    return counts, list(vocab)
+
+
+def _one_sentence_ease(words, syllables):
+    # Flesch reading ease of a single sentence; works on scalars and arrays
+    return 206.835 - 1.015 * words - 84.6 * (syllables / words)
+
+
+def top_k(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Indices of the k highest scores, best first; ties keep input order."""
+    n = len(scores)
+    if k is not None and k < n:
+        if k <= 0:
+            return np.zeros(0, dtype=np.intp)
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
+class SuggestionRanker:
+    """
+    Ranks candidate suggestions for one draft. Build it once per request
+    (it pre-computes the cursor context) and call rank() for every batch,
+    including single suggestions as they stream in.
+    """
+
+    def __init__(self, profile: Optional[Dict], freq_map: Dict[str, int], cursor_before: str = "",
+                 cursor_after: str = "", tfidf: Optional[CorpusTfidf] = None,
+                 weights: Optional[Dict[str, float]] = None):
+        profile = profile or {}
+        self.banned = [w.lower() for w in profile.get("banned_words", []) if w]
+        self.topics = [t.lower() for t in profile.get("preferred_topics", []) if t]
+        self.freq_map = freq_map
+        self.weights = weight_vector(weights)
+        self.tfidf = tfidf
+        self.draft_lower = (cursor_before + cursor_after).lower()
+        self.context = cursor_window(cursor_before, cursor_after, settings.RANK_CONTEXT_TOKENS).strip()
+        sentence = TextStats(_cursor_sentence(cursor_before, cursor_after))
+        self.sentence_words = len(sentence.words)
+        self.sentence_syllables = sum(sentence.syllables)
+        self._context_row = None
+
+    # -- features --
+
+    def _frequency(self, lowered: List[str]) -> np.ndarray:
+        counts, words = _word_matrix(lowered, _split_re)
+        per_word = np.fromiter((self.freq_map.get(w, 0) for w in words), dtype=np.float64, count=len(words))
+        raw = np.fromiter((self.freq_map.get(p, 0) for p in lowered), dtype=np.float64, count=len(lowered))
+        raw += 0.5 * (counts @ per_word)
+        return raw / (raw + FREQUENCY_HALF)
+
+    def _contains_any(self, lowered: np.ndarray, needles: List[str]) -> np.ndarray:
+        mask = np.zeros(len(lowered), dtype=bool)
+        for needle in needles:
+            mask |= np.char.find(lowered, needle) >= 0
+        return mask
+
+    def _similarity(self, lowered: List[str]) -> np.ndarray:
+        # Cosine of each phrase's TF-IDF row with the context's, equal to
+        # model.transform(phrases) @ context.T up to hash collisions within a
+        # phrase, but every distinct word is hashed only once per batch.
+        sims = np.zeros(len(lowered))
+        if not self.context:
+            return sims
+        model = self.tfidf or _default_tfidf()
+        if self._context_row is None:
+            self._context_row = model.transform([self.context])
+        counts, words = _word_matrix(lowered, _token_re)
+        if not words:
+            return sims
+        buckets = model.hasher.transform(words).indices  # exactly one term per word
+        weighted = counts.multiply(model.idf[buckets]).tocsr()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        dots = weighted @ self._context_row[:, buckets].toarray().ravel()
+        return np.divide(dots, norms, out=sims, where=norms > 0)
+
+    def _readability(self, lowered: List[str]) -> np.ndarray:
+        if not self.sentence_words:
+            return np.zeros(len(lowered))
+        counts, words = _word_matrix(lowered, _word_re)
+        syllables = np.fromiter((count_syllables(w) for w in words), dtype=np.float64, count=len(words))
+        n_words = np.asarray(counts.sum(axis=1), dtype=np.float64).ravel()
+        base = _one_sentence_ease(self.sentence_words, self.sentence_syllables)
+        after = _one_sentence_ease(self.sentence_words + n_words, self.sentence_syllables + counts @ syllables)
+        return np.clip((after - base) / READABILITY_SCALE, -1.0, 1.0)
+
+    def features(self, phrases: Sequence[str]) -> np.ndarray:
+        """(len(phrases), len(FEATURES)) feature matrix."""
+        phrases = list(phrases)
+        if not phrases:
+            return np.zeros((0, len(FEATURES)))
+        lowered = [p.lower() for p in phrases]
+        return np.column_stack([
+            self._frequency(lowered),
+            self._contains_any(np.array(lowered), self.topics).astype(np.float64),
+            self._similarity(lowered),
+            self._readability(lowered),
+            (np.char.find(self.draft_lower, np.array(lowered)) < 0).astype(np.float64),
+        ])
+
+    # -- ranking --
+
+    def rank(self, suggestions: Sequence, k: Optional[int] = None) -> List[Dict]:
+        """
+        Suggestions (dicts with "phrase", or plain strings) best first, at
+        most k of them, each with a `relevance_score` (the weighted feature
+        sum, scaled so a candidate maxing every feature scores 100). Blank
+        phrases, repeats and phrases containing a banned word are dropped.
+        """
+        items, seen = [], set()
+        for s in suggestions:
+            item = dict(s) if isinstance(s, dict) else {"phrase": str(s), "reason": ""}
+            phrase = (item.get("phrase") or "").strip()
+            if phrase and phrase.lower() not in seen:
+                seen.add(phrase.lower())
+                item["phrase"] = phrase
+                items.append(item)
+        if not items:
+            return []
+
+        lowered = np.array([item["phrase"].lower() for item in items])
+        keep = ~self._contains_any(lowered, self.banned)
+        if not keep.all():
+            items = [item for item, ok in zip(items, keep) if ok]
+            if not items:
+                return []
+
+        scores = self.features([item["phrase"] for item in items]) @ self.weights
+        scores *= 100.0 / max(float(np.abs(self.weights).sum()), 1e-9)
+        ranked = []
+        for i in top_k(scores, k):
+            items[i]["relevance_score"] = round(float(scores[i]), 4)
+            ranked.append(items[i])
+        return ranked
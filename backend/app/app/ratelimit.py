@@ -0,0 +1,186 @@
+# app/ratelimit.py
+"""
+Per-API-key rate limits and load shedding.
+
+Each tenant gets two token buckets: requests per second and estimated LLM
+tokens per minute. Token cost is reserved up front from an estimate and
+settled against the real usage afterwards, so a tenant that under-estimates
+runs into debt and waits longer next time.
+
+Independently of the buckets, requests are shed while the process is
+overloaded (in-flight LLM calls or queued CPU tasks over a threshold).
+Bulk traffic has lower thresholds than interactive traffic, so it backs
+off first and interactive requests keep their headroom.
+
+Everything here runs on the event loop thread (limits are checked by async
+dependencies, LLM calls are counted in the async client path), so the
+buckets and counters are plain attributes without locks.
+"""
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from backend.app.app.config import settings
+from backend.app.app import metrics
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+
+class RateLimited(Exception):
+    """Request refused; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}: retry after {retry_after:.2f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, n: float = 1.0) -> float:
+        """Take n tokens and return 0, or take nothing and return seconds until n are available."""
+        self._refill(time.monotonic())
+        if self.tokens >= n:
+            self.tokens -= n
+            return 0.0
+        return (n - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def charge(self, n: float):
+        """Unconditionally take (n > 0) or return (n < 0) tokens; may leave the bucket in debt."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens - n)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_s: float, request_burst: float, tokens_per_min: float):
+        self.requests_per_s = requests_per_s
+        self.request_burst = request_burst
+        self.tokens_per_min = tokens_per_min
+        self._requests: Dict[str, TokenBucket] = {}
+        self._tokens: Dict[str, TokenBucket] = {}
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], tenant: str, rate: float, capacity: float) -> TokenBucket:
+        bucket = buckets.get(tenant)
+        if bucket is None:
+            bucket = buckets[tenant] = TokenBucket(rate, capacity)
+        return bucket
+
+    def check_request(self, tenant: str):
+        """Count one request against the tenant's rate. Raises RateLimited."""
+        if self.requests_per_s <= 0:
+            return
+        bucket = self._bucket(self._requests, tenant, self.requests_per_s, max(self.request_burst, 1))
+        wait = bucket.take()
+        if wait:
+            raise RateLimited("rate", wait)
+
+    def reserve_tokens(self, tenant: str, estimate: float) -> float:
+        """
+        Reserve estimated LLM tokens; raises RateLimited if the budget can't
+        cover them yet. Returns the amount reserved (pass it to settle_tokens).
+        """
+        if self.tokens_per_min <= 0:
+            return 0.0
+        bucket = self._bucket(self._tokens, tenant, self.tokens_per_min / 60.0, self.tokens_per_min)
+        estimate = min(estimate, bucket.capacity)  # one huge request must still be admissible
+        wait = bucket.take(estimate)
+        if wait:
+            raise RateLimited("tokens", wait)
+        return estimate
+
+    def settle_tokens(self, tenant: str, reserved: float, actual: float):
+        """Correct a reservation with the tokens actually used."""
+        bucket = self._tokens.get(tenant)
+        if bucket is not None:
+            bucket.charge(actual - reserved)
+
+
+# -- load --
+
+class Load:
+    """In-flight LLM calls, counted by llm.py's async paths."""
+
+    def __init__(self):
+        self.llm_inflight = 0
+
+    @contextmanager
+    def llm_call(self):
+        self.llm_inflight += 1
+        try:
+            yield
+        finally:
+            self.llm_inflight -= 1
+
+
+load = Load()
+
+
+def _cpu_pending() -> int:
+    from backend.app.app import cpu_executor
+    return cpu_executor.pending()
+
+
+def shed_check(priority: str):
+    """Raise RateLimited("overload") if `priority` traffic should be shed right now."""
+    if priority == INTERACTIVE:
+        llm_limit, cpu_limit = settings.SHED_LLM_INFLIGHT_INTERACTIVE, settings.SHED_CPU_QUEUE_INTERACTIVE
+    else:
+        llm_limit, cpu_limit = settings.SHED_LLM_INFLIGHT_BULK, settings.SHED_CPU_QUEUE_BULK
+    if (llm_limit and load.llm_inflight >= llm_limit) or (cpu_limit and _cpu_pending() >= cpu_limit):
+        raise RateLimited("overload", settings.SHED_RETRY_AFTER_S)
+
+
+def admit(tenant: str, priority: str, estimated_tokens: float = 0.0) -> float:
+    """
+    Admission for one request: load shedding, then the request rate, then
+    the token budget. Returns the tokens reserved. Raises RateLimited.
+    """
+    try:
+        shed_check(priority)
+        limiter = get_rate_limiter()
+        limiter.check_request(tenant)
+        return limiter.reserve_tokens(tenant, estimated_tokens) if estimated_tokens else 0.0
+    except RateLimited as e:
+        metrics.inc("blog_requests_rejected_total", reason=e.reason, priority=priority)
+        raise
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(
+            requests_per_s=settings.RATE_LIMIT_RPS,
+            request_burst=settings.RATE_LIMIT_BURST,
+            tokens_per_min=settings.LLM_TOKENS_PER_MIN,
+        )
+    return _limiter
+
+
+def _prometheus_lines():
+    return (
+        metrics.sample_lines("blog_llm_inflight", "gauge", [({}, load.llm_inflight)])
+        + metrics.sample_lines("blog_cpu_pending_tasks", "gauge", [({}, _cpu_pending())])
+    )
+
+
+metrics.register_collector(_prometheus_lines)
@@ -0,0 +1,123 @@
+# app/realtime.py
+"""
+Per-connection driver for BlogAgent over a WebSocket.
+
+Each new draft replaces the pending one: the previous task is cancelled
+whether it is still in its debounce sleep or already computing, so a burst
+of keystrokes produces one scoring pass for the last draft only.
+
+With stream=True each suggestion is also pushed on its own as soon as
+the LLM produces it ({"type": "suggestion", "id": ...}), ahead of the
+full payload (then tagged "type": "done").
+
+With prefetch=True every draft is also shown to the agent as it arrives,
+undebounced, so it can start on suggestions at sentence ends (see
+BlogAgent.speculate).
+
+With a tenant, each debounced draft reserves an estimate of its LLM tokens
+from the tenant's budget before it is computed and settles it against the
+usage in the payload. A draft the budget can't cover gets an error payload
+instead; a cancelled or failed one keeps its reservation.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from backend.app.app import metrics
+from backend.app.app.agent import BlogAgent
+from backend.app.app.config import settings
+from backend.app.app.ratelimit import INTERACTIVE, RateLimited, get_rate_limiter
+from backend.app.app.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class SuggestionSession:
+    def __init__(
+        self,
+        agent: BlogAgent,
+        profile: Dict,
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+        debounce_ms: int = 250,
+        stream: bool = False,
+        prefetch: bool = False,
+        tenant: Optional[str] = None,
+    ):
+        self.agent = agent
+        self.profile = profile
+        self.send = send
+        self.debounce_ms = debounce_ms
+        self.stream = stream
+        self.prefetch = prefetch
+        self.tenant = tenant
+        if prefetch and tenant is not None:
+            agent.prefetch.tenant = tenant  # speculation is charged like the drafts
+        self._task: Optional[asyncio.Task] = None
+        self.cancelled = 0
+
+    def submit(self, draft: str, msg_id: Any = None):
+        """Schedule suggestions for `draft`, superseding any pending draft."""
+        received = time.perf_counter()
+        if self.prefetch:
+            self.agent.speculate(draft, self.profile)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            self.cancelled += 1
+        self._task = asyncio.create_task(self._run(draft, msg_id, received))
+
+    def _reserve(self, draft: str) -> float:
+        if self.tenant is None:
+            return 0.0
+        estimate = min(count_tokens(draft), settings.PROMPT_MAX_TOKENS) + settings.LLM_COMPLETION_TOKENS_ESTIMATE
+        return get_rate_limiter().reserve_tokens(self.tenant, estimate)
+
+    async def _run(self, draft: str, msg_id: Any, received: float):
+        await asyncio.sleep(self.debounce_ms / 1000.0)
+        try:
+            reserved = self._reserve(draft)
+        except RateLimited as e:
+            metrics.inc("blog_requests_rejected_total", reason=e.reason, priority=INTERACTIVE)
+            await self.send({"id": msg_id, "error": f"Too many requests ({e.reason})",
+                             "retry_after": e.retry_after})
+            return
+        started = time.perf_counter()
+
+        async def deliver(payload: Dict[str, Any]):
+            done = time.perf_counter()
+            if self.tenant is not None:
+                # Prefetched results were charged when the speculation ran
+                usage = payload.get("token_usage", {})
+                get_rate_limiter().settle_tokens(
+                    self.tenant, reserved, 0 if usage.get("prefetched") else usage.get("total_tokens", 0))
+            payload["id"] = msg_id
+            if self.stream:
+                payload["type"] = "done"
+            payload["timing"] = {
+                "debounce_ms": round((started - received) * 1000, 2),
+                "compute_ms": round((done - started) * 1000, 2),
+                "latency_ms": round((done - received) * 1000, 2),
+            }
+            await self.send(payload)
+
+        if not self.stream:
+            await self.agent.suggest_in_real_time(draft, self.profile, deliver)
+            return
+
+        async def partial(payload: Dict[str, Any]):
+            payload["type"] = "suggestion"
+            payload["id"] = msg_id
+            payload["latency_ms"] = round((time.perf_counter() - received) * 1000, 2)
+            await self.send(payload)
+
+        await self.agent.suggest_in_real_time(draft, self.profile, deliver, on_partial=partial)
+
+    async def close(self):
+        if self.prefetch:
+            self.agent.prefetch.cancel()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
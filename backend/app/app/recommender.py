@@ -1,53 +1,320 @@
+import asyncio
 import json
-from backend.app.app.llm import llm_recommend
-from backend.app.app.scoring import score_suggestions, flesch_reading_ease
+import logging
+import time
+from backend.app.app import metrics
+from backend.app.app.llm import llm_recommend, llm_recommend_stream
+from backend.app.app.metrics import span
+from backend.app.app.scoring import flesch_reading_ease
 from backend.app.app.analysis import top_ngrams
 from backend.app.app.config import settings
-from backend.app.app.utils import backoff_retry
-from typing import Dict, Any, List
+from backend.app.app.resilience import guard, remaining, resilient_call
+from backend.app.app.draft_state import DraftState, _reading_ease
+from backend.app.app.embedding_service import embed_texts_async
+from backend.app.app.pattern_store import UserPatterns, get_pattern_store
+from backend.app.app.ranking import SuggestionRanker
+from backend.app.app.semantic_cache import cursor_window, get_semantic_cache
+from backend.app.app.text_stats import TextStats, as_stats
+from backend.app.app.tfidf_model import CorpusTfidf, aget_corpus_tfidf, cached_corpus_tfidf
+from typing import AsyncIterator, Dict, Any, List, Optional
 
-async def recommend_for_draft(draft: str, cursor_before: str, cursor_after: str, user_profile: Dict, history_keywords: List[str]):
-    # Call LLM with retries
-    async def call_llm():
-        return await llm_recommend(cursor_before, cursor_after, draft, user_profile or {})
+logger = logging.getLogger(__name__)
+_ZERO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+def _local_analysis(draft: str, draft_state: Optional[DraftState]):
+    # With a DraftState tracking `draft`, local analysis only re-scans edited
+    # sentences. Read it before awaiting the LLM; the state may move on meanwhile.
+    with span("recommend.local_analysis"):
+        if draft_state is not None:
+            return draft_state.top_ngrams(k=50), draft_state.weak_sections(), draft_state.flesch_reading_ease()
+        stats = TextStats(draft)  # tokenized once for all three
+        return top_ngrams(stats, k=50), _weak_sections(stats), flesch_reading_ease(stats)
 
-    resp = await backoff_retry(call_llm, retries=3, base_ms=settings.BACKOFF_BASE_MS)
-    # Parse suggestions
-    suggestions = []
-    try:
-        if isinstance(resp.get("content"), str):
-            parsed = json.loads(resp.get("content"))
-        else:
-            parsed = resp.get("content") or {}
-        suggestions = parsed.get("suggestions", [])
-    except Exception:
-        suggestions = []
 
+def _freq_map(history_keywords: List[str], draft_ngrams: List[str]) -> Dict[str, int]:
     # Build freq map from history + draft ngrams
     freq_map = {}
     for kw in history_keywords or []:
         freq_map[kw.lower()] = freq_map.get(kw.lower(), 0) + 2
-    for ng in top_ngrams(draft, k=50):
+    for ng in draft_ngrams:
         freq_map[ng.lower()] = freq_map.get(ng.lower(), 0) + 1
+    return freq_map
 
-    ranked = score_suggestions(draft, suggestions, user_profile or {}, freq_map)
 
-    # Weak sections detection: long sentences with low FRE
-    weak = []
-    sentences = [s.strip() for s in draft.split('.') if s.strip()]
-    idx = 0
-    for s in sentences:
-        start = draft.find(s, idx)
-        end = start + len(s)
-        idx = end
-        if len(s.split()) > 20 and flesch_reading_ease(s) < 50:
-            weak.append({"start": start, "end": end, "reason": "Hard to read (long/complex)"})
+def _ranker(user_profile: Optional[Dict], history_keywords: List[str], draft_ngrams: List[str],
+            cursor_before: str, cursor_after: str, tfidf: Optional[CorpusTfidf]) -> SuggestionRanker:
+    # Similarity to the cursor context uses the tenant's corpus IDF when it has one
+    return SuggestionRanker(user_profile, _freq_map(history_keywords, draft_ngrams), cursor_before, cursor_after,
+                            tfidf=tfidf)
+
+
+async def _llm_suggestions(draft: str, cursor_before: str, cursor_after: str, user_profile: Dict,
+                           history_keywords: List[str], draft_ngrams: List[str], tenant: Optional[str] = None):
+    """(suggestions, token_usage, fallback) from the LLM, or local candidates if it is unavailable."""
+    # Call LLM with retries; a slow first attempt is hedged since a user is waiting
+    async def call_llm():
+        return await llm_recommend(cursor_before, cursor_after, draft, user_profile or {})
+
+    try:
+        resp = await resilient_call(call_llm, hedge_after_ms=settings.LLM_HEDGE_AFTER_MS)
+    except Exception as e:
+        # Breaker open, deadline hit or retries exhausted: rank local candidates instead
+        logger.warning("LLM suggestions unavailable, using local fallback: %s", e)
+        patterns = await get_pattern_store().aget(tenant) if tenant else None
+        nearest = await _nearest_posts(tenant, patterns, cursor_before, cursor_after)
+        related = _history_suggestions(patterns, draft, cursor_before, cursor_after, 4 * settings.MAX_SUGGESTIONS,
+                                       posts=nearest)
+        return _local_suggestions(draft, history_keywords, draft_ngrams, related), dict(_ZERO_USAGE), True
+
+    # Parse suggestions
+    suggestions = []
+    with span("recommend.parse"):
+        try:
+            if isinstance(resp.get("content"), str):
+                parsed = json.loads(resp.get("content"))
+            else:
+                parsed = resp.get("content") or {}
+            suggestions = parsed.get("suggestions", [])
+        except Exception:
+            suggestions = []
+    return suggestions, resp.get("usage", {}), False
+
+
+async def _semantic_lookup(tenant: Optional[str], profile: Dict, draft: str, cursor_before: str, cursor_after: str):
+    """
+    (vectors, hit) for the semantic cache: vectors is None when the cache is
+    off or embedding failed; hit is a prior result for a near-identical
+    draft with usage rewritten to show nothing was spent.
+    """
+    cache = get_semantic_cache() if tenant else None
+    if cache is None:
+        return None, None
+    window = cursor_window(cursor_before, cursor_after, settings.SEMANTIC_CACHE_WINDOW_TOKENS)
+    try:
+        with span("recommend.semantic_lookup"):
+            vectors = await embed_texts_async([window or draft, draft])
+            hit = cache.get(tenant, profile, vectors[0], vectors[1])
+    except Exception as e:
+        # An embedding problem must not cost the user their suggestions
+        logger.warning("semantic cache unavailable: %s", e)
+        return None, None
+    if hit is not None:
+        saved = hit["token_usage"].get("total_tokens", 0)
+        metrics.inc("blog_llm_tokens_saved_total", saved, reason="semantic_cache")
+        hit["token_usage"] = {**_ZERO_USAGE, "cached": True, "saved_tokens": saved,
+                              "similarity": round(hit["similarity"], 4)}
+    return vectors, hit
+
+
+def _semantic_store(tenant: Optional[str], profile: Dict, vectors, suggestions: List[Dict], usage: Dict):
+    # Raw LLM suggestions only: scores are recomputed for whichever draft reuses them
+    if vectors is not None and suggestions:
+        get_semantic_cache().set(tenant, profile, vectors[0], vectors[1],
+                                 {"suggestions": suggestions, "token_usage": usage})
+
+
+async def recommend_for_draft(draft: str, cursor_before: str, cursor_after: str, user_profile: Dict, history_keywords: List[str],
+                              draft_state: Optional[DraftState] = None, tenant: Optional[str] = None):
+    """
+    Ranked suggestions for the cursor position plus local readability and
+    weak sections. With `tenant` and SEMANTIC_CACHE_ENABLED, a near-duplicate
+    earlier draft's LLM suggestions are reused (and re-scored) instead of
+    calling the LLM.
+    """
+    draft_ngrams, weak, readability = _local_analysis(draft, draft_state)
+    vectors, hit = await _semantic_lookup(tenant, user_profile or {}, draft, cursor_before, cursor_after)
+    if hit is not None:
+        suggestions, usage, fallback = hit["suggestions"], hit["token_usage"], False
+    else:
+        suggestions, usage, fallback = await _llm_suggestions(
+            draft, cursor_before, cursor_after, user_profile, history_keywords, draft_ngrams, tenant
+        )
+        if not fallback:
+            _semantic_store(tenant, user_profile or {}, vectors, suggestions, usage)
 
-    readability = flesch_reading_ease(draft)
+    with span("recommend.rank"):
+        tfidf = await aget_corpus_tfidf(tenant) if tenant else None
+        ranker = _ranker(user_profile, history_keywords, draft_ngrams, cursor_before, cursor_after, tfidf)
+        ranked = ranker.rank(suggestions, k=settings.MAX_SUGGESTIONS)
 
     return {
-        "suggestions": ranked[:settings.MAX_SUGGESTIONS],
+        "suggestions": ranked,
         "readability": readability,
         "weak_sections": weak,
-        "token_usage": resp.get("usage", {})
+        "token_usage": usage,
+        "fallback": fallback,
     }
+
+
+async def recommend_for_draft_stream(draft: str, cursor_before: str, cursor_after: str, user_profile: Dict,
+                                     history_keywords: List[str], draft_state: Optional[DraftState] = None,
+                                     tenant: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming recommend_for_draft. Yields {"type": "suggestion", "suggestion": {...}}
+    as each suggestion is parsed off the LLM stream (already scored, banned
+    words dropped), then one {"type": "done", ...} with the same fields as
+    recommend_for_draft plus timing (time to first suggestion, total).
+    A semantic cache hit is replayed as suggestion events without streaming.
+    """
+    started = time.perf_counter()
+    profile = user_profile or {}
+    draft_ngrams, weak, readability = _local_analysis(draft, draft_state)
+    tfidf = await aget_corpus_tfidf(tenant) if tenant else None
+    ranker = _ranker(profile, history_keywords, draft_ngrams, cursor_before, cursor_after, tfidf)
+    shown: List[Dict] = []
+    received: List[Dict] = []  # raw LLM suggestions, for the semantic cache
+    usage: Dict[str, Any] = dict(_ZERO_USAGE)
+    fallback = truncated = False
+    first_ms: Optional[float] = None
+
+    def accept(suggestion) -> Optional[Dict]:
+        nonlocal first_ms
+        ranked = ranker.rank([suggestion])
+        if not ranked or len(shown) >= settings.MAX_SUGGESTIONS:
+            return None
+        shown.append(ranked[0])
+        if first_ms is None:
+            first_ms = (time.perf_counter() - started) * 1000
+            if metrics.enabled:
+                metrics.observe_span("recommend.time_to_first_suggestion", first_ms / 1000)
+        return {"type": "suggestion", "suggestion": ranked[0]}
+
+    vectors, hit = await _semantic_lookup(tenant, profile, draft, cursor_before, cursor_after)
+    if hit is not None:
+        usage = hit["token_usage"]
+        for suggestion in hit["suggestions"]:
+            event = accept(suggestion)
+            if event is not None:
+                yield event
+    else:
+        try:
+            # No transparent retries once output has been shown; the breaker still counts failures
+            async with asyncio.timeout(remaining()):
+                with guard():
+                    async for kind, payload in llm_recommend_stream(cursor_before, cursor_after, draft, profile):
+                        if kind == "usage":
+                            usage = payload
+                        else:
+                            received.append(payload)
+                            event = accept(payload)
+                            if event is not None:
+                                yield event
+        except Exception as e:
+            if shown:
+                logger.warning("suggestion stream broke off after %d suggestions: %s", len(shown), e)
+                truncated = True
+            else:
+                # Nothing delivered yet: same retry / local fallback path as recommend_for_draft
+                received, usage, fallback = await _llm_suggestions(
+                    draft, cursor_before, cursor_after, profile, history_keywords, draft_ngrams, tenant
+                )
+                for suggestion in received:
+                    event = accept(suggestion)
+                    if event is not None:
+                        yield event
+        if not (fallback or truncated):
+            _semantic_store(tenant, profile, vectors, received, usage)
+
+    with span("recommend.rank"):
+        ranked = sorted(shown, key=lambda x: x["relevance_score"], reverse=True)
+    yield {
+        "type": "done",
+        "suggestions": ranked,
+        "readability": readability,
+        "weak_sections": weak,
+        "token_usage": usage,
+        "fallback": fallback,
+        "truncated": truncated,
+        "timing": {
+            "first_suggestion_ms": round(first_ms, 2) if first_ms is not None else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
+    }
+
+
+def _local_suggestions(draft: str, history_keywords: List[str], draft_ngrams: List[str],
+                       related: Optional[List[Dict]] = None) -> List[Dict]:
+    # What the user's posts pair with the cursor context, history terms the draft doesn't use
+    # yet, then the draft's own themes; the ranker picks among them
+    lowered = draft.lower()
+    fresh = [kw for kw in history_keywords or [] if kw.lower() not in lowered]
+    candidates = list(related or [])
+    seen = {c["phrase"] for c in candidates}
+    candidates += [{"phrase": p, "reason": "Frequent in your writing"}
+                   for p in dict.fromkeys(fresh + list(draft_ngrams)) if p not in seen]
+    return candidates[:settings.RANK_LOCAL_CANDIDATES]
+
+
+async def _nearest_posts(tenant: Optional[str], patterns: Optional[UserPatterns], cursor_before: str,
+                         cursor_after: str) -> Optional[Dict[str, float]]:
+    """
+    The tenant's posts nearest the cursor context by embedding (post id ->
+    cosine), or None to match posts by shared n-grams instead.
+    """
+    if not settings.HISTORY_EMBEDDINGS_ENABLED or patterns is None or not len(patterns.index):
+        return None
+    index = await asyncio.to_thread(get_pattern_store().embeddings, tenant)
+    if index is None or not len(index):
+        return None
+    window = cursor_window(cursor_before, cursor_after, settings.NGRAM_INDEX_CONTEXT_TOKENS)
+    try:
+        with span("recommend.history_embeddings"):
+            query = (await embed_texts_async([window]))[0]
+            # Rows of removed posts stay in the index; ask for extra and keep the live ones
+            hits = await asyncio.to_thread(index.search, query, 2 * settings.NGRAM_INDEX_QUERY_POSTS)
+    except Exception as e:
+        logger.warning("history embeddings unavailable, matching posts by n-grams: %s", e)
+        return None
+    live = [(pid, score) for pid, score in hits if pid in patterns.index]
+    return dict(live[:settings.NGRAM_INDEX_QUERY_POSTS]) or None
+
+
+def _history_suggestions(patterns: Optional[UserPatterns], draft: str, cursor_before: str, cursor_after: str,
+                         k: int, posts: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """
+    Up to k n-grams the tenant's posts use alongside the words around the
+    cursor (ngram_index.py), counted over `posts` when given.
+    """
+    if patterns is None or not len(patterns.index):
+        return []
+    with span("recommend.history_index"):
+        window = cursor_window(cursor_before, cursor_after, settings.NGRAM_INDEX_CONTEXT_TOKENS)
+        related = patterns.index.related(window, k=2 * k, posts=posts)  # room for phrases the draft already has
+    lowered = draft.lower()
+    return [{"phrase": p, "reason": "Used with these words in your posts"}
+            for p, _ in related if p not in lowered][:k]
+
+
+def recommend_from_history(draft: str, cursor_before: str, cursor_after: str, user_profile: Dict,
+                           history_keywords: List[str], tenant: Optional[str]) -> Dict[str, Any]:
+    """
+    Ranked suggestions from the tenant's own posts only: no LLM call and
+    no local draft analysis, for when an answer is needed within a
+    keystroke. Empty until the tenant has stored patterns.
+    """
+    started = time.perf_counter()
+    # Loaded by the caller (main._recommend_inputs); a keystroke path never waits on the disk
+    patterns = get_pattern_store().cached(tenant) if tenant else None
+    candidates = _history_suggestions(patterns, draft, cursor_before, cursor_after, 4 * settings.MAX_SUGGESTIONS)
+    with span("recommend.rank"):
+        tfidf = cached_corpus_tfidf(tenant) if tenant else None  # also loaded by the caller
+        ranker = _ranker(user_profile, history_keywords, [], cursor_before, cursor_after, tfidf)
+        ranked = ranker.rank(candidates, k=settings.MAX_SUGGESTIONS)
+    return {
+        "suggestions": ranked,
+        "token_usage": dict(_ZERO_USAGE),
+        "timing": {"total_ms": round((time.perf_counter() - started) * 1000, 3)},
+    }
+
+
+def _weak_sections(draft) -> List[Dict]:
+    # Weak sections detection: long sentences with low FRE.
+    # `draft` may be a str or TextStats; sentence counts come from its shared tokens.
+    stats = as_stats(draft)
+    weak = []
+    for start, end in stats.sentence_spans:
+        if len(stats.text[start:end].split()) <= 20:
+            continue
+        if _reading_ease(*stats.range_counts(start, end)) < 50:
+            weak.append({"start": start, "end": end, "reason": "Hard to read (long/complex)"})
+    return weak
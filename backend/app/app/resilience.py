@@ -0,0 +1,355 @@
+# app/resilience.py
+"""
+Failure handling for upstream LLM calls.
+
+  deadline()        per-request time limit; nested calls and tasks spawned
+                    inside inherit it and can only tighten it
+  RetryBudget       process-wide token bucket; retries stay a small fraction
+                    of successful calls, so a degraded upstream gets no storm
+  CircuitBreaker    after consecutive failures, reject calls for a cool-down
+                    so callers go straight to their local fallback
+  resilient_call()  one logical call with all of the above, retrying only
+                    transient errors, plus an optional hedged second request
+  guard()           breaker bookkeeping only, for calls that can't be retried
+                    transparently (streams)
+"""
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from backend.app.app import metrics
+from backend.app.app.config import settings
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The request's deadline passed; retrying cannot help."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The breaker is open; the upstream is not being called."""
+
+
+# -- deadlines --
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds: Optional[float]):
+    """Everything inside must finish within `seconds` (never extends an outer deadline)."""
+    expires = _deadline.get()
+    if seconds is not None and seconds > 0:
+        own = time.monotonic() + seconds
+        expires = own if expires is None else min(expires, own)
+    token = _deadline.set(expires)
+    try:
+        yield expires
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one."""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+async def with_deadline(awaitable: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """
+    Await under min(timeout, time left on the deadline). Running out of the
+    deadline raises DeadlineExceeded; hitting only `timeout` raises a plain
+    (retryable) asyncio.TimeoutError.
+    """
+    left = remaining()
+    if left is None and timeout is None:
+        return await awaitable
+    if left is not None and left <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("deadline exceeded")
+    limit = left if timeout is None else (timeout if left is None else min(timeout, left))
+    try:
+        return await asyncio.wait_for(awaitable, limit)
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceeded) or (left is not None and left <= limit):
+            raise DeadlineExceeded("deadline exceeded") from None
+        raise
+
+
+# -- retry budget --
+
+class RetryBudget:
+    """
+    Token bucket: every success deposits `ratio` tokens, time adds
+    `min_per_s`, each retry or hedge spends one. Capped at `capacity`.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_s: float = 1.0, capacity: float = 10.0):
+        self.ratio = ratio
+        self.min_per_s = min_per_s
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.spent = 0
+        self.denied = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.min_per_s)
+        self._updated = now
+
+    def record_success(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.spent += 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill()
+            return {"tokens": round(self._tokens, 2), "spent": self.spent, "denied": self.denied}
+
+
+# -- circuit breaker --
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. Half-open lets a single probe through."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            # A probe whose outcome was never reported (cancelled) expires
+            if self.state == self.HALF_OPEN and (
+                not self._probing or time.monotonic() - self._probe_started >= self.reset_timeout_s
+            ):
+                self._probing = True
+                self._probe_started = time.monotonic()
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures, "rejected": self.rejected}
+
+
+# -- calls --
+
+_counters = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transient upstream failures: timeouts, connection errors, 429 and 5xx."""
+    if isinstance(exc, (DeadlineExceeded, CircuitOpenError)):
+        return False
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # openai's connection/timeout errors carry no status code
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _upstream_failure(exc: BaseException) -> bool:
+    return isinstance(exc, DeadlineExceeded) or is_retryable(exc)
+
+
+async def _hedged(attempt: Callable[[], Awaitable[Any]], hedge_after_s: float, budget: RetryBudget) -> Any:
+    """Start a second identical request if the first is slower than `hedge_after_s`; first success wins."""
+    first = asyncio.ensure_future(attempt())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after_s)
+        if done or not budget.try_spend():
+            return await first
+        _counters["hedges"] += 1
+        tasks.append(asyncio.ensure_future(attempt()))
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        _counters["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resilient_call(
+    coro_fn: Callable[[], Awaitable[Any]],
+    *,
+    retries: int = 3,
+    base_ms: Optional[int] = None,
+    max_backoff_ms: Optional[int] = None,
+    attempt_timeout_s: Optional[float] = None,
+    hedge_after_ms: Optional[int] = None,
+    breaker: Optional["CircuitBreaker"] = None,
+    budget: Optional[RetryBudget] = None,
+) -> Any:
+    """
+    Call coro_fn (zero-arg async callable) at most `retries` times. Only
+    transient errors are retried, each retry needs a budget token, and no
+    backoff sleep outlives the current deadline. Raises CircuitOpenError
+    without calling upstream while the breaker is open.
+    """
+    breaker = breaker or get_breaker()
+    budget = budget or get_retry_budget()
+    base_ms = settings.BACKOFF_BASE_MS if base_ms is None else base_ms
+    max_backoff_ms = settings.BACKOFF_MAX_MS if max_backoff_ms is None else max_backoff_ms
+    if attempt_timeout_s is None:
+        attempt_timeout_s = settings.LLM_ATTEMPT_TIMEOUT_S or None
+    hedge_after_ms = hedge_after_ms or 0
+
+    def attempt():
+        return with_deadline(coro_fn(), attempt_timeout_s)
+
+    _counters["calls"] += 1
+    for n in range(retries):
+        if not breaker.allow():
+            raise CircuitOpenError("LLM circuit breaker is open")
+        try:
+            if hedge_after_ms > 0:
+                result = await _hedged(attempt, hedge_after_ms / 1000.0, budget)
+            else:
+                result = await attempt()
+        except Exception as e:
+            if _upstream_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()  # upstream answered; the request itself was bad
+            if not is_retryable(e) or n == retries - 1 or not budget.try_spend():
+                raise
+            sleep_s = (min(max_backoff_ms, (2 ** n) * base_ms) + random.uniform(0, base_ms / 2)) / 1000.0
+            left = remaining()
+            if left is not None and sleep_s >= left:
+                raise  # the retry could not finish in time anyway
+            _counters["retries"] += 1
+            await asyncio.sleep(sleep_s)
+            continue
+        breaker.record_success()
+        budget.record_success()
+        return result
+
+
+@contextlib.contextmanager
+def guard(breaker: Optional[CircuitBreaker] = None):
+    """
+    Breaker accounting around a call resilient_call can't wrap, e.g. a
+    stream that has already delivered output. No retries, no hedging.
+    """
+    breaker = breaker or get_breaker()
+    if not breaker.allow():
+        raise CircuitOpenError("LLM circuit breaker is open")
+    try:
+        yield
+    except Exception as e:
+        if _upstream_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    breaker.record_success()
+    get_retry_budget().record_success()
+
+
+# Process-wide instances, created from settings on first use
+
+_budget: Optional[RetryBudget] = None
+_breaker: Optional[CircuitBreaker] = None
+
+
+def get_retry_budget() -> RetryBudget:
+    global _budget
+    if _budget is None:
+        _budget = RetryBudget(
+            ratio=settings.RETRY_BUDGET_RATIO,
+            min_per_s=settings.RETRY_BUDGET_MIN_PER_S,
+            capacity=settings.RETRY_BUDGET_CAPACITY,
+        )
+    return _budget
+
+
+def get_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+            reset_timeout_s=settings.BREAKER_RESET_S,
+        )
+    return _breaker
+
+
+def stats() -> Dict[str, Any]:
+    return {**_counters, "retry_budget": get_retry_budget().stats(), "breaker": get_breaker().stats()}
+
+
+_BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+
+def _prometheus_lines():
+    budget, breaker = get_retry_budget(), get_breaker()
+    return (
+        metrics.sample_lines("blog_llm_calls_total", "counter", [({}, _counters["calls"])])
+        + metrics.sample_lines("blog_llm_retries_total", "counter", [({}, _counters["retries"])])
+        + metrics.sample_lines("blog_llm_retries_denied_total", "counter", [({}, budget.denied)])
+        + metrics.sample_lines(
+            "blog_llm_hedges_total", "counter",
+            [({"outcome": "sent"}, _counters["hedges"]), ({"outcome": "won"}, _counters["hedge_wins"])],
+        )
+        + metrics.sample_lines("blog_llm_breaker_state", "gauge", [({}, _BREAKER_STATES[breaker.state])])
+        + metrics.sample_lines("blog_llm_breaker_rejected_total", "counter", [({}, breaker.rejected)])
+    )
+
+
+metrics.register_collector(_prometheus_lines)
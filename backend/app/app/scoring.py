@@ -1,49 +1,61 @@
-import re
-import math
-from collections import Counter
-from typing import List, Dict
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Optional, Sequence, Tuple, Union
+from backend.app.app.metrics import span, timed
+from backend.app.app.text_stats import TextStats, as_stats, count_syllables
+from backend.app.app.tfidf_model import CorpusTfidf
 
+# Every text argument below may be a str or a TextStats of it
+Text = Union[str, TextStats]
 
-def flesch_kincaid_grade(text: str) -> float:
+
+def _readability_counts(text: Text) -> Tuple[int, int, int]:
+    """(sentences, words, syllables), each floored so ratios are defined."""
+    return as_stats(text).readability_counts()
+
+
+def _raw(text: Text) -> str:
+    return text.text if isinstance(text, TextStats) else text
+
+
+def flesch_kincaid_grade(text: Text) -> float:
     """Compute Flesch-Kincaid Grade Level for readability."""
-    sentences = re.split(r'[.!?]', text)
-    words = re.findall(r'\w+', text)
-    syllables = sum(count_syllables(word) for word in words)
-    num_sentences = max(len([s for s in sentences if s.strip()]), 1)
-    num_words = max(len(words), 1)
+    num_sentences, num_words, syllables = _readability_counts(text)
 
     return 0.39 * (num_words / num_sentences) + 11.8 * (syllables / num_words) - 15.59
 
 
-def count_syllables(word: str) -> int:
-    word = word.lower()
-    vowels = "aeiouy"
-    count = 0
-    prev_char_was_vowel = False
-    for char in word:
-        if char in vowels:
-            if not prev_char_was_vowel:
-                count += 1
-            prev_char_was_vowel = True
-        else:
-            prev_char_was_vowel = False
-    return max(count, 1)
+def flesch_reading_ease(text: Text) -> float:
+    """Compute Flesch Reading Ease (higher is easier, ~0–100)."""
+    num_sentences, num_words, syllables = _readability_counts(text)
 
+    return 206.835 - 1.015 * (num_words / num_sentences) - 84.6 * (syllables / num_words)
 
-def keyword_relevance(text: str, suggested_keywords: List[str]) -> float:
-    """Score based on keyword frequency + semantic similarity."""
+
+def _frequency_score(text: Text, suggested_keywords: List[str]) -> float:
+    stats = as_stats(text)
+    word_counts = stats.word_counts
+    freq_score = sum(word_counts[k.lower()] for k in suggested_keywords)
+    return min(freq_score / (stats.n_whitespace_tokens + 1), 1.0)  # normalize 0–1
+
+
+def keyword_relevance(text: Text, suggested_keywords: List[str], tfidf: Optional[CorpusTfidf] = None) -> float:
+    """
+    Score based on keyword frequency + semantic similarity.
+    With a corpus-fitted `tfidf` model only transforms are needed; without
+    one, a throwaway vectorizer is fitted on the text and keywords.
+    """
     if not suggested_keywords:
         return 0.0
 
+    if tfidf is not None:
+        return keyword_relevance_batch([(text, suggested_keywords)], tfidf)[0]
+
     # Frequency-based relevance
-    word_counts = Counter(re.findall(r'\w+', text.lower()))
-    freq_score = sum(word_counts[k.lower()] for k in suggested_keywords)
-    freq_score = min(freq_score / (len(text.split()) + 1), 1.0)  # normalize 0–1
+    freq_score = _frequency_score(text, suggested_keywords)
 
-    # Semantic similarity with TF-IDF
-    documents = [text] + suggested_keywords
+    # Semantic similarity with TF-IDF (sklearn imported lazily: slow to load)
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    documents = [_raw(text)] + suggested_keywords
     vectorizer = TfidfVectorizer().fit_transform(documents)
     vectors = vectorizer.toarray()
     cosine_vals = cosine_similarity([vectors[0]], vectors[1:])[0]
@@ -52,22 +64,52 @@ def keyword_relevance(text: str, suggested_keywords: List[str]) -> float:
     return (freq_score * 0.5 + semantic_score * 0.5) * 100  # scaled 0–100
 
 
-def user_profile_adjustment(score: float, text: str, profile: Dict) -> float:
-    """Adjust score based on user profile (preferred topics, reading level)."""
+def keyword_relevance_batch(pairs: Sequence[Tuple[Text, List[str]]], tfidf: CorpusTfidf) -> List[float]:
+    """keyword_relevance for many (text, keywords) pairs in one vectorized pass."""
+    semantic = tfidf.similarity_batch([(_raw(text), kws) for text, kws in pairs])
+    return [
+        (_frequency_score(text, kws) * 0.5 + float(sem) * 0.5) * 100 if kws else 0.0
+        for (text, kws), sem in zip(pairs, semantic)
+    ]
+
+
+# UserProfile.reading_level names (schemas.py) as Flesch-Kincaid grades
+_READING_LEVEL_GRADES = {"beginner": 6.0, "general": 9.0, "advanced": 13.0}
+
+
+def _target_grade(level) -> Optional[float]:
+    """A profile's reading_level as a grade: a number, a numeric string or a level name."""
+    if isinstance(level, (int, float)):
+        return float(level)
+    if isinstance(level, str):
+        try:
+            return float(level)
+        except ValueError:
+            return _READING_LEVEL_GRADES.get(level.strip().lower())
+    return None
+
+
+def user_profile_adjustment(score: float, text: Text, profile: Dict, grade: Optional[float] = None) -> float:
+    """
+    Adjust score based on user profile (preferred topics, reading level).
+    `grade` is the text's Flesch-Kincaid grade if the caller already has it.
+    """
     if not profile:
         return score
 
     preferred_topics = profile.get("preferred_topics", [])
-    target_level = profile.get("reading_level", None)
+    target_level = _target_grade(profile.get("reading_level"))
 
     # Boost if text matches preferred topics
     if preferred_topics:
-        topic_hits = sum(1 for t in preferred_topics if t.lower() in text.lower())
+        lowered = text.lower if isinstance(text, TextStats) else text.lower()
+        topic_hits = sum(1 for t in preferred_topics if t.lower() in lowered)
         score += min(topic_hits * 5, 15)  # up to +15 points
 
     # Adjust if readability too high/low
     if target_level:
-        grade = flesch_kincaid_grade(text)
+        if grade is None:
+            grade = flesch_kincaid_grade(text)
         if grade > target_level + 3:  # too hard
             score -= 10
         elif grade < target_level - 3:  # too simple
@@ -76,12 +118,25 @@ def user_profile_adjustment(score: float, text: str, profile: Dict) -> float:
     return max(0, min(score, 100))  # clamp 0–100
 
 
-def blog_score(text: str, keywords: List[str], profile: Dict) -> Dict:
-    """Return final blog score with breakdown."""
-    readability = flesch_kincaid_grade(text)
-    keyword_score = keyword_relevance(text, keywords)
+@timed("score.blog_score")
+def blog_score(text: Text, keywords: List[str], profile: Dict, tfidf: Optional[CorpusTfidf] = None,
+               grade: Optional[float] = None) -> Dict:
+    """
+    Return final blog score with breakdown.
+    Pass `grade` (e.g. from a DraftState) to skip recomputing readability.
+    The text is tokenized once and shared by every sub-score.
+    """
+    text = as_stats(text)
+    if grade is None:
+        with span("score.readability"):
+            readability = flesch_kincaid_grade(text)
+    else:
+        readability = grade
+    with span("score.keyword_relevance"):
+        keyword_score = keyword_relevance(text, keywords, tfidf)
     base_score = (keyword_score * 0.6) + (max(0, 100 - readability * 10) * 0.4)
-    final_score = user_profile_adjustment(base_score, text, profile)
+    with span("score.profile_adjustment"):
+        final_score = user_profile_adjustment(base_score, text, profile, readability)
 
     return {
         "final_score": round(final_score, 2),
@@ -89,3 +144,13 @@ def blog_score(text: str, keywords: List[str], profile: Dict) -> Dict:
         "readability_grade": round(readability, 2),
         "adjusted_for_profile": profile is not None,
     }
+
+
+def score_suggestions(draft: str, suggestions: List, profile: Dict, freq_map: Dict[str, int]) -> List[Dict]:
+    """
+    Rank suggestions by history/draft frequency, preferred-topic match and
+    fit with `draft`. Suggestions containing banned words are dropped.
+    Callers that know the cursor position should use ranking.SuggestionRanker.
+    """
+    from backend.app.app.ranking import SuggestionRanker  # ranking imports this module
+    return SuggestionRanker(profile, freq_map, cursor_before=draft).rank(suggestions)
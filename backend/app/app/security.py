@@ -1,4 +1,9 @@
 # app/security.py
+import hashlib
+import hmac
+from functools import lru_cache
+from typing import FrozenSet
+
 from fastapi import Depends, HTTPException, Security
 from fastapi.security.api_key import APIKeyHeader
 from starlette.status import HTTP_403_FORBIDDEN
@@ -7,12 +12,26 @@ from backend.app.app.config import settings
 # Define where to look for API key (Authorization header or custom header)
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
+@lru_cache(maxsize=1)
+def _valid_keys(primary: str, extra: str) -> FrozenSet[str]:
+    return frozenset(k.strip() for k in [primary, *extra.split(",")] if k.strip())
+
+
+def key_digest(api_key: str) -> str:
+    """Stable id for a key, safe to write to disk or use as a tenant id."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
 def verify_api_key(api_key: str = Security(api_key_header)):
     """
     Dependency to secure endpoints with API Key.
-    Checks against value in settings.API_KEY
+    Checks against settings.API_KEY and the comma-separated settings.API_KEYS;
+    each key is its own tenant (corpus, patterns, rate limits).
     """
-    if api_key == settings.api_key:
+    # Compare bytes: compare_digest rejects str with non-ASCII characters (a latin-1 header) with TypeError
+    given = api_key.encode("utf-8") if api_key else b""
+    if given and any(hmac.compare_digest(given, k.encode("utf-8"))
+                     for k in _valid_keys(settings.API_KEY, settings.API_KEYS)):
         return api_key
     raise HTTPException(
         status_code=HTTP_403_FORBIDDEN, detail="Invalid or missing API Key"
@@ -0,0 +1,197 @@
+# app/semantic_cache.py
+"""
+Near-duplicate cache for keyword recommendations.
+
+Successive drafts differ by a few characters, so the exact-match LLM cache
+rarely hits. Here each result is stored with two normalized embeddings,
+one of the text around the cursor and one of the whole draft; a lookup
+reuses the most similar prior result of the same tenant and profile when
+both cosine similarities clear the threshold. Callers re-score the reused
+suggestions against the current draft, so only the LLM output is stale.
+
+Memory is bounded: at most `max_tenants` tenant+profile buckets (least
+recently used evicted) of at most `max_entries` results each (LRU within
+the bucket). Tenants never see each other's entries.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.app.app.config import settings
+from backend.app.app import metrics
+from backend.app.app.tokens import head_tokens, tail_tokens
+
+
+def profile_key(profile: Optional[Dict]) -> str:
+    payload = json.dumps(profile or {}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def cursor_window(cursor_before: str, cursor_after: str, tokens: int) -> str:
+    """Text around the cursor: mostly what precedes it, a little of what follows."""
+    return tail_tokens(cursor_before, tokens) + head_tokens(cursor_after, tokens // 4)
+
+
+class _Bucket:
+    """One tenant+profile: LRU entries plus their vectors as dense matrices."""
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        rows = min(capacity, 8)  # grown by doubling; most buckets stay small
+        self.window = np.zeros((rows, dim), dtype=np.float32)
+        self.draft = np.zeros((rows, dim), dtype=np.float32)
+        self.values: List[Optional[Dict[str, Any]]] = [None] * rows
+        self.created = np.zeros(rows)
+        self.lru: "OrderedDict[int, None]" = OrderedDict()  # slot -> None, oldest first
+
+    def __len__(self) -> int:
+        return len(self.lru)
+
+    def best(self, window: np.ndarray, draft: np.ndarray, threshold: float, oldest: float):
+        """(slot, similarity) of the closest live entry over the threshold, or None."""
+        if not self.lru:
+            return None
+        slots = np.fromiter(self.lru, dtype=np.intp, count=len(self.lru))
+        # Both the cursor context and the draft as a whole must match
+        sim = np.minimum(self.window[slots] @ window, self.draft[slots] @ draft)
+        sim[self.created[slots] < oldest] = -1.0
+        i = int(np.argmax(sim))
+        if sim[i] < threshold:
+            return None
+        return int(slots[i]), float(sim[i])
+
+    def put(self, window: np.ndarray, draft: np.ndarray, value: Dict[str, Any], now: float) -> bool:
+        """Store in a free slot, evicting the least recently used; True if something was evicted."""
+        evicted = len(self.lru) >= self.capacity
+        if evicted:
+            slot, _ = self.lru.popitem(last=False)
+        else:
+            slot = len(self.lru)  # slots fill in order and are only freed by eviction
+            if slot == len(self.values):
+                self._grow(min(self.capacity, 2 * slot))
+        self.window[slot], self.draft[slot] = window, draft
+        self.values[slot], self.created[slot] = value, now
+        self.lru[slot] = None
+        return evicted
+
+    def _grow(self, rows: int):
+        extra = rows - len(self.values)
+        self.window = np.vstack([self.window, np.zeros((extra, self.window.shape[1]), dtype=np.float32)])
+        self.draft = np.vstack([self.draft, np.zeros((extra, self.draft.shape[1]), dtype=np.float32)])
+        self.values.extend([None] * extra)
+        self.created = np.concatenate([self.created, np.zeros(extra)])
+
+    def touch(self, slot: int):
+        self.lru.move_to_end(slot)
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.95, max_entries: int = 256, max_tenants: int = 1024,
+                 ttl_s: float = 3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_tenants = max_tenants
+        self.ttl_s = ttl_s
+        self._buckets: "OrderedDict[Tuple[str, str], _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_tokens = 0
+        self.similarity = metrics.Histogram([0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0])
+
+    def get(self, tenant: str, profile: Optional[Dict], window: np.ndarray, draft: np.ndarray
+            ) -> Optional[Dict[str, Any]]:
+        """Closest cached result for this tenant and profile, or None."""
+        key = (tenant, profile_key(profile))
+        with self._lock:
+            bucket = self._buckets.get(key)
+            found = None
+            if bucket is not None:
+                self._buckets.move_to_end(key)
+                found = bucket.best(window, draft, self.threshold, time.time() - self.ttl_s)
+            if found is None:
+                self.misses += 1
+                return None
+            slot, sim = found
+            bucket.touch(slot)
+            value = bucket.values[slot]
+            self.hits += 1
+            self.saved_tokens += value.get("token_usage", {}).get("total_tokens", 0)
+            self.similarity.observe(sim)
+        return {**value, "similarity": sim}
+
+    def set(self, tenant: str, profile: Optional[Dict], window: np.ndarray, draft: np.ndarray,
+            value: Dict[str, Any]):
+        key = (tenant, profile_key(profile))
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.max_entries, len(window))
+                while len(self._buckets) > self.max_tenants:
+                    _, dropped = self._buckets.popitem(last=False)
+                    self.evictions += len(dropped)
+            self._buckets.move_to_end(key)
+            if bucket.put(window, draft, value, time.time()):
+                self.evictions += 1
+
+    def evict(self, tenant: Optional[str] = None):
+        """Drop one tenant's entries (e.g. its history changed), or everything."""
+        with self._lock:
+            for key in [k for k in self._buckets if tenant is None or k[0] == tenant]:
+                del self._buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "saved_tokens": self.saved_tokens,
+                "tenants": len({k[0] for k in self._buckets}),
+                "entries": sum(len(b) for b in self._buckets.values()),
+            }
+
+
+_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Process-wide cache, or None when SEMANTIC_CACHE_ENABLED is off."""
+    global _cache
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = SemanticCache(
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            max_tenants=settings.SEMANTIC_CACHE_MAX_TENANTS,
+            ttl_s=settings.SEMANTIC_CACHE_TTL_S,
+        )
+    return _cache
+
+
+def _prometheus_lines():
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return (
+        metrics.sample_lines(
+            "blog_semantic_cache_lookups_total", "counter",
+            [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])],
+        )
+        + metrics.sample_lines("blog_semantic_cache_evictions_total", "counter", [({}, stats["evictions"])])
+        + metrics.sample_lines("blog_semantic_cache_entries", "gauge", [({}, stats["entries"])])
+        + metrics.histogram_lines("blog_semantic_cache_similarity", [({}, _cache.similarity)])
+    )
+
+
+metrics.register_collector(_prometheus_lines)
@@ -0,0 +1,290 @@
+# app/sentiment.py
+"""
+VADER sentiment scored sentence by sentence, with per-sentence work
+memoized, so re-scoring an edited draft (or a post seen before) only
+analyses the sentences that changed.
+
+VADER's polarity_scores isn't a per-sentence average: a repeated word
+takes the valence of its first occurrence in the whole text, the first
+"but" in the text halves everything before it and boosts everything after
+it by 1.5, ALL-CAPS emphasis depends on whether the whole text is in caps,
+and !/? emphasis counts over the whole text. So the memo keeps, per
+sentence, its tokens and lexicon hits (no other token scores), and
+aggregation re-applies all of the above over the whole text.
+
+A hit's valence depends on at most three tokens before it and two after.
+Those far enough from both ends of their sentence are memoized; the few
+near an edge are re-scored against the whole text's tokens. The result is
+polarity_scores(text) (the same per-token values, summed in the same
+order); TOLERANCE, one unit in the last rounded digit, is the documented
+bound. The tests and benchmarks/sentiment.py check it.
+SENTIMENT_MEMO_SENTENCES=0 calls polarity_scores on the whole text.
+"""
+import hashlib
+import re
+import string
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend.app.app import metrics
+from backend.app.app.config import settings
+
+# Sentences: up to an end mark (optionally closed by quotes/brackets) before whitespace,
+# else to the end of the line. They break only at whitespace, so their tokens are the text's.
+_sentence_re = re.compile(r"\S[^\n]*?[.!?][\"')\]]?(?=\s|$)|\S[^\n]*")
+_PUNCT = frozenset(string.punctuation)
+
+KEYS = ("pos", "neu", "neg", "compound")
+TOLERANCE = {"pos": 0.001, "neu": 0.001, "neg": 0.001, "compound": 0.0001}
+_LOOK_BACK, _LOOK_AHEAD = 3, 2  # tokens sentiment_valence reads around a token
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.rstrip() for s in _sentence_re.findall(text)]
+
+
+def _strip_punctuation(token: str, punc_list: frozenset) -> str:
+    # SentiText._words_plus_punc without building every word x punctuation pair:
+    # one PUNC_LIST item before or after a punctuation-free word of 2+ chars is dropped
+    lead = len(token) - len(token.lstrip(string.punctuation))
+    if lead:
+        rest = token[lead:]
+        if token[:lead] in punc_list and len(rest) > 1 and _PUNCT.isdisjoint(rest):
+            return rest
+    trail = len(token) - len(token.rstrip(string.punctuation))
+    if trail:
+        rest = token[:-trail]
+        if token[-trail:] in punc_list and len(rest) > 1 and _PUNCT.isdisjoint(rest):
+            return rest
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """SentiText(text).words_and_emoticons."""
+    punc_list = _punc_list()
+    return [
+        _strip_punctuation(t, punc_list) if t[0] in _PUNCT or t[-1] in _PUNCT else t
+        for t in text.split() if len(t) > 1
+    ]
+
+
+class _Words:
+    # The two SentiText attributes sentiment_valence reads
+    __slots__ = ("words_and_emoticons", "is_cap_diff")
+
+    def __init__(self, words: List[str], is_cap_diff: bool):
+        self.words_and_emoticons = words
+        self.is_cap_diff = is_cap_diff
+
+
+def _valence(sia, words: _Words, item: str, i: int) -> float:
+    # One iteration of polarity_scores' loop
+    tokens = words.words_and_emoticons
+    lower = item.lower()
+    if lower in sia.constants.BOOSTER_DICT or (lower == "kind" and i < len(tokens) - 1 and tokens[i + 1].lower() == "of"):
+        return 0
+    return sia.sentiment_valence(0, words, item, i, [])[0]
+
+
+class _Sentence:
+    """
+    A sentence's tokens and its lexicon hits (every other token scores 0).
+    Valences of hits whose first occurrence is far enough from both ends
+    don't depend on the neighbouring sentences and are kept per is_cap_diff.
+    """
+    __slots__ = ("tokens", "hits", "caps", "but", "_valences")
+
+    def __init__(self, sentence: str):
+        lexicon = _sia().lexicon
+        self.tokens = tokenize(sentence)
+        self.hits: List[Tuple[int, str]] = [(j, t) for j, t in enumerate(self.tokens) if t.lower() in lexicon]
+        self.caps = sum(1 for t in self.tokens if t.isupper())
+        lowered = [t.lower() for t in self.tokens]
+        self.but = lowered.index("but") if "but" in lowered else -1
+        self._valences: Dict[bool, Dict[str, Optional[float]]] = {}
+
+    def valences(self, is_cap_diff: bool) -> Dict[str, Optional[float]]:
+        """
+        Valence of each hit token at its first occurrence here, in order of
+        appearance; None where that occurrence is within reach of the
+        neighbouring sentences.
+        """
+        out = self._valences.get(is_cap_diff)
+        if out is None:
+            sia, words, out = _sia(), _Words(self.tokens, is_cap_diff), {}
+            interior = range(_LOOK_BACK, len(self.tokens) - _LOOK_AHEAD)
+            for j, token in self.hits:
+                if token not in out:
+                    out[token] = _valence(sia, words, token, j) if j in interior else None
+            self._valences[is_cap_diff] = out
+        return out
+
+
+def _sia():
+    from backend.app.app.analysis import get_sia
+    return get_sia()
+
+
+_punc: Optional[frozenset] = None
+
+
+def _punc_list() -> frozenset:
+    global _punc
+    if _punc is None:
+        _punc = frozenset(_sia().constants.PUNC_LIST)
+    return _punc
+
+
+def _key(sentence: str) -> bytes:
+    return hashlib.blake2b(sentence.encode("utf-8"), digest_size=16).digest()
+
+
+class SentenceMemo:
+    """Bounded LRU of analysed sentences, keyed by a hash of the sentence."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, _Sentence]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sentence: str) -> _Sentence:
+        key = _key(sentence)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = _Sentence(sentence)
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_memo: Optional[SentenceMemo] = None
+
+
+def get_memo() -> SentenceMemo:
+    global _memo
+    if _memo is None:
+        _memo = SentenceMemo(settings.SENTIMENT_MEMO_SENTENCES)
+    return _memo
+
+
+def _aggregate(sentences: List[_Sentence], text: str) -> Dict[str, float]:
+    sia = _sia()
+    n_tokens = sum(len(s.tokens) for s in sentences)
+    if not n_tokens:
+        return {"pos": 0.0, "neu": 0.0, "neg": 0.0, "compound": 0.0}
+    is_cap_diff = 0 < sum(s.caps for s in sentences) < n_tokens
+
+    # Each token scores as at its first occurrence in the whole text
+    valence: Dict[str, float] = {}
+    words: Optional[_Words] = None
+    offset = 0
+    for s in sentences:
+        for token, v in s.valences(is_cap_diff).items():
+            if token in valence:
+                continue
+            if v is None:
+                if words is None:
+                    words = _Words([t for s2 in sentences for t in s2.tokens], is_cap_diff)
+                j = next(j for j, t in s.hits if t == token)
+                v = _valence(sia, words, token, offset + j)
+            valence[token] = v
+        offset += len(s.tokens)
+    but_at = next((i for i, s in enumerate(sentences) if s.but >= 0), None)
+
+    # polarity_scores' _but_check and _sift_sentiment_scores
+    sum_s = pos_sum = neg_sum = 0.0
+    neu_count = n_tokens
+    for i, s in enumerate(sentences):
+        scale = 1.0 if but_at is None else 0.5 if i < but_at else 1.5
+        for j, token in s.hits:
+            v = valence[token]
+            if i == but_at:
+                v *= 0.5 if j < s.but else 1.5 if j > s.but else 1.0
+            else:
+                v *= scale
+            sum_s += v
+            if v > 0:
+                pos_sum += v + 1
+                neu_count -= 1
+            elif v < 0:
+                neg_sum += v - 1
+                neu_count -= 1
+
+    # From here on, SentimentIntensityAnalyzer.score_valence over the whole text
+    amplifier = sia._punctuation_emphasis(sum_s, text)
+    if sum_s > 0:
+        sum_s += amplifier
+    elif sum_s < 0:
+        sum_s -= amplifier
+    compound = sia.constants.normalize(sum_s)
+    if pos_sum > abs(neg_sum):
+        pos_sum += amplifier
+    elif pos_sum < abs(neg_sum):
+        neg_sum -= amplifier
+    total = pos_sum + abs(neg_sum) + neu_count
+    return {
+        "pos": round(abs(pos_sum / total), 3),
+        "neu": round(abs(neu_count / total), 3),
+        "neg": round(abs(neg_sum / total), 3),
+        "compound": round(compound, 4),
+    }
+
+
+def score(text: str) -> Dict[str, float]:
+    """Post-level pos/neu/neg/compound, as VADER's polarity_scores (see module docstring)."""
+    if settings.SENTIMENT_MEMO_SENTENCES <= 0:
+        s = _sia().polarity_scores(text)
+        return {k: s[k] for k in KEYS}
+    memo = get_memo()
+    return _aggregate([memo.get(s) for s in split_sentences(text)], text)
+
+
+def score_or_none(text: str) -> Optional[Dict[str, float]]:
+    # A failure on one post (e.g. the lexicon is missing) must not fail a whole batch
+    try:
+        return score(text)
+    except Exception:
+        return None
+
+
+async def score_many_async(texts: Sequence[str], chunk_size: Optional[int] = None) -> List[Optional[Dict[str, float]]]:
+    """
+    score() for thousands of posts on the CPU executor: chunks of chunk_size
+    posts (default CPU_CHUNK_SIZE) run in parallel, each worker with its own
+    memo. None where scoring failed.
+    """
+    from backend.app.app.cpu_executor import map_cpu
+
+    return await map_cpu(score_or_none, [(text,) for text in texts], chunk_size)
+
+
+def _prometheus_lines():
+    if _memo is None:
+        return []
+    stats = _memo.stats()
+    return metrics.sample_lines(
+        "blog_sentiment_memo_lookups_total", "counter",
+        [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])],
+    ) + metrics.sample_lines("blog_sentiment_memo_entries", "gauge", [({}, stats["entries"])])
+
+
+metrics.register_collector(_prometheus_lines)
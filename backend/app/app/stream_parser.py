@@ -0,0 +1,65 @@
+# app/stream_parser.py
+"""
+Incremental parser for streamed suggestion JSON.
+
+Feed it completion deltas as they arrive; it returns each suggestion
+object the moment its closing brace is seen. Works for the
+{"suggestions": [{...}, {...}]} shape the recommend prompt asks for and
+for one-object-per-line (NDJSON) output, since it only looks for objects
+that are array elements or top-level values.
+"""
+import json
+from typing import Dict, List, Tuple
+
+
+class SuggestionStreamParser:
+    def __init__(self, required_key: str = "phrase"):
+        self.required_key = required_key
+        self._text = ""
+        self._pos = 0
+        self._stack: List[Tuple[str, int]] = []  # (opening char, offset)
+        self._in_string = False
+        self._escaped = False
+        self.emitted = 0
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consume a delta; return the suggestions it completed, in order."""
+        self._text += chunk
+        out = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._stack.append((c, i))
+            elif c in "}]" and self._stack:
+                opener, start = self._stack.pop()
+                if c == "}" and opener == "{" and (not self._stack or self._stack[-1][0] == "["):
+                    item = self._decode(text[start:i + 1])
+                    if item is not None:
+                        out.append(item)
+        self._pos = len(text)
+        self.emitted += len(out)
+        return out
+
+    def _decode(self, fragment: str):
+        try:
+            item = json.loads(fragment)
+        except ValueError:
+            return None
+        if isinstance(item, dict) and isinstance(item.get(self.required_key), str):
+            return item
+        return None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far (the full completion once the stream ends)."""
+        return self._text
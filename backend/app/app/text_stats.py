@@ -0,0 +1,115 @@
+# app/text_stats.py
+"""
+Tokenize a text once and share the result across scoring.
+
+TextStats holds what the scoring, readability, weak-section and n-gram
+functions each used to re-derive from the raw string: word spans,
+per-word syllables, sentence counts, lowercase tokens and n-gram counts.
+Those functions accept either a str or a TextStats and give the same
+results; pass a TextStats when one text goes through several of them.
+(Frequency counts lowercase each \\w+ token rather than the whole text
+first; the two only differ for a handful of non-ASCII case mappings.)
+
+The word regexes and count_syllables live here (re-exported by analysis
+and scoring) so this module has no app imports.
+"""
+import re
+from bisect import bisect_left
+from collections import Counter
+from functools import cached_property, lru_cache
+from itertools import accumulate
+from typing import List, Tuple
+
+_STOP = set("""
+a an the and or to for of in on with without as is are was were be been being this that it by from at into if then than so such also we you they our your their not no yes very more most much many few several over under between about across after before during within without through up down out off near far any each other own same can will just don't isn't etc
+""".split())
+
+_word_re = re.compile(r"[A-Za-z][A-Za-z\-']+")  # n-gram words
+_count_word_re = re.compile(r"\w+")  # readability / frequency words
+_sentence_split_re = re.compile(r"[.!?]")
+
+
+@lru_cache(maxsize=100_000)
+def count_syllables(word: str) -> int:
+    word = word.lower()
+    vowels = "aeiouy"
+    count = 0
+    prev_char_was_vowel = False
+    for char in word:
+        if char in vowels:
+            if not prev_char_was_vowel:
+                count += 1
+            prev_char_was_vowel = True
+        else:
+            prev_char_was_vowel = False
+    return max(count, 1)
+
+
+def ngram_counts(text: str) -> Counter:
+    """Unigram + bigram counts over non-stopword words (what top_ngrams ranks)."""
+    words = [w.lower() for w in _word_re.findall(text)]
+    words = [w for w in words if w not in _STOP and len(w) > 2]
+    bigrams = [f"{words[i]} {words[i+1]}" for i in range(len(words)-1)]
+    return Counter(words + bigrams)
+
+
+def _count_sentences(text: str) -> int:
+    return sum(1 for s in _sentence_split_re.split(text) if s.strip())
+
+
+class TextStats:
+    def __init__(self, text: str):
+        self.text = text
+        spans = [m.span() for m in _count_word_re.finditer(text)]
+        self.word_starts = [s for s, _ in spans]
+        self.words = [text[s:e] for s, e in spans]
+        self.syllables = [count_syllables(w) for w in self.words]
+        self._syllable_prefix = [0, *accumulate(self.syllables)]
+        self.num_sentences = _count_sentences(text)
+
+    # -- readability --
+
+    def readability_counts(self) -> Tuple[int, int, int]:
+        """(sentences, words, syllables), each floored so ratios are defined."""
+        return max(self.num_sentences, 1), max(len(self.words), 1), self._syllable_prefix[-1]
+
+    def range_counts(self, start: int, end: int) -> Tuple[int, int, int]:
+        """readability_counts of text[start:end]; the bounds must not cut through a word."""
+        lo, hi = bisect_left(self.word_starts, start), bisect_left(self.word_starts, end)
+        syllables = self._syllable_prefix[hi] - self._syllable_prefix[lo]
+        return max(_count_sentences(self.text[start:end]), 1), max(hi - lo, 1), syllables
+
+    @cached_property
+    def sentence_spans(self) -> List[Tuple[int, int]]:
+        """(start, end) of each non-blank '.'-delimited piece, whitespace-trimmed."""
+        spans, pos = [], 0
+        for piece in self.text.split("."):
+            stripped = piece.strip()
+            if stripped:
+                start = pos + (len(piece) - len(piece.lstrip()))
+                spans.append((start, start + len(stripped)))
+            pos += len(piece) + 1
+        return spans
+
+    # -- tokens --
+
+    @cached_property
+    def lower(self) -> str:
+        return self.text.lower()
+
+    @cached_property
+    def word_counts(self) -> Counter:
+        """Counts of lowercased \\w+ tokens (lowercased after splitting, not before)."""
+        return Counter(w.lower() for w in self.words)
+
+    @cached_property
+    def n_whitespace_tokens(self) -> int:
+        return len(self.text.split())
+
+    @cached_property
+    def ngram_counts(self) -> Counter:
+        return ngram_counts(self.text)
+
+
+def as_stats(text) -> TextStats:
+    return text if isinstance(text, TextStats) else TextStats(text)
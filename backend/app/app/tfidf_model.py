@@ -0,0 +1,207 @@
+# app/tfidf_model.py
+"""
+TF-IDF model fitted once on a tenant's history corpus and reused for scoring.
+
+Terms are hashed (HashingVectorizer) so the vocabulary never has to be
+refitted: adding posts only bumps document frequencies. IDF uses the same
+smoothed formula as sklearn's TfidfVectorizer.
+
+A tenant's model remembers which posts (by pattern_store.post_id) it has
+counted, so history sent again does not inflate the document frequencies.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from backend.app.app.config import settings
+
+
+class CorpusTfidf:
+    def __init__(self, n_features: int = 2 ** 18):
+        self.n_features = n_features
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.n_docs = 0
+        self.doc_ids: Set[str] = set()  # posts counted, for tenant models (update_corpus_tfidf)
+        self._idf: Optional[np.ndarray] = None
+        self._hasher = None
+
+    @property
+    def hasher(self):
+        # sklearn is slow to import; only pay for it once the model is used
+        if self._hasher is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            self._hasher = HashingVectorizer(n_features=self.n_features, alternate_sign=False, norm=None)
+        return self._hasher
+
+    def __getstate__(self):
+        # Shipped to scoring worker processes: send df sparsely, rebuild the rest
+        nz = np.flatnonzero(self.df)
+        return {"n_features": self.n_features, "n_docs": self.n_docs, "nz": nz, "df": self.df[nz]}
+
+    def __setstate__(self, state):
+        self.__init__(state["n_features"])
+        self.df[state["nz"]] = state["df"]
+        self.n_docs = state["n_docs"]
+
+    def partial_fit(self, docs: Iterable[str]) -> "CorpusTfidf":
+        """Add documents to the corpus statistics."""
+        docs = list(docs)
+        if not docs:
+            return self
+        counts = self.hasher.transform(docs)
+        counts.data[:] = 1  # presence only
+        self.df += np.asarray(counts.sum(axis=0), dtype=np.int32).ravel()
+        self.n_docs += len(docs)
+        self._idf = None
+        return self
+
+    def remove(self, docs: Iterable[str]) -> "CorpusTfidf":
+        """Take previously added documents back out of the corpus statistics."""
+        docs = list(docs)
+        if not docs:
+            return self
+        counts = self.hasher.transform(docs)
+        counts.data[:] = 1
+        self.df -= np.asarray(counts.sum(axis=0), dtype=np.int32).ravel()
+        np.maximum(self.df, 0, out=self.df)
+        self.n_docs = max(0, self.n_docs - len(docs))
+        self._idf = None
+        return self
+
+    @property
+    def idf(self) -> np.ndarray:
+        if self._idf is None:
+            self._idf = (np.log((1 + self.n_docs) / (1 + self.df.astype(np.float64))) + 1).astype(np.float32)
+        return self._idf
+
+    def transform(self, texts: Sequence[str]):
+        """L2-normalized sparse TF-IDF rows for `texts`."""
+        from sklearn.preprocessing import normalize
+        tf = self.hasher.transform(texts)
+        return normalize(tf.multiply(self.idf).tocsr())
+
+    def similarity_batch(self, pairs: Sequence[Tuple[str, List[str]]]) -> np.ndarray:
+        """
+        Mean cosine similarity between each text and its keywords, for all
+        pairs in one pass. Pairs without keywords score 0.
+        """
+        out = np.zeros(len(pairs), dtype=np.float64)
+        owners = [i for i, (_, kws) in enumerate(pairs) for _ in kws]
+        if not owners:
+            return out
+
+        text_vecs = self.transform([text for text, _ in pairs])
+        kw_vecs = self.transform([kw for _, kws in pairs for kw in kws])
+        owners = np.asarray(owners)
+        sims = np.asarray(text_vecs[owners].multiply(kw_vecs).sum(axis=1)).ravel()
+
+        np.add.at(out, owners, sims)
+        return out / np.maximum(np.bincount(owners, minlength=len(pairs)), 1)
+
+    def copy(self) -> "CorpusTfidf":
+        model = CorpusTfidf(self.n_features)
+        model.df[:] = self.df
+        model.n_docs = self.n_docs
+        model.doc_ids = set(self.doc_ids)
+        model._hasher = self._hasher
+        return model
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}"
+        ids = "\n".join(sorted(self.doc_ids)).encode("utf-8")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, df=self.df, n_docs=self.n_docs, n_features=self.n_features,
+                                doc_ids=np.frombuffer(ids, dtype=np.uint8))
+        os.replace(tmp, path)  # atomic, so concurrent readers never see a partial file
+
+    @classmethod
+    def load(cls, path: str) -> "CorpusTfidf":
+        with np.load(path) as data:
+            model = cls(int(data["n_features"]))
+            model.df = data["df"].astype(np.int32)
+            model.n_docs = int(data["n_docs"])
+            ids = data["doc_ids"].tobytes().decode("utf-8") if "doc_ids" in data else ""
+        model.doc_ids = set(ids.split("\n")) if ids else set()
+        return model
+
+
+# Per-tenant models, loaded lazily from TFIDF_MODEL_DIR
+
+_models: Dict[str, CorpusTfidf] = {}
+_locks: Dict[str, threading.Lock] = {}
+_lock = threading.Lock()  # guards _locks only
+
+
+def _tenant_lock(tenant: str) -> threading.Lock:
+    with _lock:
+        lock = _locks.get(tenant)
+        if lock is None:
+            lock = _locks[tenant] = threading.Lock()
+    return lock
+
+
+def _model_path(tenant: str) -> str:
+    # tenant ids may be API keys; never put them in a filename as-is
+    digest = hashlib.sha256(tenant.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(settings.TFIDF_MODEL_DIR, f"{digest}.npz")
+
+
+def get_corpus_tfidf(tenant: str) -> Optional[CorpusTfidf]:
+    """Fitted model for `tenant`, or None if no history has been seen yet."""
+    model = _models.get(tenant)
+    if model is None:
+        path = _model_path(tenant)
+        if not os.path.exists(path):
+            return None
+        with _tenant_lock(tenant):
+            model = _models.get(tenant)
+            if model is None:
+                model = _models[tenant] = CorpusTfidf.load(path)
+    return model
+
+
+def cached_corpus_tfidf(tenant: str) -> Optional[CorpusTfidf]:
+    """The tenant's model if already in memory; never reads the disk or waits on a lock."""
+    return _models.get(tenant)
+
+
+async def aget_corpus_tfidf(tenant: str) -> Optional[CorpusTfidf]:
+    """get_corpus_tfidf() for the event loop: a loaded model is returned inline, a load runs in a worker thread."""
+    model = _models.get(tenant)
+    if model is None:
+        model = await asyncio.to_thread(get_corpus_tfidf, tenant)
+    return model
+
+
+def update_corpus_tfidf(tenant: str, posts: List[str]) -> CorpusTfidf:
+    """
+    Fold history posts not counted before into the tenant's model and
+    persist it. Blocking (hashing, a 2^18-entry file): call it off the event
+    loop. Readers keep the previous model until the new one is saved.
+    """
+    from backend.app.app.pattern_store import post_id  # pattern_store imports this module
+
+    with _tenant_lock(tenant):
+        model = _models.get(tenant)
+        if model is None:
+            path = _model_path(tenant)
+            model = CorpusTfidf.load(path) if os.path.exists(path) else CorpusTfidf(settings.TFIDF_N_FEATURES)
+        new = {}
+        for text in posts:
+            pid = post_id(text)
+            if pid not in model.doc_ids:
+                new.setdefault(pid, text)
+        if not new:
+            _models[tenant] = model
+            return model
+        model = model.copy()
+        model.partial_fit(new.values())
+        model.doc_ids.update(new)
+        model.save(_model_path(tenant))
+        _models[tenant] = model
+    return model
@@ -0,0 +1,81 @@
+# app/tokens.py
+"""
+Local token counting for prompt budgeting.
+
+Uses tiktoken when it is installed and its encoding is available offline;
+otherwise falls back to a regex approximation (one token per word or
+punctuation mark, plus one per extra 8 characters of long words), which
+tracks BPE counts for English prose closely enough for budgeting.
+"""
+import re
+from typing import List, Tuple
+
+_piece_re = re.compile(r"\w+|[^\w\s]")
+
+_encoding = None
+_encoding_checked = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_checked
+    if not _encoding_checked:
+        _encoding_checked = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = None  # not installed, or encoding not cached locally
+    return _encoding
+
+
+def _piece_cost(piece: str) -> int:
+    return 1 + (len(piece) - 1) // 8
+
+
+def _pieces(text: str) -> List[Tuple[int, int, int]]:
+    """(start, end, cost) for each approximate token piece."""
+    return [(m.start(), m.end(), _piece_cost(m.group())) for m in _piece_re.finditer(text)]
+
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    return sum(_piece_cost(p) for p in _piece_re.findall(text))
+
+
+def head_tokens(text: str, n: int) -> str:
+    """Longest prefix of `text` with at most `n` tokens."""
+    if n <= 0:
+        return ""
+    enc = _get_encoding()
+    if enc is not None:
+        ids = enc.encode(text)
+        return text if len(ids) <= n else enc.decode(ids[:n])
+    used = 0
+    for start, end, cost in _pieces(text):
+        if used + cost > n:
+            return text[:start].rstrip()
+        used += cost
+    return text
+
+
+def tail_tokens(text: str, n: int) -> str:
+    """Longest suffix of `text` with at most `n` tokens."""
+    if n <= 0:
+        return ""
+    enc = _get_encoding()
+    if enc is not None:
+        ids = enc.encode(text)
+        return text if len(ids) <= n else enc.decode(ids[-n:])
+    used = 0
+    for start, end, cost in reversed(_pieces(text)):
+        if used + cost > n:
+            return text[end:].lstrip()
+        used += cost
+    return text
+
+
+def tokenizer_name() -> str:
+    enc = _get_encoding()
+    return enc.name if enc is not None else "regex-approx"
@@ -1,20 +1,22 @@
 import asyncio
-import random
-from typing import Callable, Any, Awaitable
+from typing import Callable, Any, Awaitable, Iterable, List
 
-async def backoff_retry(coro_fn: Callable[[], Awaitable[Any]], *, retries: int = 3, base_ms: int = 200, jitter_ms: int = 100):
+# Retrying upstream calls lives in resilience.resilient_call
+
+
+async def gather_bounded(coro_fns: Iterable[Callable[[], Awaitable[Any]]], *, limit: int) -> List[Any]:
     """
-    Retries an async callable up to `retries` times with exponential backoff + jitter.
-    coro_fn must be an async callable with zero args.
+    Runs zero-arg async callables with at most `limit` of them in flight.
+    Results keep input order. A callable that raises yields its exception
+    in place of a result, so one failure doesn't cancel the rest.
     """
-    exc = None
-    for attempt in range(retries):
-        try:
-            return await coro_fn()
-        except Exception as e:
-            exc = e
-            if attempt == retries - 1:
-                break
-            sleep_ms = (2 ** attempt) * base_ms + random.randint(0, jitter_ms)
-            await asyncio.sleep(sleep_ms / 1000.0)
-    raise exc
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def run(fn):
+        async with sem:
+            try:
+                return await fn()
+            except Exception as e:
+                return e
+
+    return await asyncio.gather(*(run(fn) for fn in coro_fns))
@@ -0,0 +1,80 @@
+# app/warmup.py
+"""
+Preload heavy dependencies that the app otherwise loads on first use.
+
+Each component loads in its own thread so slow imports overlap. Failures
+are reported per component instead of raised: a missing model or lexicon
+should degrade that feature, not keep the pod from starting.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+
+def _sklearn():
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer  # noqa: F401
+    from sklearn.metrics.pairwise import cosine_similarity  # noqa: F401
+    from sklearn.preprocessing import normalize  # noqa: F401
+
+
+def _openai():
+    from backend.app.app.llm_backends import warm
+    warm()
+
+
+def _llm_cache():
+    from backend.app.app.llm import get_llm_cache
+    get_llm_cache()
+
+
+def _vader():
+    from backend.app.app.analysis import get_sia
+    get_sia()
+
+
+def _embeddings():
+    from backend.app.app.embeddings import get_model
+    get_model()
+
+
+def _cpu_pool():
+    from backend.app.app.cpu_executor import get_executor
+    from backend.app.app.scoring import flesch_kincaid_grade
+    executor = get_executor()
+    if executor is not None:
+        # workers start on demand; one trivial task per worker brings them
+        # all up (each preloads its own models in the initializer)
+        n = getattr(executor, "_max_workers", 1)
+        for f in [executor.submit(flesch_kincaid_grade, "warm up.") for _ in range(n)]:
+            f.result()
+
+
+COMPONENTS: Dict[str, Callable[[], None]] = {
+    "sklearn": _sklearn,
+    "openai": _openai,
+    "llm_cache": _llm_cache,
+    "vader": _vader,
+    "embeddings": _embeddings,
+    "cpu_pool": _cpu_pool,
+}
+
+
+def _load(name: str) -> Dict:
+    start = time.perf_counter()
+    try:
+        COMPONENTS[name]()
+        result = {"ok": True}
+    except Exception as e:
+        result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    result["ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+async def warmup(components: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+    """Load `components` (default: all) in parallel; returns per-component status and time."""
+    names = list(components) if components is not None else list(COMPONENTS)
+    unknown = [n for n in names if n not in COMPONENTS]
+    if unknown:
+        raise ValueError(f"unknown warmup components: {unknown}")
+    results = await asyncio.gather(*(asyncio.to_thread(_load, n) for n in names))
+    return dict(zip(names, results))
@@ -0,0 +1,92 @@
+"""
+BlogAgent construction: cold (analyse the whole history) vs warm (pattern
+store lookup), for several history sizes.
+
+    python -m backend.app.benchmarks.agent_startup [--sizes 10,100,1000] [--repeat 3]
+
+"warm (disk)" loads the user's patterns file; "warm (memory)" is a later
+session in the same process. "+1 post" syncs a history with one new post.
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+from backend.app.app.agent import BlogAgent
+from backend.app.app.analysis import get_sia
+from backend.app.app.pattern_store import PatternStore
+from backend.app.app import pattern_store
+
+_WORDS = (
+    "python latency cache profiling async queue database index memory throughput "
+    "design readers writing draft keyword editor sentence budget service request "
+    "response worker thread process benchmark vector model token prompt score"
+).split()
+
+
+def synthetic_posts(n: int, words_per_post: int = 300, seed: int = 0):
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(n):
+        words = [rng.choice(_WORDS) for _ in range(words_per_post)]
+        sentences = [" ".join(words[i:i + 15]).capitalize() + "." for i in range(0, len(words), 15)]
+        posts.append(" ".join(sentences))
+    return posts
+
+
+def best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(sizes, repeat: int):
+    get_sia()  # lexicon load is a one-off cost either way
+    rows = []
+    for n in sizes:
+        posts = synthetic_posts(n + 1)
+        history, extra = posts[:n], posts[n]
+        with tempfile.TemporaryDirectory() as directory:
+            store = PatternStore(directory)
+            pattern_store._store = store
+            cold = best_ms(lambda: BlogAgent(history), repeat)
+            build = best_ms(lambda: (store.evict(), store.get_or_build("bench", history)), 1)
+
+            def from_disk():
+                store.evict()
+                BlogAgent.for_user("bench")
+
+            disk = best_ms(from_disk, repeat)
+            memory = best_ms(lambda: BlogAgent.for_user("bench"), repeat)
+            plus_one = best_ms(lambda: BlogAgent.for_user("bench", history + [extra]), 1)
+        rows.append({
+            "posts": n, "cold_ms": cold, "store_build_ms": build,
+            "warm_disk_ms": disk, "warm_memory_ms": memory, "add_one_post_ms": plus_one,
+        })
+    pattern_store._store = None
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated history sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is reported)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    rows = run([int(s) for s in args.sizes.split(",") if s], args.repeat)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'posts':>6} {'cold ms':>10} {'build ms':>10} {'warm disk':>10} {'warm mem':>10} {'+1 post':>10}")
+    for r in rows:
+        print(f"{r['posts']:>6} {r['cold_ms']:>10.1f} {r['store_build_ms']:>10.1f} "
+              f"{r['warm_disk_ms']:>10.2f} {r['warm_memory_ms']:>10.2f} {r['add_one_post_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare two benchmark result files (micro or load) from different commits.
+
+    python -m backend.app.benchmarks.compare base.json new.json [--threshold 10] [--fail]
+
+Rows are matched on their identifying fields (function and draft size, or
+scenario and concurrency). Every tracked metric is printed with its
+relative change; changes in the bad direction beyond --threshold percent
+are flagged, and --fail makes them the exit status (for CI).
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+_ROW_KEYS = ("name", "scenario", "words", "concurrency")
+# metric -> True if higher is better
+_METRICS = {
+    "micro": {"best_ms": False, "median_ms": False, "cpu_ms_per_call": False, "peak_rss_mb": False},
+    "load": {"rps": True, "latency_ms.p50": False, "latency_ms.p99": False, "error_rate": False,
+             "cpu_ms_per_request": False, "peak_rss_mb": False},
+}
+
+
+def _get(row: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = row
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value if isinstance(value, (int, float)) else None
+
+
+def _row_key(row: Dict[str, Any]) -> Tuple:
+    return tuple((k, row[k]) for k in _ROW_KEYS if k in row)
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold_pct: float) -> List[Dict[str, Any]]:
+    """One entry per (row, metric) present in both documents."""
+    if base.get("suite") != new.get("suite"):
+        raise ValueError(f"can't compare a {base.get('suite')!r} run with a {new.get('suite')!r} run")
+    metrics = _METRICS.get(new.get("suite"), {})
+    base_rows = {_row_key(r): r for r in base["results"]}
+    out = []
+    for row in new["results"]:
+        old = base_rows.get(_row_key(row))
+        if old is None:
+            continue
+        for metric, higher_is_better in metrics.items():
+            before, after = _get(old, metric), _get(row, metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else (0.0 if after == before else float("inf"))
+            worse = change < -threshold_pct if higher_is_better else change > threshold_pct
+            out.append({"row": dict(_row_key(row)), "metric": metric, "base": before, "new": after,
+                        "change_pct": round(change, 1), "regression": worse})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", help="results file of the baseline commit")
+    parser.add_argument("new", help="results file to check")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change flagged as a regression")
+    parser.add_argument("--fail", action="store_true", help="exit with status 1 if anything regressed")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare(base, new, args.threshold)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{base.get('suite')}: {base.get('commit')} -> {new.get('commit')}{' (dirty)' if new.get('dirty') else ''}")
+        for r in rows:
+            label = " ".join(f"{k}={v}" for k, v in r["row"].items())
+            flag = "  REGRESSION" if r["regression"] else ""
+            print(f"{label:<40} {r['metric']:<20} {r['base']:>10.2f} {r['new']:>10.2f} {r['change_pct']:>+8.1f}%{flag}")
+    if args.fail and any(r["regression"] for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Local stand-in for the OpenAI async client, with injectable latency and
+errors. Drop it in place of llm.async_client to exercise retries, the
+circuit breaker and hedging without a network:
+
+    llm.async_client = FakeAsyncLLM(latency_ms=50, error_rate=0.2, seed=1)
+
+create(stream=True) returns an async iterator of content chunks
+(`chunk_chars` characters, `chunk_delay_ms` apart) followed by a final
+usage-only chunk, as the API does with stream_options.include_usage.
+"""
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+from typing import Callable, List, Optional
+
+from backend.app.app.tokens import count_tokens
+
+
+class FakeLLMError(Exception):
+    """Upstream error with an HTTP status, like openai.APIStatusError."""
+
+    def __init__(self, status_code: int = 503, message: str = "fake upstream error"):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+
+def default_content(prompt: str) -> str:
+    """A response that satisfies every prompt in llm.py."""
+    return json.dumps({
+        "topics": ["writing", "performance", "python"],
+        "sentiment": "neutral",
+        "keywords": ["latency", "caching", "profiling", "throughput", "python"],
+        "suggestions": [
+            {"phrase": "for example", "reason": "ground the claim"},
+            {"phrase": "in practice", "reason": "smoother transition"},
+        ],
+    })
+
+
+class FakeChatCompletions:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        status_code: int = 503,
+        fail_first: int = 0,
+        slow_rate: float = 0.0,
+        slow_ms: float = 0.0,
+        content_fn: Callable[[str], str] = default_content,
+        seed: Optional[int] = None,
+        chunk_chars: int = 16,
+        chunk_delay_ms: float = 0.0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.status_code = status_code
+        self.fail_first = fail_first
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.content_fn = content_fn
+        self.chunk_chars = chunk_chars
+        self.chunk_delay_ms = chunk_delay_ms
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.prompts: List[str] = []
+        self.streams: List["FakeStream"] = []
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        prompt = kwargs["messages"][-1]["content"]
+        self.prompts.append(prompt)
+
+        delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+        if self._rng.random() < self.slow_rate:
+            delay += self.slow_ms  # tail latency
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+        if self.calls <= self.fail_first or self._rng.random() < self.error_rate:
+            self.failures += 1
+            raise FakeLLMError(self.status_code)
+
+        content = self.content_fn(prompt)
+        prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(content)
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+        if kwargs.get("stream"):
+            stream = FakeStream(self._stream(content, usage))
+            self.streams.append(stream)
+            return stream
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+    async def _stream(self, content: str, usage):
+        for i in range(0, len(content), self.chunk_chars):
+            if i and self.chunk_delay_ms > 0:
+                await asyncio.sleep(self.chunk_delay_ms / 1000.0)
+            piece = content[i:i + self.chunk_chars]
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeStream:
+    """Quacks like openai.AsyncStream: async iteration plus close()."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks
+
+    async def close(self):
+        self.closed = True
+        await self._chunks.aclose()
+
+
+class FakeAsyncLLM:
+    """Quacks like openai.AsyncOpenAI for chat.completions.create."""
+
+    def __init__(self, **kwargs):
+        self.completions = FakeChatCompletions(**kwargs)
+        self.chat = SimpleNamespace(completions=self.completions)
@@ -0,0 +1,219 @@
+"""
+OpenAI-compatible stand-in server for load tests: POST /v1/chat/completions
+(plain and streamed) with configurable latency, errors and canned replies.
+
+    python -m backend.app.benchmarks.fake_openai_server --port 8011 \\
+        --latency lognormal:400:0.5 --error-rate 0.02 --responses replies.json
+
+Then start the app with OPENAI_BASE_URL=http://127.0.0.1:8011/v1 (the
+openai client reads it). No tokens are spent; usage is counted with the
+app's own tokenizer.
+
+Latency distributions, in ms (each request samples one):
+
+    fixed:MS                 always MS
+    uniform:LO:HI
+    normal:MEAN:SD           clipped at 0
+    lognormal:MEDIAN:SIGMA   long right tail, like real LLM APIs
+    pareto:SCALE:ALPHA       heavy tail: SCALE ms minimum
+
+--responses is a JSON list. Each item is either a reply object (sent as
+the message content) or {"match": "substring", "content": {...}}, used
+when the prompt contains the substring. Plain items rotate round-robin
+for prompts no "match" item claims. Without it every prompt gets
+fake_llm.default_content, which satisfies all of llm.py's prompts.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from backend.app.app.tokens import count_tokens
+from backend.app.benchmarks.fake_llm import default_content
+
+_DISTRIBUTIONS = {
+    "fixed": (1, lambda rng, ms: ms),
+    "uniform": (2, lambda rng, lo, hi: rng.uniform(lo, hi)),
+    "normal": (2, lambda rng, mean, sd: max(0.0, rng.gauss(mean, sd))),
+    "lognormal": (2, lambda rng, median, sigma: rng.lognormvariate(0.0, sigma) * median),
+    "pareto": (2, lambda rng, scale, alpha: rng.paretovariate(alpha) * scale),
+}
+
+
+class Latency:
+    """A latency distribution parsed from "name:arg[:arg]" (see module docstring)."""
+
+    def __init__(self, spec: str = "fixed:0", seed: Optional[int] = None):
+        name, *args = spec.split(":")
+        if name not in _DISTRIBUTIONS or len(args) != _DISTRIBUTIONS[name][0]:
+            raise ValueError(f"bad latency spec {spec!r}; expected one of {sorted(_DISTRIBUTIONS)}")
+        self.spec = spec
+        self._sample = _DISTRIBUTIONS[name][1]
+        self._args = [float(a) for a in args]
+        self._rng = random.Random(seed)
+
+    def sample_ms(self) -> float:
+        return self._sample(self._rng, *self._args)
+
+
+class Replies:
+    """Canned message contents, chosen by prompt substring or round-robin."""
+
+    def __init__(self, items: Optional[List[Any]] = None):
+        self.matched, plain = [], []
+        for item in items or []:
+            if isinstance(item, dict) and "match" in item:
+                self.matched.append((item["match"], _as_content(item["content"])))
+            else:
+                plain.append(_as_content(item))
+        self._plain = itertools.cycle(plain) if plain else None
+
+    @classmethod
+    def load(cls, path: Optional[str]) -> "Replies":
+        if not path:
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def content(self, prompt: str) -> str:
+        for needle, content in self.matched:
+            if needle in prompt:
+                return content
+        return next(self._plain) if self._plain is not None else default_content(prompt)
+
+
+def _as_content(item: Any) -> str:
+    return item if isinstance(item, str) else json.dumps(item)
+
+
+def create_app(latency: str = "fixed:0", error_rate: float = 0.0, error_status: int = 503,
+               replies: Optional[Replies] = None, chunk_chars: int = 16, chunk_delay_ms: float = 0.0,
+               seed: Optional[int] = None):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI(title="Fake OpenAI")
+    delays = Latency(latency, seed)
+    errors = random.Random(None if seed is None else seed + 1)
+    replies = replies or Replies()
+    counters = {"requests": 0, "errors": 0, "streams": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    app.state.counters = counters
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+        await asyncio.sleep(delays.sample_ms() / 1000.0)
+        if errors.random() < error_rate:
+            counters["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "fake upstream error", "type": "server_error", "code": error_status}},
+                status_code=error_status,
+                headers={"Retry-After": "1"} if error_status == 429 else None,
+            )
+
+        prompt = body["messages"][-1]["content"]
+        content = replies.content(prompt)
+        usage = {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        counters["prompt_tokens"] += usage["prompt_tokens"]
+        counters["completion_tokens"] += usage["completion_tokens"]
+        meta = {"id": f"chatcmpl-fake{counters['requests']}", "created": int(time.time()),
+                "model": body.get("model", "fake")}
+
+        if not body.get("stream"):
+            return {**meta, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}},
+            ]}
+
+        counters["streams"] += 1
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def events():
+            for i in range(0, len(content), chunk_chars):
+                if i and chunk_delay_ms > 0:
+                    await asyncio.sleep(chunk_delay_ms / 1000.0)
+                delta = {"content": content[i:i + chunk_chars]}
+                yield _sse({**meta, "object": "chat.completion.chunk",
+                            "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            yield _sse({**meta, "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if include_usage:
+                yield _sse({**meta, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "benchmarks"}]}
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, int]:
+        return counters
+
+    return app
+
+
+def _sse(payload: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+class BackgroundServer:
+    """Runs a create_app() server on a thread (for load tests in one process)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **app_kwargs):
+        import uvicorn
+        self.app = create_app(**app_kwargs)
+        config = uvicorn.Config(self.app, host=host, port=port, log_level="warning", access_log=False)
+        self.server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self.server.run, name="fake-openai", daemon=True)
+
+    def __enter__(self) -> "BackgroundServer":
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("fake OpenAI server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join(timeout=10)
+
+    @property
+    def base_url(self) -> str:
+        sock = self.server.servers[0].sockets[0]
+        host, port = sock.getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        return self.app.state.counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", default="lognormal:400:0.5", help="latency distribution, in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of failed requests")
+    parser.add_argument("--responses", help="JSON file of canned replies")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20.0, help="delay between streamed chunks")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(args.latency, args.error_rate, args.error_status, Replies.load(args.responses),
+                     args.chunk_chars, args.chunk_delay_ms, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Shared pieces of the benchmark suite: latency percentiles, CPU time and
+peak RSS of a process tree, and the JSON result files that
+benchmarks.compare diffs between commits.
+
+CPU and memory come from /proc, so CPU executor worker processes are
+included; elsewhere only the current process is measured (via resource).
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+_PROC = "/proc"
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def percentiles(samples_ms: Sequence[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank percentiles of latency samples, in ms."""
+    if not samples_ms:
+        return {"p50": None, "p90": None, "p95": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(samples_ms)
+
+    def rank(p):
+        return round(ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1], 3)
+
+    return {"p50": rank(50), "p90": rank(90), "p95": rank(95), "p99": rank(99),
+            "max": round(ordered[-1], 3), "mean": round(sum(ordered) / len(ordered), 3)}
+
+
+# -- process tree --
+
+def _children(pid: int) -> List[int]:
+    out = []
+    try:
+        for tid in os.listdir(f"{_PROC}/{pid}/task"):
+            with open(f"{_PROC}/{pid}/task/{tid}/children") as f:
+                out.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return out
+
+
+def process_tree(pid: int) -> List[int]:
+    pids, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        pids.append(p)
+        todo.extend(_children(p))
+    return pids
+
+
+def _cpu_seconds(pid: int) -> Optional[float]:
+    try:
+        with open(f"{_PROC}/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / _CLK_TCK  # utime + stime
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"{_PROC}/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class ProcessMeter:
+    """
+    CPU seconds used and peak RSS of a process and its children between
+    start() and stop(). Children that exit in between are not counted.
+    Peak RSS is the sum of each process's own peak (an upper bound).
+    """
+
+    def __init__(self, pid: Optional[int] = None):
+        self.pid = pid or os.getpid()
+        self.proc = os.path.exists(f"{_PROC}/{self.pid}/stat")
+        self._start: Dict[int, float] = {}
+        self._start_cpu = 0.0
+
+    def _snapshot(self) -> Dict[int, float]:
+        out = {}
+        for pid in process_tree(self.pid):
+            cpu = _cpu_seconds(pid)
+            if cpu is not None:
+                out[pid] = cpu
+        return out
+
+    def start(self) -> "ProcessMeter":
+        if self.proc:
+            self._start = self._snapshot()
+        else:
+            self._start_cpu = time.process_time()
+        return self
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        if not self.proc:
+            import resource
+            peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak = peak_kb / (1024 * 1024) if sys.platform == "darwin" else peak_kb / 1024
+            return {"cpu_s": time.process_time() - self._start_cpu, "peak_rss_mb": round(peak, 1)}
+        now = self._snapshot()
+        cpu = sum(t - self._start.get(pid, 0.0) for pid, t in now.items())
+        peaks = [p for p in (_peak_rss_mb(pid) for pid in now) if p is not None]
+        return {"cpu_s": round(cpu, 3), "peak_rss_mb": round(sum(peaks), 1) if peaks else None}
+
+
+# -- result files --
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", *args], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def envelope(suite: str, params: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """A result document: what ran, on which commit and machine, and the rows."""
+    return {
+        "suite": suite,
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+
+
+def save(path: str, doc: Dict[str, Any]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2)
+        f.write("\n")
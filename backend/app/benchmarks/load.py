@@ -0,0 +1,256 @@
+"""
+Concurrent load scenarios with a local fake LLM: RPS, latency percentiles,
+CPU time per request and peak RSS.
+
+    python -m backend.app.benchmarks.load [--scenarios recommend,analyze,agent]
+        [--concurrency 1,8,32] [--requests 200 | --duration 30]
+        [--latency lognormal:400:0.5] [--error-rate 0.01] [--out load.json]
+
+Scenarios:
+
+  recommend  POST /api/recommend-keywords, one distinct draft per request
+  analyze    POST /api/analyze-blogs with --posts posts per request
+  agent      BlogAgent.suggest_in_real_time as a user types: each of the
+             `concurrency` users grows their draft one sentence per call
+
+By default the app runs in this process (HTTP via an ASGI transport, so no
+server is needed) and its OpenAI client talks to a fake_openai_server on a
+background thread. The LLM cache and per-key rate limits are turned off so
+every request reaches the fake upstream; load shedding stays on, and
+refused requests are counted by status code. CPU time and RSS cover this
+process and its CPU executor workers, so they include the fake server.
+
+--url points the HTTP scenarios at a running app instead (start it with
+OPENAI_BASE_URL aimed at a fake_openai_server, and LLM_CACHE_ENABLED=false);
+pass its --pid to measure its CPU and RSS. The agent scenario always runs
+in this process.
+
+Compare two result files with benchmarks.compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.app.benchmarks.fake_openai_server import BackgroundServer, Replies
+from backend.app.benchmarks.harness import ProcessMeter, envelope, percentiles, save
+from backend.app.benchmarks.text_stats import synthetic_draft
+
+PROFILE = {"preferred_topics": ["performance", "python"], "reading_level": "general", "banned_words": ["synergy"]}
+API_KEY = "bench-key"
+DISTINCT_BODIES = 64  # requests cycle through this many different payloads
+
+
+async def drive(call: Callable[[int], Awaitable[str]], concurrency: int, requests: Optional[int],
+                duration: Optional[float]) -> Dict[str, Any]:
+    """
+    Run `call(i)` from `concurrency` workers until `requests` calls are done
+    or `duration` seconds have passed. call returns an outcome label
+    ("200", "429", "ok", ...); exceptions are labelled by type.
+    """
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    issued = 0
+    started = time.perf_counter()
+    stop_at = started + duration if duration else None
+
+    async def worker():
+        nonlocal issued
+        while True:
+            if requests is not None and issued >= requests:
+                return
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                return
+            i = issued
+            issued += 1
+            t0 = time.perf_counter()
+            try:
+                outcome = await call(i)
+            except Exception as e:
+                outcome = type(e).__name__
+            latencies.append((time.perf_counter() - t0) * 1000)
+            outcomes[outcome] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"elapsed_s": time.perf_counter() - started, "latencies": latencies, "outcomes": outcomes}
+
+
+# -- scenarios --
+
+def _http_call(client, path: str, bodies: List[Dict[str, Any]]):
+    async def call(i: int) -> str:
+        resp = await client.post(path, json=bodies[i % len(bodies)], headers={"X-API-Key": API_KEY})
+        await resp.aread()
+        return str(resp.status_code)
+    return call
+
+
+def recommend_scenario(client, args):
+    bodies = [{"draft_text": synthetic_draft(args.draft_words, seed=i), "user_profile": PROFILE}
+              for i in range(DISTINCT_BODIES)]
+    return _http_call(client, "/api/recommend-keywords", bodies)
+
+
+def analyze_scenario(client, args):
+    bodies = [{"posts": [synthetic_draft(args.post_words, seed=i * args.posts + j) for j in range(args.posts)]}
+              for i in range(DISTINCT_BODIES)]
+    return _http_call(client, "/api/analyze-blogs", bodies)
+
+
+def agent_scenario(client, args, concurrency: int):
+    from backend.app.app.agent import BlogAgent
+
+    history = [synthetic_draft(args.post_words, seed=1000 + i) for i in range(args.posts)]
+    idle: asyncio.Queue = asyncio.Queue()  # users not waiting on a suggestion right now
+    for u in range(concurrency):
+        sentences = synthetic_draft(args.draft_words, seed=2000 + u).split(". ")
+        idle.put_nowait({"agent": BlogAgent(history), "sentences": sentences, "typed": 0})
+
+    async def call(i: int) -> str:
+        user = await idle.get()
+        try:
+            n = user["typed"] = user["typed"] % len(user["sentences"]) + 1
+            got: List[Dict[str, Any]] = []
+            await user["agent"].suggest_in_real_time(". ".join(user["sentences"][:n]), PROFILE, got.append)
+        finally:
+            idle.put_nowait(user)
+        if not got:
+            return "error"
+        return "fallback" if got[0].get("fallback") else "ok"
+
+    return call
+
+
+# -- setup --
+
+def configure_in_process(base_url: str, workdir: str, keep_cache: bool):
+    """Point the app's LLM client at the fake server and switch off what would hide upstream load."""
+    os.environ["OPENAI_BASE_URL"] = base_url
+    from backend.app.app import llm, llm_backends, ratelimit
+    from backend.app.app.config import settings
+
+    llm.client = llm.async_client = None
+    llm_backends.reset()  # clients are rebuilt with the new base URL
+    if not keep_cache:
+        settings.LLM_CACHE_ENABLED = False
+        llm.llm_cache = None
+    settings.API_KEY = API_KEY
+    settings.RATE_LIMIT_RPS = 0
+    settings.LLM_TOKENS_PER_MIN = 0
+    ratelimit._limiter = None
+    settings.TFIDF_MODEL_DIR = os.path.join(workdir, "tfidf")
+    settings.PATTERN_STORE_DIR = os.path.join(workdir, "patterns")
+
+
+def _http_client(url: Optional[str]):
+    import httpx
+    timeout = httpx.Timeout(300.0)
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout, limits=httpx.Limits(max_connections=1000))
+    from backend.app.app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=timeout)
+
+
+async def run_all(args, server: Optional[BackgroundServer]) -> List[Dict[str, Any]]:
+    rows = []
+    async with _http_client(args.url) as client:
+        for name in args.scenarios:
+            for concurrency in args.concurrency:
+                if name == "agent":
+                    call = agent_scenario(client, args, concurrency)
+                else:
+                    call = {"recommend": recommend_scenario, "analyze": analyze_scenario}[name](client, args)
+                # Warm up (process pool spawn, lazy imports, first connections) outside the measurement
+                await drive(call, min(concurrency, 2), args.warmup, None)
+
+                before = dict(server.counters) if server is not None else None
+                meter = ProcessMeter(args.pid if args.url else None).start()
+                run = await drive(call, concurrency, None if args.duration else args.requests, args.duration)
+                usage = meter.stop()
+                n = len(run["latencies"])
+                row = {
+                    "scenario": name,
+                    "concurrency": concurrency,
+                    "requests": n,
+                    "duration_s": round(run["elapsed_s"], 3),
+                    "rps": round(n / run["elapsed_s"], 2) if run["elapsed_s"] else None,
+                    "outcomes": dict(run["outcomes"]),
+                    "error_rate": round(1 - sum(v for k, v in run["outcomes"].items() if k in ("200", "ok")) / n, 4)
+                    if n else None,
+                    "latency_ms": percentiles(run["latencies"]),
+                    "cpu_ms_per_request": round(usage["cpu_s"] * 1000 / n, 3) if n and usage["cpu_s"] is not None
+                    else None,
+                    "peak_rss_mb": usage["peak_rss_mb"],
+                }
+                if before is not None:
+                    row["llm_calls"] = server.counters["requests"] - before["requests"]
+                rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="recommend,analyze,agent", help="comma-separated scenarios")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency")
+    parser.add_argument("--duration", type=float, help="run each for this many seconds instead")
+    parser.add_argument("--warmup", type=int, default=4, help="unmeasured requests before each run")
+    parser.add_argument("--draft-words", type=int, default=800, help="words per draft")
+    parser.add_argument("--posts", type=int, default=5, help="posts per analyze request / agent history")
+    parser.add_argument("--post-words", type=int, default=400, help="words per post")
+    parser.add_argument("--latency", default="lognormal:400:0.5", help="fake LLM latency distribution (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake LLM error rate")
+    parser.add_argument("--error-status", type=int, default=503, help="fake LLM error status")
+    parser.add_argument("--responses", help="JSON file of canned fake LLM replies")
+    parser.add_argument("--chunk-delay-ms", type=float, default=10.0, help="fake LLM delay between streamed chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-url", help="use this OpenAI-compatible base URL instead of a local fake")
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM completion cache on")
+    parser.add_argument("--url", help="load-test a running app at this URL instead of in-process")
+    parser.add_argument("--pid", type=int, help="with --url: the app's pid, for CPU and RSS")
+    parser.add_argument("--out", help="write the results document (JSON) here")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    unknown = set(args.scenarios) - {"recommend", "analyze", "agent"}
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+
+    params = {k: v for k, v in vars(args).items() if k not in ("out", "json")}
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.llm_url:
+            configure_in_process(args.llm_url, workdir, args.llm_cache)
+            rows = asyncio.run(run_all(args, None))
+        else:
+            with BackgroundServer(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status,
+                                  replies=Replies.load(args.responses), chunk_delay_ms=args.chunk_delay_ms,
+                                  seed=args.seed) as server:
+                configure_in_process(server.base_url, workdir, args.llm_cache)
+                rows = asyncio.run(run_all(args, server))
+    from backend.app.app import cpu_executor
+    cpu_executor.shutdown()
+
+    doc = envelope("load", params, rows)
+    if args.out:
+        save(args.out, doc)
+    if args.json:
+        print(json.dumps(doc, indent=2))
+        return
+    print(f"{'scenario':<10} {'conc':>5} {'reqs':>6} {'rps':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+          f"{'err %':>6} {'cpu ms/req':>11} {'peak MB':>8}")
+    for r in rows:
+        lat = r["latency_ms"]
+        cpu = f"{r['cpu_ms_per_request']:>11.2f}" if r["cpu_ms_per_request"] is not None else f"{'-':>11}"
+        rss = f"{r['peak_rss_mb']:>8.0f}" if r["peak_rss_mb"] is not None else f"{'-':>8}"
+        print(f"{r['scenario']:<10} {r['concurrency']:>5} {r['requests']:>6} {r['rps'] or 0:>8.1f} "
+              f"{lat['p50'] or 0:>9.1f} {lat['p90'] or 0:>9.1f} {lat['p99'] or 0:>9.1f} "
+              f"{(r['error_rate'] or 0) * 100:>6.1f} {cpu} {rss}")
+
+
+if __name__ == "__main__":
+    main()
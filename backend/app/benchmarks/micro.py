@@ -0,0 +1,99 @@
+"""
+Micro-benchmarks of the scoring and analysis functions on drafts of 100 to
+20k words, each called with the raw string (as the endpoints do).
+
+    python -m backend.app.benchmarks.micro [--words 100,1000,5000,20000] [--repeat 5] [--out micro.json]
+
+blog_score and keyword_relevance run with a corpus-fitted TF-IDF model, as
+they do for tenants with history. The syllable cache is cleared before
+every run, so words are never pre-counted. CPU time is read from /proc
+(10 ms ticks), so it is only meaningful for the larger drafts.
+"""
+import argparse
+import json
+import time
+
+from backend.app.app.analysis import get_sia, sentiment_scores, top_ngrams
+from backend.app.app.scoring import blog_score, flesch_kincaid_grade, keyword_relevance
+from backend.app.app.text_stats import count_syllables
+from backend.app.app.tfidf_model import CorpusTfidf
+from backend.app.benchmarks.harness import ProcessMeter, envelope, save
+from backend.app.benchmarks.text_stats import synthetic_draft
+
+KEYWORDS = ["caching", "latency", "profiling", "python services"]
+PROFILE = {"preferred_topics": ["performance", "python"], "reading_level": 9, "banned_words": []}
+
+
+def functions(tfidf: CorpusTfidf):
+    return {
+        "blog_score": lambda text: blog_score(text, KEYWORDS, PROFILE, tfidf),
+        "keyword_relevance": lambda text: keyword_relevance(text, KEYWORDS, tfidf),
+        "flesch_kincaid_grade": flesch_kincaid_grade,
+        "top_ngrams": lambda text: top_ngrams(text, 50),
+        "sentiment_scores": sentiment_scores,
+    }
+
+
+def timings_ms(fn, text, repeat):
+    samples = []
+    for _ in range(repeat):
+        count_syllables.cache_clear()
+        start = time.perf_counter()
+        fn(text)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run(sizes, repeat, only=None):
+    tfidf = CorpusTfidf().partial_fit(synthetic_draft(300, seed=s) for s in range(50))
+    fns = functions(tfidf)
+    for fn in fns.values():
+        fn("Warm up imports and lazy models.")  # sklearn, VADER lexicon
+    get_sia()
+    rows = []
+    for n in sizes:
+        text = synthetic_draft(n, seed=n)
+        for name, fn in fns.items():
+            if only and name not in only:
+                continue
+            meter = ProcessMeter().start()
+            samples = timings_ms(fn, text, repeat)
+            usage = meter.stop()
+            rows.append({
+                "name": name,
+                "words": n,
+                "best_ms": round(min(samples), 3),
+                "median_ms": round(sorted(samples)[len(samples) // 2], 3),
+                "ms_per_1k_words": round(min(samples) / n * 1000, 3),
+                "cpu_ms_per_call": round(usage["cpu_s"] * 1000 / repeat, 3) if usage["cpu_s"] is not None else None,
+                "peak_rss_mb": usage["peak_rss_mb"],
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", default="100,1000,5000,20000", help="comma-separated draft sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parser.add_argument("--only", help="comma-separated function names (default: all)")
+    parser.add_argument("--out", help="write the results document (JSON) here")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    sizes = [int(w) for w in args.words.split(",") if w]
+    only = {n.strip() for n in args.only.split(",")} if args.only else None
+    doc = envelope("micro", {"words": sizes, "repeat": args.repeat}, run(sizes, args.repeat, only))
+    if args.out:
+        save(args.out, doc)
+    if args.json:
+        print(json.dumps(doc, indent=2))
+        return
+    print(f"{'function':<22} {'words':>7} {'best ms':>9} {'median ms':>10} {'ms/1k words':>12} {'cpu ms':>8}")
+    for r in doc["results"]:
+        cpu = f"{r['cpu_ms_per_call']:>8.2f}" if r["cpu_ms_per_call"] is not None else f"{'-':>8}"
+        print(f"{r['name']:<22} {r['words']:>7} {r['best_ms']:>9.2f} {r['median_ms']:>10.2f} "
+              f"{r['ms_per_1k_words']:>12.3f} {cpu}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+History n-gram index: build time, memory and query latency on synthetic
+corpora of topical posts.
+
+    python -m backend.app.benchmarks.ngram_index [--posts 1000,10000] [--post-words 400]
+        [--queries 500] [--check 20]
+
+Per corpus size:
+
+  count ms     ngram_counts over every post (what UserPatterns already does)
+  build ms     NgramIndex.add for every post, then compact()
+  memory MB    Python heap held by the built index (tracemalloc: arrays, term
+               strings and dicts), and the id arrays alone
+  saved MB     the index arrays compressed as UserPatterns.save writes them
+  load ms      NgramIndex.from_arrays on that file
+  query ms     related() for a cursor context (last 24 tokens of a draft on one
+               of the corpus topics), p50 / p99 over --queries contexts
+  add / del ms add one post to / delete one post from the built index (p50)
+  scan ms      the same query answered by scanning every post's counts, as
+               without an index; for --check of them the top scores must match related()
+"""
+import argparse
+import io
+import json
+import math
+import random
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+
+from backend.app.app.config import settings
+from backend.app.app.ngram_index import NgramIndex
+from backend.app.app.semantic_cache import cursor_window
+from backend.app.app.text_stats import ngram_counts
+from backend.app.benchmarks.harness import percentiles
+
+STOP = "the a of and to in is it we this that for with on as".split()
+SYLLABLES = "ka lo mi ne ra su ti vo ze pa del tor mun sil ver qua bri shen".split()
+
+
+def vocabulary(n, seed=0):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < n:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Corpus:
+    """Posts on a few of n_topics topics, each topic a Zipf-weighted slice of the vocabulary."""
+
+    def __init__(self, n_topics=100, words_per_topic=300, vocab=30_000, seed=0):
+        self.rng = random.Random(seed)
+        self.words = vocabulary(vocab, seed)
+        zipf = [1 / (r + 1) for r in range(words_per_topic)]
+        self.topics = [(self.rng.sample(self.words, words_per_topic), zipf) for _ in range(n_topics)]
+
+    def text(self, n_words, topics):
+        out = []
+        for _ in range(n_words):
+            if self.rng.random() < 0.35:
+                out.append(self.rng.choice(STOP))
+            elif self.rng.random() < 0.1:
+                out.append(self.rng.choice(self.words))  # off-topic
+            else:
+                words, weights = self.topics[self.rng.choice(topics)]
+                out.append(self.rng.choices(words, weights)[0])
+        return " ".join(out) + "."
+
+    def post(self, n_words):
+        return self.text(n_words, self.rng.sample(range(len(self.topics)), self.rng.randint(1, 2)))
+
+    def context(self):
+        draft = self.text(60, [self.rng.randrange(len(self.topics))])
+        return cursor_window(draft, "", settings.NGRAM_INDEX_CONTEXT_TOKENS)
+
+
+def scan(counts, context, k):
+    """related()'s top scores by brute force over every post's counts (the baseline and the check)."""
+    n = len(counts)
+    df = Counter(t for c in counts for t in c)
+    idf = {t: math.log((1 + n) / (1 + d)) + 1 for t, d in df.items()}
+    query = [t for t in ngram_counts(context) if t in df]
+    doc_scores = np.array([sum(idf[t] for t in query if t in c) for c in counts])
+    best = [d for d in np.argsort(-doc_scores, kind="stable")[:settings.NGRAM_INDEX_QUERY_POSTS] if doc_scores[d] > 0]
+    scores = Counter()
+    for d in best:
+        for t, c in counts[d].items():
+            scores[t] += doc_scores[d] * (1 + math.log(c))
+    for t in query:
+        scores.pop(t, None)
+    scores = {t: s for t, s in scores.items() if df[t] >= 2}
+    return sorted((s * idf[t] for t, s in scores.items()), reverse=True)[:k]
+
+
+def build(counts):
+    index = NgramIndex()
+    for i, c in enumerate(counts):
+        index.add(str(i), c)
+    index.compact()
+    return index
+
+
+def run_one(n_posts, post_words, n_queries, n_check):
+    corpus = Corpus(seed=n_posts)
+    posts = [corpus.post(post_words) for _ in range(n_posts)]
+    row = {"posts": n_posts}
+
+    start = time.perf_counter()
+    counts = [ngram_counts(p) for p in posts]
+    row["count_ms"] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    index = build(counts)
+    row["build_ms"] = (time.perf_counter() - start) * 1000
+    row.update(index.stats())
+    row["arrays_mb"] = index.nbytes() / 2 ** 20
+
+    del index
+    fresh = [ngram_counts(p) for p in posts]  # term strings the index will own
+    tracemalloc.start()
+    index = build(fresh)
+    del fresh
+    row["memory_mb"] = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **index.to_arrays())
+    row["saved_mb"] = buf.tell() / 2 ** 20
+    buf.seek(0)
+    start = time.perf_counter()
+    with np.load(buf) as data:
+        NgramIndex.from_arrays(data)
+    row["load_ms"] = (time.perf_counter() - start) * 1000
+
+    contexts = [corpus.context() for _ in range(n_queries)]
+    index.related(contexts[0])  # first-call overhead (numpy dispatch caches)
+    latencies = []
+    for context in contexts:
+        start = time.perf_counter()
+        index.related(context, k=settings.MAX_SUGGESTIONS)
+        latencies.append((time.perf_counter() - start) * 1000)
+    pct = percentiles(latencies)
+    row["query_p50_ms"], row["query_p99_ms"] = pct["p50"], pct["p99"]
+
+    adds, dels = [], []
+    for i in range(50):
+        c = ngram_counts(corpus.post(post_words))
+        start = time.perf_counter()
+        index.add(f"new-{i}", c)
+        adds.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        index.remove(str(i))
+        dels.append((time.perf_counter() - start) * 1000)
+    row["add_ms"], row["del_ms"] = percentiles(adds)["p50"], percentiles(dels)["p50"]
+
+    # Exactness and the no-index baseline, on the original corpus
+    index = build(counts)
+    scan_ms, mismatches = [], 0
+    for context in contexts[:n_check]:
+        start = time.perf_counter()
+        expected = scan(counts, context, settings.MAX_SUGGESTIONS)
+        scan_ms.append((time.perf_counter() - start) * 1000)
+        got = [s for _, s in index.related(context, k=settings.MAX_SUGGESTIONS)]
+        mismatches += not np.allclose(got, expected, rtol=1e-9)  # equal scores may list in another order
+    row["scan_ms"] = percentiles(scan_ms)["p50"]
+    row["mismatches"] = mismatches
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", default="1000,10000", help="comma-separated corpus sizes")
+    parser.add_argument("--post-words", type=int, default=400, help="words per post")
+    parser.add_argument("--queries", type=int, default=500, help="cursor contexts queried per corpus")
+    parser.add_argument("--check", type=int, default=20, help="queries also answered by a full scan")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    rows = [run_one(int(n), args.post_words, args.queries, args.check) for n in args.posts.split(",") if n]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'posts':>7} {'terms':>9} {'postings':>10} {'count ms':>9} {'build ms':>9} {'memory MB':>10} "
+          f"{'arrays MB':>10} {'saved MB':>9} {'load ms':>8} {'query p50':>10} {'p99':>7} {'add ms':>7} "
+          f"{'del ms':>7} {'scan ms':>8} {'mismatch':>8}")
+    for r in rows:
+        print(f"{r['posts']:>7} {r['terms']:>9} {r['postings']:>10} {r['count_ms']:>9.0f} {r['build_ms']:>9.0f} "
+              f"{r['memory_mb']:>10.1f} {r['arrays_mb']:>10.1f} {r['saved_mb']:>9.1f} {r['load_ms']:>8.0f} "
+              f"{r['query_p50_ms']:>10.3f} {r['query_p99_ms']:>7.3f} {r['add_ms']:>7.3f} {r['del_ms']:>7.3f} "
+              f"{r['scan_ms']:>8.1f} {r['mismatches']:>8}")
+
+
+if __name__ == "__main__":
+    main()
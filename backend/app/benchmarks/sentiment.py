@@ -0,0 +1,158 @@
+"""
+Sentence-memoized sentiment vs whole-text VADER, for single drafts and for
+batches of posts.
+
+    python -m backend.app.benchmarks.sentiment [--words 200,1000,5000] [--repeat 5]
+        [--posts 2000] [--post-words 400] [--workers 0]
+
+Per draft size:
+
+  vader    polarity_scores over the whole draft (the previous implementation)
+  cold     sentiment.score with an empty memo
+  repeat   sentiment.score on a draft it has already seen
+  edit     one sentence in the middle rewritten since the last call
+  type     one sentence appended since the last call
+  max diff largest |score - polarity_scores| over every draft scored, in
+           units of sentiment.TOLERANCE (at most 1 is within tolerance)
+
+The batch row scores --posts distinct posts once: serially with
+polarity_scores (as analyze_posts used to), and with score_many_async on a
+process pool of --workers (0 = one per CPU).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from backend.app.app import cpu_executor, sentiment
+from backend.app.app.analysis import get_sia
+from backend.app.app.config import settings
+
+POSITIVE = "great love excellent happy helpful clear fast good best enjoy".split()
+NEGATIVE = "terrible hate awful slow broken bad worst painful confusing ugly".split()
+NEUTRAL = ("the service cache query latency team python code users release memory index we it this "
+           "a of to in is").split()
+MODIFIERS = "very really extremely not never barely".split()
+
+
+def opinion_sentence(rng):
+    words = [rng.choice(NEUTRAL) for _ in range(rng.randint(5, 25))]
+    for _ in range(rng.randint(0, 3)):
+        j = rng.randrange(len(words))
+        words[j] = rng.choice(POSITIVE if rng.random() < 0.55 else NEGATIVE)
+        if j and rng.random() < 0.3:
+            words[j - 1] = rng.choice(MODIFIERS)
+    if rng.random() < 0.1:
+        words.insert(rng.randrange(len(words)), "but")
+    return " ".join(words).capitalize() + rng.choice(".....!?")
+
+
+def opinion_draft(n_words, seed=0):
+    rng = random.Random(seed)
+    out, words = [], 0
+    while words < n_words:
+        out.append(opinion_sentence(rng))
+        words += len(out[-1].split())
+    return out
+
+
+def best_ms(fn, texts):
+    # One call per text: each is the draft after one more edit
+    best = float("inf")
+    for text in texts:
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(sizes, repeat):
+    sia = get_sia()
+    rng = random.Random(1)
+    rows = []
+    for n in sizes:
+        sentences = opinion_draft(n, seed=n)
+        draft = " ".join(sentences)
+        edits, typed = [], list(sentences)
+        for i in range(repeat):
+            edited = list(sentences)
+            edited[len(edited) // 2] = opinion_sentence(rng)
+            edits.append(" ".join(edited))
+            typed.append(opinion_sentence(rng))
+        typing = [" ".join(typed[:len(sentences) + i + 1]) for i in range(repeat)]
+        memo = sentiment.get_memo()
+
+        def cold(text):
+            memo.clear()
+            sentiment.score(text)
+
+        row = {"words": n, "sentences": len(sentences), "vader_ms": best_ms(sia.polarity_scores, [draft] * repeat),
+               "cold_ms": best_ms(cold, [draft] * repeat)}
+        sentiment.score(draft)
+        row["repeat_ms"] = best_ms(sentiment.score, [draft] * repeat)
+        row["edit_ms"] = best_ms(sentiment.score, edits)
+        sentiment.score(typing[0])
+        row["type_ms"] = best_ms(sentiment.score, typing)
+        row["max_diff"] = max(
+            abs(sentiment.score(t)[k] - sia.polarity_scores(t)[k]) / sentiment.TOLERANCE[k]
+            for t in [draft] + edits + typing for k in sentiment.KEYS
+        )
+        rows.append(row)
+    return rows
+
+
+def run_batch(n_posts, post_words, workers):
+    posts = [" ".join(opinion_draft(post_words, seed=10_000 + i)) for i in range(n_posts)]
+    sia = get_sia()
+    start = time.perf_counter()
+    for text in posts:
+        sia.polarity_scores(text)
+    serial_s = time.perf_counter() - start
+
+    settings.CPU_EXECUTOR = "process"
+    settings.CPU_WORKERS = workers
+    cpu_executor.shutdown()
+
+    async def pooled():
+        await sentiment.score_many_async(posts[:settings.CPU_WORKERS or 64])  # spawn and warm the workers
+        start = time.perf_counter()
+        await sentiment.score_many_async(posts)
+        return time.perf_counter() - start
+
+    try:
+        pooled_s = asyncio.run(pooled())
+    finally:
+        cpu_executor.shutdown()
+    return {"posts": n_posts, "post_words": post_words, "workers": workers or None,
+            "serial_s": serial_s, "pooled_s": pooled_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", default="200,1000,5000", help="comma-separated draft sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    parser.add_argument("--posts", type=int, default=2000, help="posts in the batch run (0 skips it)")
+    parser.add_argument("--post-words", type=int, default=400, help="words per batch post")
+    parser.add_argument("--workers", type=int, default=0, help="batch worker processes (0 = one per CPU)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    rows = run([int(w) for w in args.words.split(",") if w], args.repeat)
+    batch = run_batch(args.posts, args.post_words, args.workers) if args.posts else None
+    if args.json:
+        print(json.dumps({"drafts": rows, "batch": batch}, indent=2))
+        return
+    print(f"{'words':>6} {'sentences':>9} {'vader ms':>9} {'cold ms':>8} {'repeat ms':>10} {'edit ms':>8} "
+          f"{'type ms':>8} {'max diff':>9}")
+    for r in rows:
+        print(f"{r['words']:>6} {r['sentences']:>9} {r['vader_ms']:>9.2f} {r['cold_ms']:>8.2f} {r['repeat_ms']:>10.2f} "
+              f"{r['edit_ms']:>8.2f} {r['type_ms']:>8.2f} {r['max_diff']:>8.1f}x")
+    if batch:
+        print(f"\n{batch['posts']} posts x {batch['post_words']} words: serial VADER {batch['serial_s']:.2f} s, "
+              f"score_many_async on {batch['workers'] or 'all'} workers {batch['pooled_s']:.2f} s "
+              f"({batch['serial_s'] / batch['pooled_s']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
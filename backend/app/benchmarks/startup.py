@@ -0,0 +1,82 @@
+"""
+Cold-start benchmark: import-time breakdown of the app plus warmup cost.
+
+Runs each measurement in a fresh interpreter so nothing is cached:
+
+    python -m backend.app.benchmarks.startup [--warmup sklearn,vader,...] [--top 15]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+_APP = "backend.app.app"
+
+
+def import_breakdown(module: str = f"{_APP}.main"):
+    """Parse `python -X importtime` into {module: (self_us, cumulative_us)}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr[-2000:])
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def warmup_timings(components):
+    code = (
+        "import asyncio, json, time\n"
+        f"t = time.perf_counter(); import {_APP}.main; imported = time.perf_counter() - t\n"
+        f"from {_APP}.warmup import warmup\n"
+        "t = time.perf_counter()\n"
+        f"res = asyncio.run(warmup({components!r}))\n"
+        "print(json.dumps({'import_ms': imported * 1000, 'warmup_ms': (time.perf_counter() - t) * 1000, 'components': res}))\n"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=os.environ.copy())
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr[-2000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--warmup", default="sklearn,openai,llm_cache,vader",
+                        help="comma-separated warmup components to time after import")
+    parser.add_argument("--top", type=int, default=15, help="third-party modules to list")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    times = import_breakdown()
+    app_modules = {k: v for k, v in times.items() if k.startswith(_APP)}
+    # top-level third-party packages only (cumulative time already includes children)
+    third_party = {k: v for k, v in times.items() if "." not in k and not k.startswith("backend")}
+    components = [c for c in args.warmup.split(",") if c]
+    warm = warmup_timings(components) if components else None
+
+    if args.json:
+        print(json.dumps({"app_modules": app_modules, "third_party": third_party, "warmup": warm}, indent=2))
+        return
+
+    print(f"{'module':<40} {'self ms':>9} {'cumulative ms':>14}")
+    for name, (self_us, cum_us) in sorted(app_modules.items(), key=lambda kv: -kv[1][1]):
+        print(f"{name:<40} {self_us / 1000:>9.1f} {cum_us / 1000:>14.1f}")
+    print("\nheaviest top-level imports")
+    for name, (_, cum_us) in sorted(third_party.items(), key=lambda kv: -kv[1][1])[:args.top]:
+        print(f"  {name:<38} {cum_us / 1000:>9.1f} ms")
+    if warm:
+        print(f"\nimport main: {warm['import_ms']:.1f} ms, warmup (parallel): {warm['warmup_ms']:.1f} ms")
+        for name, res in warm["components"].items():
+            status = "ok" if res["ok"] else res["error"]
+            print(f"  {name:<12} {res['ms']:>9.1f} ms  {status}")
+
+
+if __name__ == "__main__":
+    main()
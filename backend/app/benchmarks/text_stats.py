@@ -0,0 +1,143 @@
+"""
+Shared TextStats vs re-tokenizing per function, on large drafts.
+
+    python -m backend.app.benchmarks.text_stats [--words 1000,5000,20000] [--repeat 5]
+
+Each run does the local analysis one draft gets per suggestion: FK grade,
+reading ease, keyword frequency score, profile adjustment, top n-grams and
+weak sections (TF-IDF similarity is the same in every variant and left out).
+
+  legacy  the previous string implementations (copied below), no syllable cache
+  str     current functions called with the raw string (one TextStats each)
+  shared  one TextStats built up front and passed to every function
+"""
+import argparse
+import json
+import random
+import re
+import time
+from collections import Counter
+
+from backend.app.app.analysis import top_ngrams
+from backend.app.app.recommender import _weak_sections
+from backend.app.app.scoring import _frequency_score, flesch_kincaid_grade, flesch_reading_ease, user_profile_adjustment
+from backend.app.app.text_stats import TextStats, count_syllables, ngram_counts
+
+KEYWORDS = ["caching", "latency", "profiling", "python services"]
+PROFILE = {"preferred_topics": ["performance", "Python"], "reading_level": 9}
+
+
+# -- previous implementation, for comparison --
+
+def _legacy_syllables(word):
+    return count_syllables.__wrapped__(word)
+
+
+def _legacy_counts(text):
+    sentences = re.split(r'[.!?]', text)
+    words = re.findall(r'\w+', text)
+    syllables = sum(_legacy_syllables(w) for w in words)
+    return max(len([s for s in sentences if s.strip()]), 1), max(len(words), 1), syllables
+
+
+def _legacy_fk(text):
+    s, w, syl = _legacy_counts(text)
+    return 0.39 * (w / s) + 11.8 * (syl / w) - 15.59
+
+
+def _legacy_fre(text):
+    s, w, syl = _legacy_counts(text)
+    return 206.835 - 1.015 * (w / s) - 84.6 * (syl / w)
+
+
+def legacy_pipeline(text):
+    grade = _legacy_fk(text)
+    ease = _legacy_fre(text)
+    counts = Counter(re.findall(r'\w+', text.lower()))
+    freq = min(sum(counts[k.lower()] for k in KEYWORDS) / (len(text.split()) + 1), 1.0)
+    hits = sum(1 for t in PROFILE["preferred_topics"] if t.lower() in text.lower())
+    adjusted_grade = _legacy_fk(text)  # user_profile_adjustment recomputed it
+    ngrams = [w for w, _ in ngram_counts(text).most_common(50)]
+    weak, idx = [], 0
+    for s in [s.strip() for s in text.split('.') if s.strip()]:
+        start = text.find(s, idx)
+        idx = start + len(s)
+        if len(s.split()) > 20 and _legacy_fre(s) < 50:
+            weak.append((start, idx))
+    return grade, ease, freq, hits, adjusted_grade, ngrams, weak
+
+
+def str_pipeline(text):
+    return (
+        flesch_kincaid_grade(text), flesch_reading_ease(text), _frequency_score(text, KEYWORDS),
+        user_profile_adjustment(50.0, text, PROFILE), top_ngrams(text, 50), _weak_sections(text),
+    )
+
+
+def shared_pipeline(text):
+    stats = TextStats(text)
+    grade = flesch_kincaid_grade(stats)
+    return (
+        grade, flesch_reading_ease(stats), _frequency_score(stats, KEYWORDS),
+        user_profile_adjustment(50.0, stats, PROFILE, grade), top_ngrams(stats, 50), _weak_sections(stats),
+    )
+
+
+def synthetic_draft(n_words, seed=0):
+    vocab = ("python services caching latency profiling throughput memory queue database index "
+             "readers understand performance budgets carefully measured improvements consistently "
+             "a the of and to in is it").split()
+    rng = random.Random(seed)
+    words, out = [rng.choice(vocab) for _ in range(n_words)], []
+    i = 0
+    while i < n_words:
+        n = rng.randint(5, 35)
+        out.append(" ".join(words[i:i + n]).capitalize() + rng.choice([".", ".", ".", "!", "?"]))
+        i += n
+    return " ".join(out)
+
+
+def best_ms(fn, text, repeat, before=None):
+    best = float("inf")
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(sizes, repeat):
+    rows = []
+    for n in sizes:
+        text = synthetic_draft(n)
+        rows.append({
+            "words": n,
+            "legacy_ms": best_ms(legacy_pipeline, text, repeat),
+            "str_ms": best_ms(str_pipeline, text, repeat),
+            "shared_cold_ms": best_ms(shared_pipeline, text, repeat, before=count_syllables.cache_clear),
+            "shared_ms": best_ms(shared_pipeline, text, repeat),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", default="1000,5000,20000", help="comma-separated draft sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    rows = run([int(w) for w in args.words.split(",") if w], args.repeat)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'words':>7} {'legacy ms':>10} {'str ms':>10} {'shared cold':>12} {'shared ms':>10} {'speedup':>8}")
+    for r in rows:
+        print(f"{r['words']:>7} {r['legacy_ms']:>10.2f} {r['str_ms']:>10.2f} {r['shared_cold_ms']:>12.2f} "
+              f"{r['shared_ms']:>10.2f} {r['legacy_ms'] / r['shared_ms']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import pytest
+
+from backend.app.app import llm, recommender, resilience
+from backend.app.app.config import settings
+
+
+@pytest.fixture
+def uncached_llm(monkeypatch):
+    """No LLM response cache and a fresh circuit breaker: every call reaches the (stubbed) LLM."""
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm, "llm_cache", None)
+    monkeypatch.setattr(resilience, "_breaker", None)
+
+
+@pytest.fixture
+def llm_unavailable(uncached_llm, monkeypatch):
+    """Every recommender LLM call fails, so suggestions come from the local fallback."""
+    async def unavailable(*args, **kwargs):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(recommender, "llm_recommend", unavailable)
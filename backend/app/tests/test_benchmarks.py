@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+from openai import AsyncOpenAI, InternalServerError
+
+from backend.app.app.llm import _usage_dict
+from backend.app.benchmarks.compare import compare
+from backend.app.benchmarks.fake_openai_server import BackgroundServer, Latency, Replies
+from backend.app.benchmarks.harness import ProcessMeter, envelope, percentiles
+
+
+def test_percentiles_are_nearest_rank():
+    p = percentiles([float(i) for i in range(1, 101)])
+    assert (p["p50"], p["p90"], p["p99"], p["max"], p["mean"]) == (50, 90, 99, 100, 50.5)
+    assert percentiles([7.0])["p99"] == 7 and percentiles([])["p50"] is None
+
+
+def test_latency_specs():
+    assert Latency("fixed:12").sample_ms() == 12
+    samples = [Latency("uniform:5:10", seed=1).sample_ms() for _ in range(50)]
+    assert all(5 <= s <= 10 for s in samples)
+    assert min(Latency("pareto:20:1.5", seed=1).sample_ms() for _ in range(50)) >= 20
+    for bad in ("gamma:1:2", "fixed", "uniform:1"):
+        with pytest.raises(ValueError):
+            Latency(bad)
+
+
+def test_canned_replies_match_then_rotate():
+    replies = Replies([{"match": "Analyze", "content": {"topics": ["x"]}}, {"a": 1}, "plain"])
+    assert json.loads(replies.content("Analyze this")) == {"topics": ["x"]}
+    assert [replies.content("other") for _ in range(3)] == ['{"a": 1}', "plain", '{"a": 1}']
+
+
+def test_fake_server_speaks_the_openai_protocol():
+    async def go(base_url):
+        client = AsyncOpenAI(base_url=base_url, api_key="x", max_retries=0)
+        plain = await client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+        stream = await client.chat.completions.create(
+            model="m", messages=[{"role": "user", "content": "hi"}], stream=True,
+            extra_body={"stream_options": {"include_usage": True}},
+        )
+        parts, usage = [], None
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage  # an extra field in this openai version
+            parts.extend(c.delta.content or "" for c in chunk.choices)
+        await client.close()
+        return plain, "".join(parts), usage
+
+    with BackgroundServer(replies=Replies([{"suggestions": []}]), chunk_chars=4) as server:
+        plain, streamed, usage = asyncio.run(go(server.base_url))
+        assert plain.choices[0].message.content == streamed == '{"suggestions": []}'
+        assert _usage_dict(usage) == _usage_dict(plain.usage) and plain.usage.total_tokens > 0
+        assert server.counters["requests"] == 2 and server.counters["streams"] == 1
+
+    with BackgroundServer(error_rate=1.0) as server:
+        with pytest.raises(InternalServerError):
+            asyncio.run(go(server.base_url))
+
+
+def test_compare_flags_regressions_by_direction():
+    base = envelope("load", {}, [{"scenario": "recommend", "concurrency": 8, "rps": 100.0,
+                                  "latency_ms": {"p50": 10.0, "p99": 50.0}}])
+    new = envelope("load", {}, [{"scenario": "recommend", "concurrency": 8, "rps": 85.0,
+                                 "latency_ms": {"p50": 10.5, "p99": 40.0}}])
+    flagged = {r["metric"]: r["regression"] for r in compare(base, new, threshold_pct=10)}
+    assert flagged == {"rps": True, "latency_ms.p50": False, "latency_ms.p99": False}
+    with pytest.raises(ValueError):
+        compare(base, envelope("micro", {}, []), 10)
+
+
+def test_process_meter_counts_cpu():
+    meter = ProcessMeter().start()
+    sum(i * i for i in range(2_000_000))
+    usage = meter.stop()
+    assert usage["cpu_s"] > 0 and usage["peak_rss_mb"] > 0
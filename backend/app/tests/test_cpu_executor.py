@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from backend.app.app import cpu_executor
+from backend.app.app.scoring import flesch_kincaid_grade
+
+TEXTS = [f"Sentence number {i} is here. Another one follows it!" * (i + 1) for i in range(7)]
+
+
+@pytest.fixture(params=["inline", "thread", "process"])
+def executor_mode(request, monkeypatch):
+    monkeypatch.setattr(cpu_executor.settings, "CPU_EXECUTOR", request.param)
+    monkeypatch.setattr(cpu_executor.settings, "CPU_WORKERS", 2)
+    cpu_executor.shutdown()
+    yield request.param
+    cpu_executor.shutdown()
+
+
+def test_map_cpu_keeps_order_and_records_timings(executor_mode):
+    results = asyncio.run(cpu_executor.map_cpu(flesch_kincaid_grade, [(t,) for t in TEXTS], chunk_size=3))
+    assert results == [flesch_kincaid_grade(t) for t in TEXTS]
+
+    timings = cpu_executor.stats()["flesch_kincaid_grade"]
+    assert timings["exec_ms"]["count"] >= 3  # 7 items in chunks of 3
+    assert timings["queue_ms"]["count"] == timings["exec_ms"]["count"]
+
+
+def test_blog_score_async_matches_sync(executor_mode):
+    from backend.app.app.scoring import blog_score
+    from backend.app.app.tfidf_model import CorpusTfidf
+
+    tfidf = CorpusTfidf().partial_fit(TEXTS)
+    expected = blog_score(TEXTS[2], ["sentence", "number"], {}, tfidf)
+    assert asyncio.run(cpu_executor.blog_score_async(TEXTS[2], ["sentence", "number"], {}, tfidf)) == expected
@@ -0,0 +1,43 @@
+import random
+from backend.app.app.draft_state import DraftState
+from backend.app.app.analysis import top_ngrams
+from backend.app.app.recommender import _weak_sections
+from backend.app.app.scoring import flesch_kincaid_grade, flesch_reading_ease
+
+VOCAB = (
+    "the cat sat on mat. extraordinary complicated institutional considerations! "
+    "data data science? ai machine learning . .. models writers"
+).split(" ") + [" ", ". ", "\n"]
+
+
+def assert_matches_full_recompute(state, text):
+    assert state.text == text
+    assert state.flesch_kincaid_grade() == flesch_kincaid_grade(text)
+    assert state.flesch_reading_ease() == flesch_reading_ease(text)
+    assert state.weak_sections() == _weak_sections(text)
+    for k in (5, 50):
+        assert state.top_ngrams(k) == top_ngrams(text, k)
+
+
+def test_random_edits_match_full_recompute():
+    rng = random.Random(7)
+    state, text = DraftState(), ""
+    for _ in range(400):
+        offset = rng.randint(0, len(text))
+        deleted = rng.randint(0, min(15, len(text) - offset)) if rng.random() < 0.4 else 0
+        inserted = " ".join(rng.choices(VOCAB, k=rng.randint(0, 25)))
+        state.apply_edit(offset, deleted, inserted)
+        text = text[:offset] + inserted + text[offset + deleted:]
+        assert_matches_full_recompute(state, text)
+
+
+def test_set_text_diffs_against_previous_draft():
+    long_sentence = " ".join(["institutional considerations"] * 15)
+    state = DraftState(f"Intro line. {long_sentence}. Outro")
+    text = f"Intro line. {long_sentence}. Outro about data science."
+    state.set_text(text)
+    assert_matches_full_recompute(state, text)
+    assert state.weak_sections()[0]["reason"] == "Hard to read (long/complex)"
+
+    state.set_text("")
+    assert_matches_full_recompute(state, "")
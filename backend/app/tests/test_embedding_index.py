@@ -0,0 +1,42 @@
+import numpy as np
+from backend.app.app.embedding_index import EmbeddingIndex
+
+
+def _data(n=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vecs = rng.normal(size=(n, dim)).astype(np.float32)
+    return [f"post-{i}" for i in range(n)], vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def test_exact_search_matches_brute_force(tmp_path):
+    ids, vecs = _data()
+    index = EmbeddingIndex(str(tmp_path), dim=32)
+    index.append(ids[:1500], vecs[:1500])
+    index.append(ids[1500:], vecs[1500:])
+
+    query = vecs[7] + 0.1 * vecs[8]
+    expected = np.argsort(-(vecs @ (query / np.linalg.norm(query))))[:5]
+    assert [i for i, _ in index.search(query, k=5)] == [ids[i] for i in expected]
+
+
+def test_reopen_and_int8(tmp_path):
+    ids, vecs = _data(dim=16)
+    EmbeddingIndex(str(tmp_path), dim=16, dtype="int8").append(ids, vecs)
+
+    reopened = EmbeddingIndex(str(tmp_path))
+    assert len(reopened) == len(ids) and reopened.dtype == "int8"
+    top_id, score = reopened.search(vecs[42], k=1)[0]
+    assert top_id == "post-42" and abs(score - 1.0) < 0.02
+    assert reopened.memory_footprint()["mapped_bytes"] == len(ids) * (16 + 4)
+
+
+def test_ivf_full_probe_is_exact_and_sees_new_rows(tmp_path):
+    ids, vecs = _data()
+    index = EmbeddingIndex(str(tmp_path), dim=32)
+    index.append(ids[:1800], vecs[:1800])
+    index.build_ivf(n_lists=16)
+    index.append(ids[1800:], vecs[1800:])
+
+    query = vecs[1900]
+    assert index.search(query, k=10, nprobe=16) == index.search(query, k=10)
+    assert index.search(query, k=1, nprobe=2)[0][0] == "post-1900"
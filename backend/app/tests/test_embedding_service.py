@@ -0,0 +1,51 @@
+import asyncio
+import numpy as np
+from backend.app.app.embedding_service import EmbeddingBatcher
+
+
+def fake_encode(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), ord(t[0])] for t in texts], dtype=np.float32)
+    return encode
+
+
+def test_concurrent_callers_share_one_batch_and_cache():
+    calls = []
+    batcher = EmbeddingBatcher(fake_encode(calls), max_batch=100, max_wait_ms=20)
+
+    async def scenario():
+        first = await asyncio.gather(
+            batcher.embed(["alpha", "beta"]), batcher.embed(["beta", "gamma"]), batcher.embed(["delta"])
+        )
+        again = await batcher.embed(["gamma", "alpha"])
+        return first, again
+
+    (a, b, c), again = asyncio.run(scenario())
+    assert calls == [["alpha", "beta", "gamma", "delta"]]
+    assert a.tolist() == [[5, ord("a")], [4, ord("b")]]
+    assert b.tolist() == [[4, ord("b")], [5, ord("g")]]
+    assert c.tolist() == [[5, ord("d")]]
+    assert again.tolist() == [[5, ord("g")], [5, ord("a")]]
+    assert batcher.stats()["batch_size"]["count"] == 1
+    assert batcher.stats()["queue_wait_ms"]["count"] == 3
+
+
+def test_full_batch_flushes_without_waiting_and_errors_propagate():
+    calls = []
+    batcher = EmbeddingBatcher(fake_encode(calls), max_batch=2, max_wait_ms=10_000)
+
+    async def scenario():
+        return await asyncio.wait_for(batcher.embed(["one", "two", "three"]), timeout=1)
+
+    assert len(asyncio.run(scenario())) == 3
+
+    def broken(texts):
+        raise RuntimeError("model down")
+
+    failing = EmbeddingBatcher(broken, max_wait_ms=1)
+    try:
+        asyncio.run(failing.embed(["x"]))
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
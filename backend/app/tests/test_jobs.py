@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app.app import jobs
+from backend.app.app.jobs import JobInputError, JobManager, iter_json_posts, iter_ndjson_posts
+from backend.app.app.main import app
+from backend.app.app.security import verify_api_key
+
+POSTS = [f"Post number {i} about caching, latency and résumé writing." for i in range(23)]
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def collect(parser, data, size):
+    async def go():
+        return [p async for p in parser(chunked(data, size))]
+    return asyncio.run(go())
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_upload_parsers(size):
+    array = json.dumps(POSTS).encode("utf-8")
+    wrapped = json.dumps({"posts": [{"text": p} for p in POSTS]}, ensure_ascii=False).encode("utf-8")
+    ndjson = "\n".join(json.dumps(p, ensure_ascii=False) for p in POSTS).encode("utf-8")
+    assert collect(iter_json_posts, array, size) == POSTS
+    assert collect(iter_json_posts, wrapped, size) == POSTS
+    assert collect(iter_ndjson_posts, ndjson, size) == POSTS
+
+
+@pytest.mark.parametrize("bad", [b'{"other": []}', b'["ok", 42]', b'["unterminated"', b'not json'])
+def test_malformed_uploads_are_rejected(bad):
+    with pytest.raises(JobInputError):
+        collect(iter_json_posts, bad, 3)
+
+
+def fake_analyze(calls, block_after=None, gate=None):
+    async def analyze_posts(posts):
+        calls.append(list(posts))
+        if block_after is not None and len(calls) > block_after:
+            await gate.wait()
+        usage = {"prompt_tokens": len(posts), "completion_tokens": 1, "total_tokens": len(posts) + 1}
+        return {
+            "results": [{"sentiment": None, "topics": [p[:11]], "initial_keywords": [], "token_usage": {}}
+                        for p in posts],
+            "token_usage": usage,
+        }
+    return analyze_posts
+
+
+async def list_posts(items):
+    for item in items:
+        yield item
+
+
+def read_results(manager, state, cursor=0, limit=1000):
+    return [json.loads(line) for line in manager.results(state, cursor, limit)]
+
+
+def test_job_runs_in_chunks_and_pages_results(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(jobs, "analyze_posts", fake_analyze(calls))
+    manager = JobManager(str(tmp_path), workers=1, chunk_size=5)
+
+    async def go():
+        job = await manager.create("key-a", list_posts(POSTS))
+        await manager._queue.join()
+        await manager.stop()
+        return job
+
+    job = asyncio.run(go())
+    assert [len(c) for c in calls] == [5, 5, 5, 5, 3]
+    state = manager.get(job["id"], "key-a")
+    assert state["status"] == "done" and state["done"] == 23
+    assert state["token_usage"]["total_tokens"] == 23 + 5
+    assert manager.get(job["id"], "key-b") is None  # other tenants can't see it
+    assert "key-a" not in (tmp_path / job["id"] / "state.json").read_text()
+
+    assert [r["index"] for r in read_results(manager, state)] == list(range(23))
+    page = read_results(manager, state, cursor=7, limit=6)
+    assert [r["index"] for r in page] == list(range(7, 13))
+    assert page[0]["topics"] == ["Post number"]
+    assert read_results(manager, state, cursor=23) == []
+
+
+def test_job_file_io_stays_off_the_event_loop(tmp_path, monkeypatch):
+    calls, on_loop = [], []
+    monkeypatch.setattr(jobs, "analyze_posts", fake_analyze(calls))
+    monkeypatch.setattr(jobs, "_UPLOAD_BUFFER", 64)  # several upload writes
+    loop_thread = threading.main_thread()
+    real_fsync, real_read_chunk = os.fsync, JobManager._read_chunk
+
+    def fsync(fd):
+        on_loop.append(threading.current_thread() is loop_thread)
+        real_fsync(fd)
+
+    def read_chunk(src, size):
+        on_loop.append(threading.current_thread() is loop_thread)
+        return real_read_chunk(src, size)
+
+    monkeypatch.setattr(jobs.os, "fsync", fsync)
+    monkeypatch.setattr(JobManager, "_read_chunk", staticmethod(read_chunk))
+    manager = JobManager(str(tmp_path), workers=1, chunk_size=5)
+
+    async def go():
+        job = await manager.create("key-a", list_posts(POSTS))
+        await manager._queue.join()
+        await manager.stop()
+        return job
+
+    job = asyncio.run(go())
+    assert on_loop and not any(on_loop)
+    assert manager.get(job["id"], "key-a")["status"] == "done"
+    lines = (tmp_path / job["id"] / "input.ndjson").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == POSTS
+
+
+def test_job_resumes_from_checkpoint_after_restart(tmp_path, monkeypatch):
+    calls = []
+
+    async def crash():
+        gate = asyncio.Event()
+        monkeypatch.setattr(jobs, "analyze_posts", fake_analyze(calls, block_after=2, gate=gate))
+        manager = JobManager(str(tmp_path), workers=1, chunk_size=5)
+        job = await manager.create("key-a", list_posts(POSTS))
+        while len(calls) < 3:
+            await asyncio.sleep(0.01)
+        await manager.stop()  # "crash" while the third chunk is in flight
+        return job
+
+    job = asyncio.run(crash())
+    state = JobManager(str(tmp_path)).get(job["id"], "key-a")
+    assert state["status"] == "running" and state["done"] == 10
+    with open(tmp_path / job["id"] / "results.ndjson", "ab") as f:
+        f.write(b'{"index": 10, "partial')  # torn write past the checkpoint
+
+    calls.clear()
+
+    async def restart():
+        monkeypatch.setattr(jobs, "analyze_posts", fake_analyze(calls))
+        manager = JobManager(str(tmp_path), workers=1, chunk_size=5)
+        manager.start()
+        await manager._queue.join()
+        await manager.stop()
+        return manager
+
+    manager = asyncio.run(restart())
+    assert calls[0][0] == POSTS[10]
+    state = manager.get(job["id"], "key-a")
+    assert state["status"] == "done"
+    assert [r["index"] for r in read_results(manager, state)] == list(range(23))
+
+
+def test_job_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "analyze_posts", fake_analyze([]))
+    monkeypatch.setattr(jobs, "_manager", JobManager(str(tmp_path), workers=2, chunk_size=4))
+    app.dependency_overrides[verify_api_key] = lambda: "key-a"
+    try:
+        with TestClient(app) as client:
+            body = "\n".join(json.dumps(p) for p in POSTS)
+            resp = client.post("/api/jobs/analyze-blogs", content=body,
+                               headers={"Content-Type": "application/x-ndjson"})
+            assert resp.status_code == 202
+            job_id = resp.json()["id"]
+
+            for _ in range(200):
+                status = client.get(f"/api/jobs/{job_id}").json()
+                if status["status"] == "done":
+                    break
+                time.sleep(0.01)
+            assert status["done"] == 23
+
+            resp = client.get(f"/api/jobs/{job_id}/results", params={"cursor": 20, "limit": 10})
+            assert resp.headers["X-Next-Cursor"] == "23" and resp.headers["X-Job-Status"] == "done"
+            assert [json.loads(line)["index"] for line in resp.text.splitlines()] == [20, 21, 22]
+
+            assert client.post("/api/jobs/analyze-blogs", content=b"[1, 2]").status_code == 400
+            assert client.delete(f"/api/jobs/{job_id}").status_code == 200
+            assert client.get(f"/api/jobs/{job_id}").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_processes_sharing_job_dir_never_run_the_same_job(tmp_path, monkeypatch):
+    calls = []
+
+    async def go():
+        gate = asyncio.Event()
+        monkeypatch.setattr(jobs, "analyze_posts", fake_analyze(calls, block_after=1, gate=gate))
+        first = JobManager(str(tmp_path), workers=1, chunk_size=5)
+        job = await first.create("key-a", list_posts(POSTS))
+        while len(calls) < 2:
+            await asyncio.sleep(0.01)
+
+        # Another process starting on the same directory requeues the job but skips it: it is locked
+        second = JobManager(str(tmp_path), workers=1, chunk_size=5)
+        second.start()
+        await second._queue.join()
+        assert len(calls) == 2 and job["id"] not in second.running
+
+        # Deleting through the other process cancels the runner at its next chunk boundary
+        assert second.delete(job["id"], "key-a")
+        assert second.get(job["id"], "key-a") is None and (tmp_path / job["id"]).is_dir()
+        gate.set()
+        await first._queue.join()
+        await first.stop()
+        await second.stop()
+        return job
+
+    job = asyncio.run(go())
+    assert len(calls) == 2
+    assert not (tmp_path / job["id"]).exists() and not (tmp_path / f"{job['id']}.lock").exists()
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from openai import APITimeoutError
+
+from backend.app.app import llm, llm_backends
+from backend.app.app.config import settings
+from backend.app.app.llm_backends import Backend, choose, parse_backends, track
+from backend.app.benchmarks.fake_openai_server import BackgroundServer
+
+
+@pytest.fixture(autouse=True)
+def fresh_backends(monkeypatch):
+    monkeypatch.setattr(llm_backends, "_backends", None)
+    monkeypatch.setattr(llm_backends, "_http", None)
+    monkeypatch.setattr(llm_backends, "_http_sync", None)
+    monkeypatch.setattr(llm, "llm_cache", None)
+    monkeypatch.setattr(llm, "async_client", None)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_ROUTE_MIN_SAMPLES", 3)
+
+
+def use(monkeypatch, *items):
+    monkeypatch.setattr(settings, "LLM_BACKENDS", list(items))
+    return {b.name: b for b in llm_backends.get_backends()}
+
+
+def feed(backend: Backend, ms: float, n: int = 5, outcome: str = "ok"):
+    for _ in range(n):
+        backend.record(ms, outcome)
+
+
+def test_default_backend_follows_llm_model(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MODEL", "gpt-x")
+    [backend] = llm_backends.get_backends()
+    assert (backend.name, backend.model, backend.api_key) == ("openai", "gpt-x", settings.OPENAI_API_KEY)
+
+
+def test_parse_rejects_bad_entries():
+    with pytest.raises(ValueError):
+        parse_backends([{"name": "a", "modle": "x"}])
+    with pytest.raises(ValueError):
+        parse_backends([{"model": "x"}])
+    with pytest.raises(ValueError):
+        parse_backends([{"name": "a"}, {"name": "a"}])
+
+
+def test_interactive_goes_fastest_and_bulk_cheapest(monkeypatch):
+    b = use(monkeypatch, {"name": "remote", "cost": 1.0}, {"name": "local", "cost": 0.0},
+            {"name": "turbo", "cost": 2.0})
+    feed(b["remote"], 400)
+    feed(b["local"], 900)
+    feed(b["turbo"], 150)
+    assert choose("recommend").name == choose("stream").name == "turbo"
+    assert choose("analyze").name == "local"
+
+    feed(b["turbo"], 0, n=10, outcome="error")  # fast failures don't make it look healthy
+    assert choose("recommend").name == "remote"
+    feed(b["local"], 0, n=10, outcome="error")
+    assert choose("analyze").name == "remote"
+
+    feed(b["remote"], 0, n=30, outcome="error")  # everything failing: the least bad one
+    assert choose("recommend").name == "local"
+
+
+def test_unmeasured_backend_is_probed_once_at_a_time(monkeypatch):
+    b = use(monkeypatch, {"name": "known"}, {"name": "new"})
+    feed(b["known"], 300)
+    assert choose("recommend").name == "new"
+    with track(b["new"]):
+        assert choose("recommend").name == "known"  # its probe is still out
+    assert b["new"].window()["calls"] == 1 and choose("recommend").name == "new"  # measured at ~0 ms
+
+
+def test_window_forgets_old_calls(monkeypatch):
+    b = use(monkeypatch, {"name": "a"}, {"name": "b"})
+    feed(b["a"], 100, outcome="error")
+    feed(b["b"], 500)
+    assert choose("recommend").name == "b"
+    monkeypatch.setattr(settings, "LLM_ROUTE_WINDOW_S", 0.0)
+    assert b["a"].window() == {"calls": 0, "error_rate": 0.0, "p50_ms": None, "p90_ms": None}
+    assert b["a"].counts["error"] == 5  # lifetime counters stay
+
+
+def test_track_outcomes():
+    backend = Backend("x")
+    with pytest.raises(APITimeoutError):
+        with track(backend):
+            raise APITimeoutError(request=None)
+    with pytest.raises(ValueError):
+        with track(backend):
+            raise ValueError("bad request")  # the backend answered
+    with pytest.raises(asyncio.CancelledError):
+        with track(backend):
+            raise asyncio.CancelledError()
+    assert backend.counts == {"ok": 1, "error": 1, "cancelled": 1} and backend.inflight == 0
+
+
+def test_calls_route_over_http_with_per_kind_timeouts(monkeypatch):
+    with BackgroundServer(latency="fixed:1") as fast, BackgroundServer(latency="fixed:60") as cheap:
+        b = use(monkeypatch, {"name": "fast", "base_url": fast.base_url, "model": "fast-model", "cost": 1},
+                {"name": "cheap", "base_url": cheap.base_url, "model": "cheap-model", "cost": 0})
+        monkeypatch.setattr(settings, "LLM_TIMEOUTS", {"recommend": 5.0, "stream": 5.0, "analyze": 0.03})
+
+        async def go():
+            try:
+                for _ in range(4):
+                    await llm._acomplete("Suggest a keyword", 0.6)
+                with pytest.raises(APITimeoutError):
+                    await llm._acomplete("Analyze this", 0.4, kind="analyze")
+            finally:
+                await llm_backends.aclose()
+
+        asyncio.run(go())
+        # One probe to each backend, then the fast one; the analyze call went to the cheap one and timed out
+        assert fast.counters["requests"] == 3 and cheap.counters["requests"] == 2
+        assert b["fast"].counts["ok"] == 3 and b["cheap"].counts == {"ok": 1, "error": 1, "cancelled": 0}
+        assert b["fast"].window()["p50_ms"] < b["cheap"].window()["p50_ms"]
+        assert set(llm_backends.stats()) == {"fast", "cheap"}
+
+
+def test_stream_latency_excludes_the_consumer(monkeypatch):
+    with BackgroundServer(latency="fixed:1") as server:
+        b = use(monkeypatch, {"name": "fast", "base_url": server.base_url})
+
+        async def go():
+            try:
+                async for _ in llm._astream("Suggest a keyword", 0.6):
+                    await asyncio.sleep(0.02)  # a slow reader
+            finally:
+                await llm_backends.aclose()
+
+        asyncio.run(go())
+        assert b["fast"].counts["ok"] == 1 and b["fast"].inflight == 0
+        assert b["fast"].window()["p50_ms"] < 100
+
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import types
+import pytest
+from backend.app.app import llm
+from backend.app.app.llm_batch import analyze_blogs_packed_async, pack_posts, split_usage
+
+
+class FakeCompletions:
+    """Answers packed prompts for every post except the one containing 'garbled'."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def create(self, model, messages, temperature, **kwargs):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        if "### Post" in prompt:
+            posts = prompt.split("### Post ")[1:]
+            results = {
+                p.split("\n", 1)[0]: {"topics": ["t"], "sentiment": "neutral", "keywords": [p.split("\n")[1].strip()]}
+                for p in posts if "garbled" not in p
+            }
+            content = json.dumps({"results": results})
+        else:
+            content = json.dumps({"topics": ["single"], "sentiment": "neutral", "keywords": ["single"]})
+        usage = types.SimpleNamespace(prompt_tokens=90, completion_tokens=10, total_tokens=100)
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(llm.settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm, "llm_cache", None)
+    monkeypatch.setattr(llm, "async_client", types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions)))
+    return completions
+
+
+def test_pack_posts_respects_budget_and_order():
+    posts = ["alpha " * 100, "beta " * 100, "gamma " * 100, "delta " * 500, "eps " * 10]
+    assert pack_posts(posts, token_budget=250, max_posts=10) == [[0, 1], [2], [3], [4]]
+    assert pack_posts(posts, token_budget=10_000, max_posts=2) == [[0, 1], [2, 3], [4]]
+
+
+def test_split_usage_is_proportional_and_exact():
+    shares = split_usage({"prompt_tokens": 100, "completion_tokens": 7, "total_tokens": 107}, [1, 1, 2])
+    assert [s["prompt_tokens"] for s in shares] == [25, 25, 50]
+    assert sum(s["completion_tokens"] for s in shares) == 7
+
+
+def test_packed_analysis_with_single_post_fallback(fake_llm):
+    posts = ["first post", "garbled post", "third post"]
+    results = asyncio.run(analyze_blogs_packed_async(posts))
+
+    assert [r["analysis"]["keywords"] for r in results] == [["first post"], ["single"], ["third post"]]
+    assert len(fake_llm.prompts) == 2  # one pack + one fallback
+    assert results[0]["token_usage"]["packed"] is True
+    # every spent token is attributed to some post
+    assert sum(r["token_usage"]["total_tokens"] for r in results) == 200
+
+
+def test_fallbacks_share_the_concurrency_limit(fake_llm, monkeypatch):
+    monkeypatch.setattr(llm.settings, "LLM_MAX_CONCURRENCY", 3)
+    create, in_flight, peak = fake_llm.create, [0], [0]
+
+    async def slow_create(*args, **kwargs):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return await create(*args, **kwargs)
+
+    monkeypatch.setattr(fake_llm, "create", slow_create)
+    # Every pack comes back garbled: 6 packs of 4, then 24 single-post fallbacks
+    posts = [f"garbled post {i}" for i in range(24)]
+    results = asyncio.run(analyze_blogs_packed_async(posts, max_posts=4))
+
+    assert [r["analysis"]["keywords"] for r in results] == [["single"]] * 24
+    assert len(fake_llm.prompts) == 30
+    assert peak[0] == 3
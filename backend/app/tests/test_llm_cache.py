@@ -0,0 +1,72 @@
+from backend.app.app.llm_cache import LLMCache, make_key
+
+
+def test_key_depends_on_all_inputs():
+    base = make_key("gpt-4o-mini", "prompt", 0.4, {"reading_level": "general"})
+    assert base == make_key("gpt-4o-mini", "prompt", 0.4, {"reading_level": "general"})
+    assert base != make_key("gpt-4o-mini", "prompt", 0.6, {"reading_level": "general"})
+    assert base != make_key("gpt-4o-mini", "prompt", 0.4, {"reading_level": "advanced"})
+
+
+def test_hit_miss_and_saved_tokens(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"), memory_entries=1)
+    key = make_key("m", "p", 0.1)
+    assert cache.get(key) is None
+
+    cache.set(key, {"content": "x", "usage": {"total_tokens": 42}})
+    cache.set(make_key("m", "other", 0.1), {"content": "y", "usage": {"total_tokens": 1}})
+
+    # evicted from the memory tier, still served from disk
+    assert cache.get(key)["content"] == "x"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["saved_tokens"] == 42
+
+
+def test_disk_tier_shared_between_instances(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    LLMCache(path).set("k", {"content": "x", "usage": {}})
+    assert LLMCache(path).get("k")["content"] == "x"
+
+
+def test_ttl_expiry(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"), ttl_s=-1)
+    cache.set("k", {"content": "x", "usage": {}})
+    assert cache.get("k") is None
+
+
+def test_async_disk_access_runs_off_the_loop_thread(tmp_path):
+    import asyncio
+    import threading
+
+    path = str(tmp_path / "c.sqlite3")
+    LLMCache(path).set("k", {"content": "x", "usage": {"total_tokens": 3}})
+    cache = LLMCache(path)
+    threads = []
+    disk_entry = cache._disk_entry
+    cache._disk_entry = lambda *a: threads.append(threading.get_ident()) or disk_entry(*a)
+
+    async def run():
+        assert (await cache.aget("k"))["content"] == "x"
+        assert (await cache.aget("k"))["content"] == "x"  # memory tier, no thread
+        assert await cache.aget("missing") is None
+        await cache.aset("k2", {"content": "y", "usage": {}})
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 2 and loop_thread not in threads
+    assert cache.stats() == {"hits": 2, "misses": 1, "saved_tokens": 6, "memory_entries": 2}
+    assert LLMCache(path).get("k2")["content"] == "y"
+
+
+def test_disk_hits_refresh_last_access_with_the_next_write(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    writer = LLMCache(path)
+    writer.set("k", {"content": "x", "usage": {}})
+    cache = LLMCache(path)
+    cache.get("k")
+    conn = cache._conn()
+    before = conn.execute("SELECT last_access FROM completions WHERE key = 'k'").fetchone()[0]
+    assert before == conn.execute("SELECT created FROM completions WHERE key = 'k'").fetchone()[0]
+    cache.set("other", {"content": "y", "usage": {}})
+    assert conn.execute("SELECT last_access FROM completions WHERE key = 'k'").fetchone()[0] > before
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app.app import cpu_executor, llm, metrics
+from backend.app.app.config import settings
+from backend.app.app.scoring import blog_score
+from backend.app.benchmarks.fake_llm import FakeAsyncLLM
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(metrics, "enabled", True)
+    yield
+    metrics.reset()
+
+
+def stage_count(name):
+    hist = metrics._spans.get(name)
+    return hist.count if hist else 0
+
+
+def test_disabled_spans_are_noops(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    with metrics.span("stage.a"):
+        pass
+    blog_score("Some text here. More text.", ["text"], {})
+    metrics.inc("blog_test_total")
+    assert metrics._spans == {}
+    assert "blog_test_total" not in metrics.render_prometheus()
+
+
+def test_spans_nest_and_collect_for_server_timing():
+    @metrics.timed("stage.async")
+    async def work():
+        with metrics.span("stage.inner"):
+            await asyncio.sleep(0.001)
+
+    with metrics.collect() as spans:
+        asyncio.run(work())
+        asyncio.run(work())
+    assert [name for name, _ in spans] == ["stage.inner", "stage.async"] * 2
+    header = metrics.server_timing(spans)
+    assert header.startswith("stage.inner;dur=") and ", stage.async;dur=" in header
+    assert stage_count("stage.async") == 2
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread"])
+def test_worker_spans_are_recorded_once(monkeypatch, mode):
+    monkeypatch.setattr(settings, "CPU_EXECUTOR", mode)
+    cpu_executor.shutdown()
+    try:
+        with metrics.collect() as spans:
+            asyncio.run(cpu_executor.blog_score_async("Short text. Another sentence here.", ["text"], {}))
+    finally:
+        cpu_executor.shutdown()
+    assert stage_count("score.blog_score") == 1
+    assert stage_count("score.readability") == 1
+    assert {"score.blog_score", "score.keyword_relevance"} <= {name for name, _ in spans}
+
+
+def test_prometheus_export_includes_stages_tokens_and_retries(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm, "llm_cache", None)
+    monkeypatch.setattr(llm, "async_client", FakeAsyncLLM())
+    asyncio.run(llm.analyze_blog_with_llm_async("A post about caching."))
+
+    from backend.app.app.main import app
+    text = TestClient(app).get("/metrics").text
+    assert '# TYPE blog_stage_duration_seconds histogram' in text
+    assert 'blog_stage_duration_seconds_count{stage="llm.request"} 1' in text
+    assert 'blog_stage_duration_seconds_bucket{stage="llm.request",le="+Inf"} 1' in text
+    assert 'blog_llm_tokens_total{kind="prompt"}' in text
+    assert "blog_llm_retries_total" in text
+    assert "blog_llm_breaker_state" in text
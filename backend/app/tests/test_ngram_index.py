@@ -0,0 +1,191 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+
+from backend.app.app import embeddings, pattern_store, recommender
+from backend.app.app.config import settings
+from backend.app.app.ngram_index import NgramIndex
+from backend.app.app.pattern_store import PatternStore, UserPatterns, post_id
+from backend.app.app.recommender import recommend_for_draft, recommend_from_history
+from backend.app.app.text_stats import ngram_counts
+from backend.app.benchmarks.ngram_index import Corpus, scan
+
+POSTS = [
+    "Redis caching cuts database latency. Connection pooling helps too.",
+    "Profiling python services: the database driver hides latency.",
+    "Redis caching and connection pooling reduce database load.",
+    "Tomatoes need sun. Basil grows well next to tomatoes.",
+    "Water tomatoes early; basil likes sun as well.",
+]
+
+
+def build(posts):
+    index = NgramIndex()
+    for text in posts:
+        index.add_text(post_id(text), text)
+    return index
+
+
+def test_related_ranks_co_occurring_ngrams():
+    index = build(POSTS)
+    # In two or more of the database posts; not the context n-gram itself, nor one-post n-grams like "profiling"
+    related = {t for t, _ in index.related("slow database queries")}
+    assert related == {"redis", "caching", "redis caching", "latency", "connection", "pooling", "connection pooling"}
+    assert {t for t, _ in index.related("my tomatoes")} == {"basil", "sun", "well"}
+    assert "basil" not in [t for t, _ in index.related("my tomatoes", exclude=["basil"])]
+    assert index.related("nothing indexed matches") == []
+    assert sorted(index.postings("redis caching")) == sorted([(post_id(POSTS[0]), 1), (post_id(POSTS[2]), 1)])
+    assert index.postings("tomatoes") == [(post_id(POSTS[3]), 2), (post_id(POSTS[4]), 1)]
+
+
+def test_related_counts_given_posts():
+    index = build(POSTS)
+    garden = {post_id(POSTS[3]): 0.9, post_id(POSTS[4]): 0.8, "removed-post": 0.7}
+    # No n-gram of the context is in the posts; the given posts are counted instead
+    assert {t for t, _ in index.related("my vegetable patch", posts=garden)} >= {"tomatoes", "basil", "sun"}
+    assert "redis" not in {t for t, _ in index.related("slow database", posts=garden)}
+    assert index.related("my vegetable patch", posts={}) == []
+
+
+def test_matches_brute_force_scan():
+    corpus = Corpus(n_topics=8, words_per_topic=40, vocab=400, seed=1)
+    counts = [ngram_counts(corpus.post(80)) for _ in range(300)]
+    index = NgramIndex()
+    for i, c in enumerate(counts):
+        index.add(str(i), c)
+    for _ in range(20):
+        context = corpus.context()
+        assert [s for _, s in index.related(context, k=5)] == pytest.approx(scan(counts, context, 5), rel=1e-9)
+
+
+def test_incremental_updates_match_rebuild(monkeypatch):
+    monkeypatch.setattr(settings, "NGRAM_INDEX_PENDING_POSTS", 2)
+    corpus = Corpus(n_topics=5, words_per_topic=30, vocab=300, seed=2)
+    posts = [corpus.post(60) for _ in range(40)]
+    index = build(posts[:20])
+    index.compact()
+    for text in posts[20:]:
+        index.add_text(post_id(text), text)
+        index.related(corpus.context())  # compacts along the way
+    for text in posts[::3]:
+        assert index.remove(post_id(text))
+    assert not index.remove(post_id(posts[0])) and not index.add_text(post_id(posts[1]), posts[1])
+
+    kept = [t for i, t in enumerate(posts) if i % 3]
+    fresh = build(kept)
+    assert index.stats()["terms"] == fresh.stats()["terms"] and len(index) == len(fresh) == len(kept)
+    for _ in range(10):
+        context = corpus.context()
+        # Equal scores may list in another order: post ids differ after updates
+        assert [s for _, s in index.related(context)] == pytest.approx([s for _, s in fresh.related(context)])
+    term = fresh.terms[0]
+    assert sorted(index.postings(term)) == sorted(fresh.postings(term))
+
+    index.compact()
+    assert index.stats() == {**fresh.stats(), "pending": 0, "postings": fresh.stats()["postings"]}
+    assert len(index.terms) == index.stats()["terms"]  # unused terms dropped
+
+
+def test_arrays_roundtrip():
+    index = build(POSTS)
+    index.remove(post_id(POSTS[3]))
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **index.to_arrays())
+    buf.seek(0)
+    with np.load(buf) as data:
+        loaded = NgramIndex.from_arrays(data)
+    assert loaded.stats() == index.stats()
+    assert loaded.related("my tomatoes") == index.related("my tomatoes")
+    assert loaded.postings("basil") == index.postings("basil")
+
+
+def test_user_patterns_keep_one_entry_per_distinct_post(tmp_path):
+    patterns = UserPatterns.build(POSTS + POSTS[:1], n_features=2 ** 12)
+    assert len(patterns.index) == len(POSTS)
+    patterns.remove_posts([POSTS[0]])
+    assert post_id(POSTS[0]) in patterns.index  # one copy left
+    patterns.remove_posts([POSTS[0], POSTS[4]])
+    assert post_id(POSTS[0]) not in patterns.index and len(patterns.index) == 3
+
+    path = str(tmp_path / "p.npz")
+    patterns.save(path)
+    assert UserPatterns.load(path).index.related("database") == patterns.index.related("database")
+
+    # A file saved before posts were indexed gets its index rebuilt from the history
+    old = UserPatterns.load(path)
+    old.index = NgramIndex()
+    assert old.sync(POSTS[1:4]) and len(old.index) == 3
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(pattern_store, "_store", PatternStore(str(tmp_path)))
+    pattern_store.get_pattern_store().get_or_build("tenant", POSTS)
+
+
+def test_recommend_from_history_needs_no_llm(store, monkeypatch):
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("LLM called")
+
+    monkeypatch.setattr(recommender, "llm_recommend", no_llm)
+    draft = "Our checkout page feels slow. The database "
+    rec = recommend_from_history(draft, draft, "", {}, [], tenant="tenant")
+    phrases = [s["phrase"] for s in rec["suggestions"]]
+    assert "redis caching" in phrases and "tomatoes" not in phrases
+    assert rec["token_usage"]["total_tokens"] == 0
+    assert recommend_from_history(draft, draft, "", {}, [], tenant="unknown")["suggestions"] == []
+
+
+def test_llm_fallback_offers_history_ngrams(store, llm_unavailable):
+    before = "Basil and "
+    result = asyncio.run(recommend_for_draft(before, before, "", {}, [], tenant="tenant"))
+    assert result["fallback"]
+    suggestions = {s["phrase"]: s["reason"] for s in result["suggestions"]}
+    assert suggestions.get("tomatoes") == "Used with these words in your posts"
+
+
+def topics(texts):
+    """Stand-in for the sentence transformer: gardening vs. software by vocabulary."""
+    garden = {"tomatoes", "basil", "sun", "water", "vegetable", "patch"}
+    out = np.zeros((len(texts), 2), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = set(text.lower().replace(".", " ").replace(";", " ").split())
+        out[row] = [len(words & garden), len(words - garden)]
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+def test_llm_fallback_starts_from_nearest_posts_by_embedding(tmp_path, monkeypatch, llm_unavailable):
+    monkeypatch.setattr(settings, "HISTORY_EMBEDDINGS_ENABLED", True)
+    monkeypatch.setattr(embeddings, "embed_texts", topics)
+    monkeypatch.setattr(pattern_store, "embedding_dim", lambda: 2)
+
+    async def embed(texts):
+        return topics(texts)
+
+    monkeypatch.setattr(recommender, "embed_texts_async", embed)
+    store = PatternStore(str(tmp_path))
+    monkeypatch.setattr(pattern_store, "_store", store)
+    store.get_or_build("tenant", POSTS[:4])
+    store.add_post("tenant", POSTS[4])
+    store.add_post("tenant", POSTS[4])  # embedded once
+    assert sorted(store.embeddings("tenant").ids) == sorted(post_id(t) for t in POSTS)
+
+    store.evict()
+    index = store.embeddings("tenant")  # reopened from disk without the model
+    assert index.search(topics(["basil"])[0], k=2)[0][0] in {post_id(POSTS[3]), post_id(POSTS[4])}
+
+    # No n-gram of "vegetable patch" is in the posts: only the embedding finds the garden ones
+    before = "My vegetable patch "
+    result = asyncio.run(recommend_for_draft(before, before, "", {}, [], tenant="tenant"))
+    assert result["fallback"]
+    history = [s["phrase"] for s in result["suggestions"] if s["reason"] == "Used with these words in your posts"]
+    assert {"basil", "sun"} <= set(history) and history[0] in {"basil", "sun", "well", "tomatoes"}
+
+    # A removed post's row stays in the index but is never counted
+    store.remove_post("tenant", POSTS[3])
+    store.remove_post("tenant", POSTS[4])
+    store.remove_post("tenant", POSTS[4])
+    result = asyncio.run(recommend_for_draft(before, before, "", {}, [], tenant="tenant"))
+    assert "basil" not in [s["phrase"] for s in result["suggestions"]]
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from backend.app.app.agent import BlogAgent
+from backend.app.app.analysis import analyze_blogs
+from backend.app.app.pattern_store import PatternStore, UserPatterns
+
+POSTS = [
+    "Caching is the cheapest performance win. Measure first, then cache the hot path!",
+    "Profiling python services shows where latency hides. Sampling profilers help.",
+    "Readable code is easier to optimize. Short functions and clear names matter.",
+    "Async python services need backpressure. Queues without limits hide latency.",
+]
+
+
+def assert_same(a: UserPatterns, b: UserPatterns):
+    assert a.ngrams == b.ngrams
+    assert a.posts == b.posts
+    assert a.readability == b.readability
+    assert a.sentiment_n == b.sentiment_n
+    for k, v in a.sentiment_sum.items():
+        assert v == pytest.approx(b.sentiment_sum[k])
+    assert a.tfidf.n_docs == b.tfidf.n_docs
+    assert np.array_equal(a.tfidf.df, b.tfidf.df)
+
+
+def test_summary_matches_analyze_blogs_sentiment():
+    patterns = UserPatterns.build(POSTS, n_features=2 ** 12)
+    expected = analyze_blogs(POSTS)
+    summary = patterns.summary()
+    for k, v in expected["sentiment"].items():
+        assert summary["sentiment"][k] == pytest.approx(v)
+    assert set(summary["keywords"][:5]) <= set(expected["keywords"])
+    assert summary["readability"]["words_per_sentence"] > 0
+
+
+def test_incremental_add_and_remove_match_rebuild():
+    patterns = UserPatterns.build(POSTS[:2], n_features=2 ** 12)
+    patterns.add_posts(POSTS[2:])
+    assert_same(patterns, UserPatterns.build(POSTS, n_features=2 ** 12))
+
+    patterns.remove_posts([POSTS[1], "never added"])
+    assert_same(patterns, UserPatterns.build([POSTS[0]] + POSTS[2:], n_features=2 ** 12))
+    assert POSTS[1] not in patterns and POSTS[0] in patterns
+
+
+def test_save_load_roundtrip(tmp_path):
+    patterns = UserPatterns.build(POSTS, n_features=2 ** 12)
+    patterns.save(str(tmp_path / "p.npz"))
+    loaded = UserPatterns.load(str(tmp_path / "p.npz"))
+    assert_same(loaded, patterns)
+    assert loaded.summary() == patterns.summary()
+
+
+def test_store_syncs_history_and_backs_agent(tmp_path):
+    store = PatternStore(str(tmp_path))
+    first = store.get_or_build("user-key", POSTS[:3])
+    assert first.n_posts == 3
+
+    store.evict()
+    grown = store.get_or_build("user-key", POSTS)  # loaded from disk, one post added
+    assert grown.n_posts == 4
+    assert not list(tmp_path.glob("*user-key*"))  # ids are hashed in filenames
+
+    shrunk = store.get_or_build("user-key", POSTS[1:])
+    assert_same(shrunk, UserPatterns.build(POSTS[1:]))
+
+    store.remove_post("user-key", POSTS[1])
+    store.evict()
+    assert store.get("user-key").n_posts == 2
+
+    agent = BlogAgent(patterns=store.get("user-key"))
+    assert agent.patterns["keywords"]
+    assert agent.tfidf.n_docs == 2
+
+
+def test_users_do_not_wait_on_each_other(tmp_path):
+    store = PatternStore(str(tmp_path))
+    store.get_or_build("other", POSTS[:2])
+    store.evict()
+    busy = store._user_lock("busy")
+    busy.acquire()  # as if a long build for "busy" were running
+    try:
+        done = []
+        t = threading.Thread(target=lambda: done.append(store.get_or_build("user-key", POSTS)))
+        t.start()
+        t.join(5)
+        assert done and done[0].n_posts == 4
+
+        async def on_loop():
+            return await store.aget("other"), await store.aget("user-key"), await store.aget("unknown")
+
+        loaded, cached, unknown = asyncio.run(on_loop())
+        assert loaded.n_posts == 2 and cached is done[0] and unknown is None
+        assert store.cached("other") is loaded and store.cached("busy") is None
+    finally:
+        busy.release()
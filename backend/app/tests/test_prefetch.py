@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from backend.app.app import agent as agent_module
+from backend.app.app import cpu_executor
+from backend.app.app import metrics
+from backend.app.app.agent import BlogAgent
+from backend.app.app.config import settings
+from backend.app.app.prefetch import Prefetcher, at_boundary
+from backend.app.app.realtime import SuggestionSession
+
+SENTENCE = "Caching cuts latency for python services."
+
+
+def test_boundaries():
+    assert at_boundary(SENTENCE) and at_boundary(SENTENCE + "  ") and at_boundary('He said "cache it all now."')
+    assert at_boundary("Five words in this paragraph\n\n")
+    assert not at_boundary(SENTENCE + " Next") and not at_boundary("Too short.")
+
+
+class FakeRecommend:
+    def __init__(self, delay=0.0, tokens=100):
+        self.calls, self.cancelled, self.delay, self.tokens = [], 0, delay, tokens
+
+    async def __call__(self, prefix, profile):
+        self.calls.append(prefix)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"suggestions": [{"phrase": f"after {len(prefix)}"}], "token_usage": {"total_tokens": self.tokens},
+                "fallback": False}
+
+
+def test_prefix_extension_is_served_and_divergence_discards():
+    async def go():
+        compute = FakeRecommend()
+        p = Prefetcher(compute, token_budget=10_000)
+        assert p.observe(SENTENCE, {}) and not p.observe(SENTENCE, {})
+        await asyncio.sleep(0)
+        hit = await p.take(SENTENCE + " Then we", {})
+
+        assert p.observe(SENTENCE + " Then we profile.", {})
+        await asyncio.sleep(0.01)
+        edited = await p.take("Caching cut latency for python services. Then we profile it", {})
+
+        assert p.observe(SENTENCE + " Then we profile.", {"reading_level": 9})
+        await asyncio.sleep(0.01)
+        other_profile = await p.take(SENTENCE + " Then we profile.", {})
+        return compute, p, hit, edited, other_profile
+
+    compute, p, hit, edited, other_profile = asyncio.run(go())
+    assert hit["suggestions"] == [{"phrase": f"after {len(SENTENCE)}"}]
+    assert edited is None and other_profile is None
+    stats = p.stats()
+    assert (stats["started"], stats["hits"], stats["discarded"]) == (3, 1, 2)
+    assert stats["tokens_served"] == 100 and stats["tokens_wasted"] == 200
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_in_flight_speculation_is_cancelled_and_budget_caps_spend(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_COMPLETION_TOKENS_ESTIMATE", 100)
+
+    async def go():
+        compute = FakeRecommend(delay=1.0)
+        p = Prefetcher(compute, token_budget=250)
+        p.observe(SENTENCE, {})
+        await asyncio.sleep(0.01)
+        p.observe("Gardening is what we talk about now.", {})  # diverged: first one cancelled, second starts
+        await asyncio.sleep(0.01)
+        started_third = p.observe("Gardening is what we talk about now. More soil.", {})
+        p.cancel()
+        await asyncio.sleep(0.01)
+        return compute, p, started_third
+
+    compute, p, started_third = asyncio.run(go())
+    assert compute.cancelled == 2 and not started_third
+    stats = p.stats()
+    assert (stats["started"], stats["discarded"], stats["skipped"]) == (2, 2, 1)
+    assert stats["tokens_spent"] <= 250 and stats["tokens_wasted"] == stats["tokens_spent"]
+
+
+def test_cancelled_take_drops_a_superseded_speculation():
+    async def go():
+        compute = FakeRecommend(delay=1.0)
+        p = Prefetcher(compute, token_budget=10_000)
+        p.observe(SENTENCE, {})
+        taker = asyncio.create_task(p.take(SENTENCE + " Then we", {}))
+        await asyncio.sleep(0.01)
+        p.observe("Gardening is what we talk about now.", {})  # a new speculation while the take waits
+        taker.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await taker
+        await asyncio.sleep(0.01)
+        current = p._current
+        p.cancel()
+        return compute, p, current
+
+    compute, p, current = asyncio.run(go())
+    assert current.prefix == "Gardening is what we talk about now."
+    assert compute.cancelled == 2  # the superseded one, then the newer one on cancel()
+    assert (p.stats()["started"], p.stats()["discarded"]) == (2, 2)
+
+
+def test_session_serves_prefetched_suggestions(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(settings, "CPU_EXECUTOR", "inline")
+    cpu_executor.shutdown()
+    calls = []
+
+    async def recommend(draft, cursor_before, cursor_after, profile, history_keywords, draft_state=None, tenant=None):
+        calls.append(draft)
+        await asyncio.sleep(0.03)
+        return {"suggestions": [{"phrase": "for example", "relevance_score": 1.0}], "readability": 0.0,
+                "weak_sections": [], "token_usage": {"total_tokens": 50}, "fallback": False}
+
+    monkeypatch.setattr(agent_module, "recommend_for_draft", recommend)
+    agent = BlogAgent(["Caching and latency and python services, again and again."])
+
+    async def go():
+        sent = []
+
+        async def send(payload):
+            sent.append(payload)
+
+        session = SuggestionSession(agent, {}, send, debounce_ms=20, prefetch=True)
+        for n in range(len(SENTENCE) - 5, len(SENTENCE) + 1):
+            session.submit(SENTENCE[:n])  # typing the end of the sentence
+            await asyncio.sleep(0.002)
+        for word in (" For", " For example"):
+            session.submit(SENTENCE + word)
+            await asyncio.sleep(0.002)
+        await asyncio.sleep(0.1)
+        await session.close()
+        return sent
+
+    sent = asyncio.run(go())
+    assert calls == [SENTENCE]  # only the speculation reached the LLM
+    assert sent[-1]["token_usage"]["prefetched"] and sent[-1]["inline_suggestions"] == ["[for example]"]
+    assert agent.prefetch.stats()["hits"] == 1
+    assert 'blog_prefetch_total{outcome="hit"}' in metrics.render_prometheus()
+
+
+def test_speculation_is_charged_to_the_tenant(monkeypatch):
+    from backend.app.app import ratelimit
+    from backend.app.app.ratelimit import RateLimiter
+
+    monkeypatch.setattr(settings, "LLM_COMPLETION_TOKENS_ESTIMATE", 100)
+    limiter = RateLimiter(requests_per_s=0, request_burst=0, tokens_per_min=240)
+    monkeypatch.setattr(ratelimit, "_limiter", limiter)
+
+    async def go():
+        p = Prefetcher(FakeRecommend(tokens=30), token_budget=10_000, tenant="t")
+        assert p.observe(SENTENCE, {})  # reserves ~110 of 240
+        await asyncio.sleep(0.01)  # settled at 30
+        assert p.observe(SENTENCE + " Then we profile.", {})  # ~110 more
+        # Supersedes the second, which is cancelled and keeps its reservation; the bucket can't cover a third
+        started_third = p.observe(SENTENCE + " Then we profile. And cache.", {})
+        await asyncio.sleep(0.01)
+        return p, started_third
+
+    p, started_third = asyncio.run(go())
+    assert not started_third and p.stats()["skipped"] == 1
+    assert p.stats()["tokens_spent"] > 100
+    assert limiter._tokens["t"].tokens == pytest.approx(240 - p.stats()["tokens_spent"], abs=1)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from backend.app.app import llm, prompt_builder
+from backend.app.app.config import settings
+from backend.app.app.prompt_builder import build_prompt, compact_profile, summary_terms
+from backend.app.app.text_stats import ngram_counts
+from backend.app.app.tokens import count_tokens, head_tokens, tail_tokens
+
+LONG_DRAFT = " ".join(
+    f"Sentence {i} talks about distributed caching and latency budgets in python services." for i in range(400)
+)
+
+
+def test_head_and_tail_respect_budget():
+    text = "alpha beta gamma delta epsilon zeta eta theta"
+    assert count_tokens(head_tokens(text, 3)) <= 3
+    assert text.startswith(head_tokens(text, 3))
+    assert text.endswith(tail_tokens(text, 3))
+    assert head_tokens(text, 1000) == text
+    assert tail_tokens(text, 0) == ""
+
+
+def test_compact_profile_drops_empty_and_sorts():
+    out = compact_profile({"tone": "casual", "audience": "", "topics": [], "level": None, "b": 1})
+    assert out == '{"b":1,"tone":"casual"}'
+
+
+def test_short_draft_is_sent_verbatim():
+    prompt, stats = build_prompt("Suggest things.", "A short draft.", " More text.", {"tone": "casual"})
+    assert "A short draft." in prompt and "More text." in prompt
+    assert "Key terms" not in prompt
+
+
+def test_long_draft_is_windowed_and_capped():
+    before, after = LONG_DRAFT[: len(LONG_DRAFT) // 2], LONG_DRAFT[len(LONG_DRAFT) // 2:]
+    prompt, stats = build_prompt("Suggest things.", before, after, {"tone": "casual"}, window_tokens=100, max_tokens=400)
+    assert stats["prompt_tokens_local"] <= 400
+    assert stats["prompt_tokens_local"] == count_tokens(prompt)
+    assert stats["prompt_tokens_saved"] == stats["prompt_tokens_full"] - stats["prompt_tokens_local"] > 0
+    assert "Key terms from the rest of the draft" in prompt
+    assert tail_tokens(before, 20) in prompt  # text right before the cursor survives
+
+
+def test_hard_cap_shrinks_window_and_terms():
+    prompt, stats = build_prompt("Suggest things.", LONG_DRAFT, "", {}, window_tokens=1000, max_tokens=150)
+    assert stats["prompt_tokens_local"] <= 150
+
+
+def test_summary_terms_count_only_new_pieces(monkeypatch):
+    counted = []
+
+    def counting(text):
+        counted.append(text)
+        return ngram_counts(text)
+
+    monkeypatch.setattr(prompt_builder, "_piece_counts", OrderedDict())
+    monkeypatch.setattr(prompt_builder, "ngram_counts", counting)
+    first = summary_terms(LONG_DRAFT, 5)
+    assert "caching" in first or "distributed caching" in first
+    assert len(counted) == 400  # one per sentence
+    counted.clear()
+
+    # A keystroke later, with a window that moved: only the changed edge pieces are counted
+    assert len(summary_terms(LONG_DRAFT[37:] + " Tokens matter", 5)) == 5
+    assert counted == [LONG_DRAFT[37:].split(".")[0], " Tokens matter"]
+
+
+def test_llm_recommend_reports_saved_tokens(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm, "llm_cache", None)
+    prompts = []
+
+    async def create(**kwargs):
+        prompts.append(kwargs["messages"][0]["content"])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps({"suggestions": []})))],
+            usage=SimpleNamespace(prompt_tokens=50, completion_tokens=5, total_tokens=55),
+        )
+
+    monkeypatch.setattr(llm, "async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    resp = asyncio.run(llm.llm_recommend(LONG_DRAFT, "", LONG_DRAFT, {"tone": "casual"}))
+    assert resp["usage"]["prompt_tokens_saved"] > 0
+    assert count_tokens(prompts[0]) <= settings.PROMPT_MAX_TOKENS
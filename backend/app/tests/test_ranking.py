@@ -0,0 +1,73 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.app.app.config import settings
+from backend.app.app.ranking import FEATURES, SuggestionRanker, top_k, weight_vector
+from backend.app.app.recommender import recommend_for_draft
+from backend.app.app.scoring import score_suggestions
+from backend.app.app.tfidf_model import CorpusTfidf
+
+BEFORE = "We moved the session store to Redis. Caching cuts latency for python "
+AFTER = "services under load."
+
+
+def test_top_k_is_a_stable_partial_sort():
+    scores = np.array([0.1, 0.9, 0.5, 0.9, 0.3, 0.7])
+    assert top_k(scores).tolist() == [1, 3, 5, 2, 4, 0]
+    assert top_k(scores, 3).tolist() == [1, 3, 5]
+    assert top_k(scores, 0).tolist() == [] and top_k(scores, 99).tolist() == top_k(scores).tolist()
+
+
+def test_features_per_candidate():
+    ranker = SuggestionRanker({"preferred_topics": ["redis"]}, {"cache warming": 2, "cache": 4}, BEFORE, AFTER)
+    phrases = ["cache warming", "Redis cluster", "latency budget", "extraordinarily sophisticated virtualization"]
+    f = ranker.features(phrases)
+    assert f.shape == (4, len(FEATURES))
+    freq, topic, similarity, readability, novelty = f.T
+    assert freq[0] == pytest.approx(4 / 8) and freq[1:].tolist() == [0, 0, 0]  # 2 + 0.5 * 4, half at 4
+    assert topic.tolist() == [0, 1, 0, 0]
+    assert similarity[2] > 0 and similarity[0] == 0  # "latency" is in the cursor context
+    assert readability[3] < readability[0] < 0  # long words make the sentence harder to read
+    assert novelty.tolist() == [1, 1, 1, 1]
+    assert ranker.features(["python services"])[0, FEATURES.index("novelty")] == 0
+
+
+def test_similarity_matches_tfidf_transform():
+    model = CorpusTfidf(2 ** 12).partial_fit(["python caching tips", "latency budgets for services", "gardening"])
+    ranker = SuggestionRanker({}, {}, BEFORE, AFTER, tfidf=model)
+    phrases = ["python services", "Latency latency budgets", "gardening", "a"]
+    expected = (model.transform(phrases) @ model.transform([ranker.context]).T).toarray().ravel()
+    assert ranker.features(phrases)[:, FEATURES.index("similarity")] == pytest.approx(expected)
+
+
+def test_rank_filters_weights_and_limits():
+    profile = {"banned_words": ["crypto"], "preferred_topics": ["kafka"]}
+    freq_map = {"latency": 10}
+    suggestions = ["Crypto caching", {"phrase": " latency ", "reason": "r"}, "kafka", "latency", "", "unrelated"]
+
+    ranked = SuggestionRanker(profile, freq_map, BEFORE, AFTER).rank(suggestions)
+    assert [s["phrase"] for s in ranked] == ["kafka", "latency", "unrelated"]
+    assert ranked[1]["reason"] == "r" and ranked[-1]["relevance_score"] < ranked[0]["relevance_score"] <= 100
+
+    topic_only = SuggestionRanker(profile, freq_map, BEFORE, AFTER, weights={"topic": 1.0})
+    assert [s["phrase"] for s in topic_only.rank(suggestions, k=1)] == ["kafka"]
+    with pytest.raises(ValueError):
+        weight_vector({"freshness": 1.0})
+
+
+def test_score_suggestions_still_ranks_without_cursor():
+    ranked = score_suggestions("Draft about caching.", ["gardening", "caching layers"], {}, {"caching": 3})
+    assert [s["phrase"] for s in ranked] == ["caching layers", "gardening"]
+
+
+def test_local_candidates_are_ranked_when_llm_is_unavailable(llm_unavailable):
+    history = [f"unused term {i}" for i in range(30)] + ["latency budgets"] * 3
+    draft = BEFORE + AFTER
+    result = asyncio.run(recommend_for_draft(draft, BEFORE, AFTER, {"banned_words": ["redis"]}, history))
+    assert result["fallback"]
+    phrases = [s["phrase"] for s in result["suggestions"]]
+    assert len(phrases) == settings.MAX_SUGGESTIONS
+    assert phrases[0] == "latency budgets"  # frequent and about the cursor context, although listed last
+    assert not any("redis" in p for p in phrases)
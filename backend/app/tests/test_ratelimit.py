@@ -0,0 +1,126 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from backend.app.app import llm, ratelimit, security
+from backend.app.app.config import settings
+from backend.app.app.main import app
+from backend.app.app.ratelimit import BULK, INTERACTIVE, RateLimited, RateLimiter, TokenBucket, admit, load
+from backend.app.benchmarks.fake_llm import FakeAsyncLLM
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    monkeypatch.setattr(ratelimit, "_limiter", None)
+    monkeypatch.setattr(load, "llm_inflight", 0)
+
+
+def test_token_bucket_refills_and_reports_wait(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take() == 0
+    clock.now += 100
+    assert bucket.tokens == pytest.approx(0) and bucket.take(3) == 0  # capped at capacity
+
+
+def test_limits_are_per_tenant_and_tokens_settle(clock):
+    limiter = RateLimiter(requests_per_s=1, request_burst=2, tokens_per_min=600)
+    limiter.check_request("a")
+    limiter.check_request("a")
+    with pytest.raises(RateLimited) as exc:
+        limiter.check_request("a")
+    assert exc.value.reason == "rate" and exc.value.retry_after_header == "1"
+    limiter.check_request("b")  # other tenants are unaffected
+
+    reserved = limiter.reserve_tokens("a", 500)
+    limiter.settle_tokens("a", reserved, 900)  # used more than estimated: 300 tokens of debt
+    with pytest.raises(RateLimited) as exc:
+        limiter.reserve_tokens("a", 10)
+    assert exc.value.reason == "tokens" and exc.value.retry_after == pytest.approx(31)
+    clock.now += 90
+    assert limiter.reserve_tokens("a", 10_000) == 600  # oversized requests are still admissible once full
+    assert limiter.reserve_tokens("b", 10) == 10
+
+
+def test_bulk_is_shed_before_interactive(monkeypatch):
+    monkeypatch.setattr(settings, "SHED_LLM_INFLIGHT_BULK", 4)
+    monkeypatch.setattr(settings, "SHED_LLM_INFLIGHT_INTERACTIVE", 8)
+    load.llm_inflight = 5
+    with pytest.raises(RateLimited) as exc:
+        admit("t", BULK)
+    assert exc.value.reason == "overload"
+    admit("t", INTERACTIVE)
+    load.llm_inflight = 8
+    with pytest.raises(RateLimited):
+        admit("t", INTERACTIVE)
+
+
+def test_verify_api_key_accepts_configured_keys(monkeypatch):
+    monkeypatch.setattr(settings, "API_KEY", "primary")
+    monkeypatch.setattr(settings, "API_KEYS", "tenant-a, tenant-b")
+    assert security.verify_api_key("tenant-b") == "tenant-b"
+    for bad in (None, "", "tenant-c", "café"):
+        with pytest.raises(HTTPException):
+            security.verify_api_key(bad)
+
+
+def test_non_ascii_api_key_is_forbidden_not_an_error(monkeypatch):
+    monkeypatch.setattr(settings, "API_KEYS", "key-a")
+    client = TestClient(app)
+    resp = client.post("/api/analyze-blogs", json={"posts": ["A post."]}, headers={"X-API-Key": "café".encode("latin-1")})
+    assert resp.status_code == 403
+
+
+def test_endpoints_return_429_with_retry_after(monkeypatch, uncached_llm):
+    monkeypatch.setattr(settings, "API_KEYS", "key-a,key-b")
+    monkeypatch.setattr(settings, "RATE_LIMIT_RPS", 0.01)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 2)
+    monkeypatch.setattr(llm, "async_client", FakeAsyncLLM())
+    client = TestClient(app)
+    body = {"draft_text": "Caching cuts latency for python services."}
+
+    codes = [client.post("/api/recommend-keywords", json=body, headers={"X-API-Key": "key-a"}).status_code
+             for _ in range(3)]
+    assert codes == [200, 200, 429]
+    resp = client.post("/api/recommend-keywords", json=body, headers={"X-API-Key": "key-a"})
+    assert 1 <= int(resp.headers["Retry-After"]) <= 100
+    assert client.post("/api/recommend-keywords", json=body, headers={"X-API-Key": "key-b"}).status_code == 200
+
+    monkeypatch.setattr(settings, "SHED_LLM_INFLIGHT_BULK", 1)
+    load.llm_inflight = 1
+    resp = client.post("/api/analyze-blogs", json={"posts": ["A post."]}, headers={"X-API-Key": "key-b"})
+    assert resp.status_code == 429 and resp.headers["Retry-After"] == "1"
+
+
+def test_refused_recommend_requests_load_nothing(monkeypatch):
+    from backend.app.app import main
+
+    monkeypatch.setattr(settings, "API_KEYS", "key-a")
+    monkeypatch.setattr(settings, "SHED_LLM_INFLIGHT_INTERACTIVE", 1)
+    load.llm_inflight = 1
+
+    async def loaded(*args, **kwargs):
+        raise AssertionError("inputs loaded for a refused request")
+
+    monkeypatch.setattr(main, "_recommend_inputs", loaded)
+    client = TestClient(app)
+    body = {"draft_text": "Caching cuts latency for python services."}
+    for path in ("/api/recommend-keywords", "/api/recommend-keywords/stream", "/api/recommend-keywords/instant"):
+        assert client.post(path, json=body, headers={"X-API-Key": "key-a"}).status_code == 429
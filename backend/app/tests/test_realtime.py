@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from backend.app.app.realtime import SuggestionSession
+
+
+class FakeAgent:
+    def __init__(self):
+        self.computed = []
+
+    async def suggest_in_real_time(self, draft, profile, callback):
+        self.computed.append(draft)
+        await asyncio.sleep(0.02)
+        await callback({"inline_suggestions": [], "draft": draft})
+
+
+def test_burst_is_debounced_and_stale_drafts_cancelled():
+    async def scenario():
+        agent, sent = FakeAgent(), []
+
+        async def send(payload):
+            sent.append(payload)
+
+        session = SuggestionSession(agent, {}, send, debounce_ms=20)
+        for i in range(5):
+            session.submit(f"draft {i}", msg_id=i)
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.1)
+
+        # A newer draft arriving mid-computation cancels the older one
+        session.submit("draft 5", msg_id=5)
+        await asyncio.sleep(0.03)
+        session.submit("draft 6", msg_id=6)
+        await asyncio.sleep(0.1)
+        await session.close()
+        return agent, sent
+
+    agent, sent = asyncio.run(scenario())
+    assert agent.computed == ["draft 4", "draft 5", "draft 6"]
+    assert [p["id"] for p in sent] == [4, 6]
+    assert sent[0]["timing"]["latency_ms"] >= sent[0]["timing"]["compute_ms"]
+
+
+class UsageAgent:
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    async def suggest_in_real_time(self, draft, profile, callback):
+        await callback({"inline_suggestions": [], "token_usage": {"total_tokens": self.tokens}})
+
+
+def test_each_draft_reserves_and_settles_tenant_tokens(monkeypatch):
+    from backend.app.app import ratelimit
+    from backend.app.app.ratelimit import RateLimiter
+
+    limiter = RateLimiter(requests_per_s=0, request_burst=0, tokens_per_min=600)
+    monkeypatch.setattr(ratelimit, "_limiter", limiter)
+
+    async def scenario():
+        sent = []
+
+        async def send(payload):
+            sent.append(payload)
+
+        session = SuggestionSession(UsageAgent(250), {}, send, debounce_ms=0, tenant="t")
+        for i in range(3):
+            session.submit("a short draft", msg_id=i)
+            await asyncio.sleep(0.01)
+        await session.close()
+        return sent
+
+    sent = asyncio.run(scenario())
+    # 600 tokens: two drafts settle at 250 each, the third can't reserve its ~300 estimate
+    assert [p.get("token_usage", {}).get("total_tokens") for p in sent[:2]] == [250, 250]
+    assert sent[2]["id"] == 2 and sent[2]["error"] == "Too many requests (tokens)" and sent[2]["retry_after"] > 0
+    assert limiter._tokens["t"].tokens == pytest.approx(100, abs=5)  # refills 10 tokens/s meanwhile
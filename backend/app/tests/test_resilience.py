@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.app.app import llm, resilience
+from backend.app.app.config import settings
+from backend.app.app.recommender import recommend_for_draft
+from backend.app.app.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    RetryBudget,
+    deadline,
+    resilient_call,
+    with_deadline,
+)
+from backend.app.benchmarks.fake_llm import FakeAsyncLLM, FakeLLMError
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(resilience, "_breaker", None)
+    monkeypatch.setattr(resilience, "_budget", None)
+    monkeypatch.setattr(settings, "BACKOFF_BASE_MS", 1)
+
+
+def flaky(failures, exc=lambda: FakeLLMError(503), delay=0.0):
+    calls = {"n": 0}
+
+    async def call():
+        calls["n"] += 1
+        if delay:
+            await asyncio.sleep(delay)
+        if calls["n"] <= failures:
+            raise exc()
+        return "ok"
+
+    return call, calls
+
+
+def test_transient_errors_are_retried():
+    call, calls = flaky(2)
+    assert asyncio.run(resilient_call(call, retries=3)) == "ok"
+    assert calls["n"] == 3
+
+
+def test_client_errors_are_not_retried():
+    call, calls = flaky(5, exc=lambda: FakeLLMError(400))
+    with pytest.raises(FakeLLMError):
+        asyncio.run(resilient_call(call, retries=3))
+    assert calls["n"] == 1
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget(ratio=0.1, min_per_s=0.0, capacity=2)
+    breaker = CircuitBreaker(failure_threshold=100)
+    total = 0
+    for _ in range(5):
+        call, calls = flaky(10)
+        with pytest.raises(FakeLLMError):
+            asyncio.run(resilient_call(call, retries=3, budget=budget, breaker=breaker))
+        total += calls["n"]
+    assert total == 5 + 2  # one attempt each, plus the two budgeted retries
+    assert budget.denied > 0
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=0.05)
+    budget = RetryBudget(min_per_s=0.0, capacity=0)
+    call, calls = flaky(2)
+    for _ in range(2):
+        with pytest.raises(FakeLLMError):
+            asyncio.run(resilient_call(call, breaker=breaker, budget=budget))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(resilient_call(call, breaker=breaker, budget=budget))
+    assert calls["n"] == 2  # rejected without calling upstream
+
+    time.sleep(0.06)
+    assert asyncio.run(resilient_call(call, breaker=breaker, budget=budget)) == "ok"  # half-open probe
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_deadline_propagates_and_bounds_backoff():
+    call, calls = flaky(10, delay=0.02)
+
+    async def nested():
+        await asyncio.sleep(0)
+        return await resilient_call(call, retries=10, base_ms=30)
+
+    async def main():
+        with deadline(0.1):
+            with deadline(5):  # an inner deadline cannot extend the outer one
+                return await asyncio.gather(nested(), return_exceptions=True)
+
+    started = time.perf_counter()
+    (result,) = asyncio.run(main())
+    assert isinstance(result, (FakeLLMError, DeadlineExceeded))
+    assert time.perf_counter() - started < 0.5
+    assert calls["n"] < 10
+
+
+def test_with_deadline_raises_deadline_exceeded():
+    async def main():
+        with deadline(0.02):
+            await with_deadline(asyncio.sleep(1))
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+
+
+def test_hedged_request_beats_slow_first_attempt():
+    delays = [1.0, 0.01]
+
+    async def call():
+        await asyncio.sleep(delays.pop(0))
+        return "ok"
+
+    started = time.perf_counter()
+    assert asyncio.run(resilient_call(call, hedge_after_ms=20)) == "ok"
+    assert time.perf_counter() - started < 0.5
+    assert resilience.stats()["hedge_wins"] >= 1
+
+
+def test_recommender_falls_back_when_llm_is_down(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm, "llm_cache", None)
+    fake = FakeAsyncLLM(error_rate=1.0, seed=0)
+    monkeypatch.setattr(llm, "async_client", fake)
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER_MS", 0)
+
+    draft = "Caching makes python services fast. Profiling shows where caching helps."
+
+    async def run_many():
+        return [
+            await recommend_for_draft(draft, draft, "", {}, ["latency budgets", "caching"])
+            for _ in range(settings.BREAKER_FAILURE_THRESHOLD + 3)
+        ]
+
+    results = asyncio.run(run_many())
+    assert all(r["fallback"] for r in results)
+    assert [s["phrase"] for s in results[0]["suggestions"]]  # local candidates were ranked
+    assert "latency budgets" in [s["phrase"] for s in results[0]["suggestions"]]
+    assert resilience.get_breaker().state == CircuitBreaker.OPEN
+    # once open, later requests stop reaching the upstream
+    assert fake.completions.calls < len(results) * 3
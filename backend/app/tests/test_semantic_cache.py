@@ -0,0 +1,104 @@
+import asyncio
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from backend.app.app import llm, recommender, resilience, semantic_cache
+from backend.app.app.config import settings
+from backend.app.app.recommender import recommend_for_draft
+from backend.app.app.semantic_cache import SemanticCache
+from backend.app.benchmarks.fake_llm import FakeAsyncLLM
+
+
+def unit(*values):
+    v = np.array(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def bag_of_words(texts):
+    """Deterministic stand-in for the sentence transformer: hashed word counts."""
+    out = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"\w+", text.lower()):
+            out[row, zlib.crc32(word.encode()) % 64] += 1
+    return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+
+
+def test_lookup_threshold_tenants_and_profiles():
+    cache = SemanticCache(threshold=0.9)
+    a, b = unit(1, 0, 0), unit(0, 1, 0)
+    cache.set("t1", {"reading_level": 8}, a, a, {"suggestions": [{"phrase": "x"}], "token_usage": {"total_tokens": 40}})
+
+    near = unit(1, 0.2, 0)
+    hit = cache.get("t1", {"reading_level": 8}, near, near)
+    assert hit["suggestions"] == [{"phrase": "x"}] and hit["similarity"] > 0.9
+    # Window and draft must both match
+    assert cache.get("t1", {"reading_level": 8}, near, b) is None
+    assert cache.get("t2", {"reading_level": 8}, a, a) is None
+    assert cache.get("t1", {"reading_level": 9}, a, a) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_tokens"]) == (1, 3, 40)
+
+
+def test_memory_is_bounded_with_lru_eviction():
+    cache = SemanticCache(threshold=0.99, max_entries=3, max_tenants=2)
+    vecs = [unit(*np.eye(16)[i]) for i in range(16)]
+    for i in range(4):
+        cache.set("t1", None, vecs[i], vecs[i], {"i": i})
+    assert cache.get("t1", None, vecs[0], vecs[0]) is None  # oldest went first
+    assert cache.get("t1", None, vecs[1], vecs[1])["i"] == 1
+    cache.set("t1", None, vecs[4], vecs[4], {"i": 4})  # evicts 2, not the just-used 1
+    assert cache.get("t1", None, vecs[1], vecs[1]) is not None
+    assert cache.get("t1", None, vecs[2], vecs[2]) is None
+
+    cache.set("t2", None, vecs[5], vecs[5], {"i": 5})
+    cache.set("t3", None, vecs[6], vecs[6], {"i": 6})  # t1 is least recently used
+    assert cache.get("t1", None, vecs[1], vecs[1]) is None
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 5
+
+
+def test_expired_entries_are_not_served():
+    cache = SemanticCache(threshold=0.9, ttl_s=0)
+    cache.set("t", None, unit(1, 0), unit(1, 0), {"i": 0})
+    assert cache.get("t", None, unit(1, 0), unit(1, 0)) is None
+
+
+@pytest.fixture
+def cached_recommender(monkeypatch, uncached_llm):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_THRESHOLD", 0.9)
+    monkeypatch.setattr(resilience, "_budget", None)
+    monkeypatch.setattr(semantic_cache, "_cache", None)
+
+    async def embed(texts):
+        return bag_of_words(texts)
+
+    monkeypatch.setattr(recommender, "embed_texts_async", embed)
+    fake = FakeAsyncLLM()
+    monkeypatch.setattr(llm, "async_client", fake)
+    return fake.completions
+
+
+def test_near_duplicate_draft_reuses_suggestions(cached_recommender):
+    base = "Caching cuts latency for python services and we measured throughput for example with care"
+    edited = base + " today"
+    other = "Gardening tips for spring tomatoes and soil preparation in small raised beds"
+
+    async def go():
+        first = await recommend_for_draft(base, base, "", {}, ["caching"], tenant="t1")
+        second = await recommend_for_draft(edited, edited, "", {}, ["caching"], tenant="t1")
+        elsewhere = await recommend_for_draft(edited, edited, "", {}, ["caching"], tenant="t2")
+        unrelated = await recommend_for_draft(other, other, "", {}, ["caching"], tenant="t1")
+        return first, second, elsewhere, unrelated
+
+    first, second, elsewhere, unrelated = asyncio.run(go())
+    assert cached_recommender.calls == 3
+    assert [s["phrase"] for s in second["suggestions"]] == [s["phrase"] for s in first["suggestions"]]
+    assert second["token_usage"]["cached"] and second["token_usage"]["total_tokens"] == 0
+    assert second["token_usage"]["saved_tokens"] == first["token_usage"]["total_tokens"]
+    assert not elsewhere["token_usage"].get("cached") and not unrelated["token_usage"].get("cached")
+    # Scores come from the current draft, not the cached one
+    assert second["readability"] != first["readability"]
+    assert semantic_cache.get_semantic_cache().stats()["hit_rate"] == pytest.approx(1 / 4)
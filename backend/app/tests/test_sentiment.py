@@ -0,0 +1,119 @@
+import asyncio
+import random
+
+import pytest
+
+from backend.app.app import cpu_executor, sentiment
+from backend.app.app.analysis import get_sia
+from backend.app.app.config import settings
+
+WORDS = ("great love excellent happy good bad terrible hate awful not never very extremely barely kind of sort "
+         "least at but so this the cache latency python we I API GREAT BAD :) :( <3 lol no doubt don't isn't "
+         "cut the mustard kiss of death").split()
+PUNCT = ["", "", "", ".", "!", "?", "!!", "?!?", ",", '"', "...", ".)", "(", "-"]
+
+
+def random_text(seed, n=None):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n or rng.randint(1, 150)):
+        word = rng.choice(WORDS)
+        if rng.random() < 0.2:
+            word = rng.choice(PUNCT) + word
+        if rng.random() < 0.4:
+            word += rng.choice(PUNCT)
+        out.append(word)
+        if rng.random() < 0.05:
+            out.append(rng.choice(["\n", "\n\n"]))
+    return " ".join(out)
+
+
+@pytest.fixture(autouse=True)
+def fresh_memo(monkeypatch):
+    monkeypatch.setattr(sentiment, "_memo", None)
+
+
+def assert_close(got, expected):
+    for k in sentiment.KEYS:
+        assert got[k] == pytest.approx(expected[k], abs=sentiment.TOLERANCE[k]), k
+
+
+def test_tokenize_matches_sentitext():
+    from nltk.sentiment.vader import SentiText
+
+    constants = get_sia().constants
+    for seed in range(300):
+        text = random_text(seed)
+        assert sentiment.tokenize(text) == SentiText(
+            text, constants.PUNC_LIST, constants.REGEX_REMOVE_PUNCTUATION).words_and_emoticons
+
+
+def test_matches_whole_text_vader():
+    sia = get_sia()
+    for seed in range(300):
+        text = random_text(seed)
+        assert_close(sentiment.score(text), sia.polarity_scores(text))
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "   \n ",
+    "Not. Great work!",  # negation reaching across a sentence break
+    "It was good. But the docs were bad. Still good.",  # the first "but" scales the whole text
+    "Great. The service is not great.",  # repeats score as their first occurrence
+    "It is kind\nof good.",
+    "I LOVE this. the cache is GREAT.",  # caps emphasis depends on the whole text
+    "Why?? Really bad?! Awful!!!",
+])
+def test_context_across_sentences(text):
+    assert_close(sentiment.score(text), get_sia().polarity_scores(text))
+
+
+def test_split_sentences():
+    text = 'Hello there. "Quoted!" And (this?) more\n\n  heading line  \nlast one...'
+    assert sentiment.split_sentences(text) == ['Hello there.', '"Quoted!"', 'And (this?)', 'more',
+                                               'heading line', 'last one...']
+
+
+def test_edit_rescores_only_changed_sentences():
+    draft = " ".join(f"Sentence {i} is really good." for i in range(20))
+    sentiment.score(draft)
+    memo = sentiment.get_memo()
+    assert memo.stats() == {"entries": 20, "hits": 0, "misses": 20}
+
+    edited = draft.replace("Sentence 7 is really good.", "Sentence 7 is awful.") + " One more, but sad."
+    assert_close(sentiment.score(edited), get_sia().polarity_scores(edited))
+    assert memo.stats() == {"entries": 22, "hits": 19, "misses": 22}
+
+
+def test_memo_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "SENTIMENT_MEMO_SENTENCES", 5)
+    text = " ".join(f"Line {i} is fine." for i in range(12))
+    sentiment.score(text)
+    assert sentiment.get_memo().stats()["entries"] == 5
+    assert_close(sentiment.score(text), get_sia().polarity_scores(text))
+
+
+def test_memo_disabled_uses_whole_text(monkeypatch):
+    monkeypatch.setattr(settings, "SENTIMENT_MEMO_SENTENCES", 0)
+    text = random_text(1)
+    assert sentiment.score(text) == {k: get_sia().polarity_scores(text)[k] for k in sentiment.KEYS}
+    assert sentiment._memo is None
+
+
+def test_score_many_async_keeps_order_and_isolates_failures(monkeypatch):
+    monkeypatch.setattr(settings, "CPU_EXECUTOR", "inline")
+    cpu_executor.shutdown()
+    texts = [random_text(seed) for seed in range(10)]
+    real = sentiment.score
+
+    def score(text):
+        if text == texts[3]:
+            raise LookupError("lexicon missing")
+        return real(text)
+
+    monkeypatch.setattr(sentiment, "score", score)
+    got = asyncio.run(sentiment.score_many_async(texts, chunk_size=4))
+    assert got[3] is None
+    for text, s in zip(texts[:3] + texts[4:], got[:3] + got[4:]):
+        assert_close(s, get_sia().polarity_scores(text))
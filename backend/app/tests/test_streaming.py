@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app.app import llm, resilience
+from backend.app.app.agent import BlogAgent
+from backend.app.app.main import app
+from backend.app.app.recommender import recommend_for_draft_stream
+from backend.app.app.security import verify_api_key
+from backend.app.app.stream_parser import SuggestionStreamParser
+from backend.app.benchmarks.fake_llm import FakeAsyncLLM
+
+SUGGESTIONS = [
+    {"phrase": "for example", "reason": "ground the claim"},
+    {"phrase": "in practice", "reason": "a \"smoother\" transition {really}"},
+    {"phrase": "cache hit rate", "reason": "matches history"},
+]
+DRAFT = "Caching cuts latency for python services. We measured throughput carefully"
+
+
+@pytest.fixture(autouse=True)
+def fake_llm(monkeypatch, uncached_llm):
+    monkeypatch.setattr(resilience, "_budget", None)
+    fake = FakeAsyncLLM(content_fn=lambda prompt: json.dumps({"suggestions": SUGGESTIONS}),
+                        chunk_chars=7, chunk_delay_ms=5)
+    monkeypatch.setattr(llm, "async_client", fake)
+    return fake.completions
+
+
+def feed_all(parser, text, size):
+    out = []
+    for i in range(0, len(text), size):
+        out.extend(parser.feed(text[i:i + size]))
+    return out
+
+
+@pytest.mark.parametrize("size", [1, 3, 50])
+def test_parser_emits_each_suggestion_once(size):
+    wrapped = json.dumps({"suggestions": SUGGESTIONS, "note": {"phrase": "not an element"}})
+    assert feed_all(SuggestionStreamParser(), wrapped, size) == SUGGESTIONS
+    ndjson = "\n".join(json.dumps(s) for s in SUGGESTIONS) + "\n"
+    assert feed_all(SuggestionStreamParser(), ndjson, size) == SUGGESTIONS
+
+
+def test_parser_emits_before_stream_ends():
+    text = json.dumps({"suggestions": SUGGESTIONS})
+    parser = SuggestionStreamParser()
+    cut = text.index("}") + 1
+    assert parser.feed(text[:cut]) == SUGGESTIONS[:1]
+    assert parser.feed(text[cut:]) == SUGGESTIONS[1:]
+    assert parser.text == text
+
+
+def test_stream_yields_suggestions_then_done(fake_llm):
+    async def go():
+        events, stamps = [], []
+        async for event in recommend_for_draft_stream(DRAFT, DRAFT, "", {}, ["caching"]):
+            events.append(event)
+            stamps.append(time.perf_counter())
+        return events, stamps
+
+    events, stamps = asyncio.run(go())
+    kinds = [e["type"] for e in events]
+    assert kinds == ["suggestion"] * 3 + ["done"]
+    # The first suggestion arrives while the rest of the completion is still streaming
+    assert stamps[-1] - stamps[0] > 0.02
+    done = events[-1]
+    assert not done["fallback"] and not done["truncated"]
+    assert {s["phrase"] for s in done["suggestions"]} == {s["phrase"] for s in SUGGESTIONS}
+    assert done["timing"]["first_suggestion_ms"] <= done["timing"]["total_ms"]
+    assert done["token_usage"]["completion_tokens"] > 0
+
+
+def test_abandoned_stream_closes_the_upstream_response(fake_llm):
+    async def go():
+        stream = llm.llm_recommend_stream(DRAFT, "", DRAFT, {})
+        await stream.__anext__()  # first suggestion, then the consumer walks away
+        await stream.aclose()
+
+    asyncio.run(go())
+    assert [s.closed for s in fake_llm.streams] == [True]
+
+
+def test_stream_falls_back_when_nothing_arrived(fake_llm):
+    fake_llm.fail_first = 10
+
+    async def go():
+        return [e async for e in recommend_for_draft_stream(DRAFT, DRAFT, "", {}, ["caching"])]
+
+    events = asyncio.run(go())
+    assert events[-1]["type"] == "done" and events[-1]["fallback"]
+    assert events[-1]["suggestions"]
+
+
+def test_agent_partial_callbacks():
+    agent = BlogAgent(["Caching and latency matter for python services."])
+    partials, finals = [], []
+    asyncio.run(agent.suggest_in_real_time(DRAFT, {}, finals.append, on_partial=partials.append))
+    assert [p["inline_suggestion"] for p in partials] == [f"[{s['phrase']}]" for s in SUGGESTIONS]
+    assert len(finals) == 1 and "final_score" in finals[0]["score"]
+    assert finals[0]["suggestion_timing"]["first_suggestion_ms"] is not None
+
+
+def test_stream_endpoint_ndjson_and_sse():
+    app.dependency_overrides[verify_api_key] = lambda: "test-key"
+    try:
+        client = TestClient(app)
+        body = {"draft_text": DRAFT}
+        resp = client.post("/api/recommend-keywords/stream", json=body)
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in resp.text.splitlines()]
+        assert [e["type"] for e in events] == ["suggestion"] * 3 + ["score", "done"]
+        assert events[-1]["timing"]["first_suggestion_ms"] is not None
+
+        resp = client.post("/api/recommend-keywords/stream", json=body, headers={"Accept": "text/event-stream"})
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        assert resp.text.count("event: suggestion\n") == 3 and "event: done\n" in resp.text
+
+        resp = client.post("/api/recommend-keywords", json=body)
+        assert resp.status_code == 200
+        assert len(resp.json()["suggestions"]) == 3 and "score" in resp.json()
+    finally:
+        app.dependency_overrides.clear()
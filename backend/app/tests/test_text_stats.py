@@ -0,0 +1,76 @@
+import random
+import re
+from collections import Counter
+
+import pytest
+
+from backend.app.app.analysis import top_ngrams
+from backend.app.app.recommender import _weak_sections
+from backend.app.app.scoring import (
+    _frequency_score,
+    blog_score,
+    flesch_kincaid_grade,
+    flesch_reading_ease,
+    user_profile_adjustment,
+)
+from backend.app.app.text_stats import TextStats, count_syllables
+
+WORDS = "the quick caching layer reduces latency dramatically while profiling reveals unexpected bottlenecks".split()
+
+
+def random_text(seed, n=400):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        out.append(rng.choice(WORDS + ["re-use", "don't", "42", "  "]))
+        if rng.random() < 0.08:
+            out.append(rng.choice([".", "!", "?", ". ", "..", "\n"]))
+    return " ".join(out)
+
+
+def reference_counts(text):
+    sentences = re.split(r'[.!?]', text)
+    words = re.findall(r'\w+', text)
+    return max(len([s for s in sentences if s.strip()]), 1), max(len(words), 1), sum(count_syllables(w) for w in words)
+
+
+def reference_weak(draft):
+    weak, idx = [], 0
+    for s in [s.strip() for s in draft.split('.') if s.strip()]:
+        start = draft.find(s, idx)
+        end = start + len(s)
+        idx = end
+        if len(s.split()) > 20 and flesch_reading_ease(s) < 50:
+            weak.append({"start": start, "end": end, "reason": "Hard to read (long/complex)"})
+    return weak
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_text_stats_matches_string_path(seed):
+    text = random_text(seed)
+    stats = TextStats(text)
+    assert stats.readability_counts() == reference_counts(text)
+    assert flesch_kincaid_grade(stats) == flesch_kincaid_grade(text)
+    assert top_ngrams(stats, 30) == top_ngrams(text, 30)
+    assert _weak_sections(stats) == reference_weak(text)
+    assert stats.word_counts == Counter(re.findall(r'\w+', text.lower()))
+    kws = ["caching", "Latency", "missing"]
+    assert _frequency_score(stats, kws) == _frequency_score(text, kws)
+    profile = {"preferred_topics": ["Caching"], "reading_level": 8}
+    assert user_profile_adjustment(50, stats, profile) == user_profile_adjustment(50, text, profile)
+    assert blog_score(stats, kws, profile) == blog_score(text, kws, profile)
+
+
+def test_range_counts_match_substring():
+    text = "One short line. Then a much longer sentence follows here! And? More."
+    stats = TextStats(text)
+    for start, end in stats.sentence_spans:
+        assert stats.range_counts(start, end) == reference_counts(text[start:end])
+
+
+def test_reading_level_names_are_grades():
+    text = "Caching cuts latency. We measured it carefully across several services."
+    for level, grade in (("beginner", 6), ("general", 9), ("advanced", 13), ("11", 11)):
+        assert user_profile_adjustment(50, text, {"reading_level": level}) == \
+            user_profile_adjustment(50, text, {"reading_level": grade})
+    assert user_profile_adjustment(50, text, {"reading_level": "unknown"}) == 50
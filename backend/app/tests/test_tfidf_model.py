@@ -0,0 +1,81 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from backend.app.app.tfidf_model import CorpusTfidf
+from backend.app.app.scoring import keyword_relevance, keyword_relevance_batch
+
+CORPUS = [
+    "AI is transforming how we write blogs.",
+    "FastAPI makes backend APIs fast and easy.",
+    "Writing tips for technical blogs about AI and APIs.",
+]
+
+
+def test_matches_sklearn_tfidf():
+    model = CorpusTfidf().partial_fit(CORPUS)
+    ref = TfidfVectorizer().fit(CORPUS)
+    text = "Blogs about AI and FastAPI"
+    ours = model.transform([text, "fast APIs"])
+    theirs = ref.transform([text, "fast APIs"])
+    assert np.isclose(ours[0].multiply(ours[1]).sum(), theirs[0].multiply(theirs[1]).sum())
+
+
+def test_incremental_fit_equals_full_fit(tmp_path):
+    full = CorpusTfidf().partial_fit(CORPUS)
+    inc = CorpusTfidf().partial_fit(CORPUS[:1]).partial_fit(CORPUS[1:])
+    assert np.array_equal(full.df, inc.df) and full.n_docs == inc.n_docs
+
+    path = str(tmp_path / "m.npz")
+    inc.save(path)
+    assert np.allclose(CorpusTfidf.load(path).idf, full.idf)
+
+
+def test_batch_matches_single():
+    model = CorpusTfidf().partial_fit(CORPUS)
+    pairs = [("AI blogs are fun", ["AI", "blogs"]), ("nothing", []), ("fast backend", ["APIs", "fast"])]
+    batch = keyword_relevance_batch(pairs, model)
+    single = [keyword_relevance(text, kws, model) for text, kws in pairs]
+    assert np.allclose(batch, single)
+    assert batch[1] == 0.0
+
+
+def test_tenant_model_counts_each_post_once(tmp_path, monkeypatch):
+    from backend.app.app import tfidf_model
+    from backend.app.app.config import settings
+
+    monkeypatch.setattr(settings, "TFIDF_MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(tfidf_model, "_models", {})
+    first = tfidf_model.update_corpus_tfidf("tenant", CORPUS[:2] + CORPUS[:1])
+    assert first.n_docs == 2
+    again = tfidf_model.update_corpus_tfidf("tenant", CORPUS)  # history re-sent with one new post
+    assert again.n_docs == 3 and first.n_docs == 2  # readers of the old model never see it change
+    assert np.array_equal(again.df, CorpusTfidf().partial_fit(CORPUS).df)
+    assert tfidf_model.update_corpus_tfidf("tenant", CORPUS) is again
+
+    monkeypatch.setattr(tfidf_model, "_models", {})
+    assert tfidf_model.update_corpus_tfidf("tenant", CORPUS[1:]).n_docs == 3  # ids survive a reload
+
+
+def test_aget_loads_off_the_loop_without_the_tenant_lock(tmp_path, monkeypatch):
+    import asyncio
+
+    from backend.app.app import tfidf_model
+    from backend.app.app.config import settings
+
+    monkeypatch.setattr(settings, "TFIDF_MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(tfidf_model, "_models", {})
+    assert asyncio.run(tfidf_model.aget_corpus_tfidf("tenant")) is None
+    saved = tfidf_model.update_corpus_tfidf("tenant", CORPUS)
+    monkeypatch.setattr(tfidf_model, "_models", {})
+    assert tfidf_model.cached_corpus_tfidf("tenant") is None
+
+    async def load_while_locked():
+        # A writer holding the tenant's lock must not stall the loop
+        with tfidf_model._tenant_lock("tenant"):
+            task = asyncio.create_task(tfidf_model.aget_corpus_tfidf("tenant"))
+            await asyncio.sleep(0.05)
+            assert not task.done()
+        return await task
+
+    loaded = asyncio.run(load_while_locked())
+    assert np.array_equal(loaded.df, saved.df)
+    assert asyncio.run(tfidf_model.aget_corpus_tfidf("tenant")) is tfidf_model.cached_corpus_tfidf("tenant") is loaded
@@ -0,0 +1,23 @@
+import asyncio
+from backend.app.app.utils import gather_bounded
+
+
+def test_gather_bounded_keeps_order_and_isolates_failures():
+    in_flight = 0
+    peak = 0
+
+    async def work(i):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01 * (5 - i % 5))
+        in_flight -= 1
+        if i == 3:
+            raise ValueError("boom")
+        return i * 10
+
+    results = asyncio.run(gather_bounded([lambda i=i: work(i) for i in range(10)], limit=3))
+
+    assert peak <= 3
+    assert isinstance(results[3], ValueError)
+    assert [r for i, r in enumerate(results) if i != 3] == [i * 10 for i in range(10) if i != 3]